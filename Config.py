@@ -54,6 +54,33 @@ debug = False
 fast_shutdown = True
 show_text = False
 hold_threshold = 0.4
+# collapse auto-repeated navigation keys queued together into one message
+coalesce_repeats = False
+# most output notifications handled per pump tick
+notify_batch_size = 10
+# reuse spent stream and packet messages instead of allocating new ones
+pool_messages = False
+message_pool_size = 64
+# remember accessible property reads until the input message is handled
+memo_properties = True
+# log the number and time of accessible calls made per input message
+account_calls = False
+account_log = 'calls.txt'
+# seconds to gather accessibility events before testing conditions, 0 for none
+event_window = 0.02
+# items on either side of the selection read and rendered ahead while idle
+prefetch_items = 3
+# seconds between prefetch steps so input is handled between them
+prefetch_delay = 0.02
+# hypertext nodes flattened into the virtual buffer per step while idle
+buffer_batch = 50
+# seconds between virtual buffer steps so input is handled between them
+buffer_delay = 0.05
+# characters in a hypertext document before its text is indexed by trigram for
+# search, 0 to never index
+trigram_chars = 100000
+# characters indexed per step while idle
+trigram_batch = 20000
 
 def log(text):
   log_data.append(text)
@@ -92,6 +92,12 @@ NUM_LOCK = (144, 0)
 SYS_INFORM_STARTUP = (-1, -1)
 SYS_STARTUP = (-2, -1)
 
+# input queue lanes in the order they are drained
+SYSTEM_LANE = 0
+USER_LANE = 1
+NOTIFY_LANE = 2
+LANE_NAMES = ('system', 'user', 'notify')
+
 # mapping from message to name of method that will handle it
 cmd_dispatch = {KP_SUBTRACT : 'OnChooseProgram',
                 KP_MULTIPLY : 'OnChooseTask',
@@ -136,6 +142,14 @@ cmd_dispatch = {KP_SUBTRACT : 'OnChooseProgram',
 
 SEARCH_MOD = MOD_ALT
 
+# names of methods handling commands that jump ahead of queued input
+system_cmds = set(('OnShutUp', 'OnInformSystemShutdown',
+                   'OnInformSystemStartup', 'OnSystemStartup'))
+
+# names of methods handling navigation commands that may be coalesced when
+# their keys auto-repeat
+repeat_cmds = set(('OnHigh', 'OnLow', 'OnPrevMid', 'OnNextMid'))
+
 # mapping from message with shift held to method that will handle it
 modified_cmd_dispatch = {(MOD_SHIFT, TAB): 'OnPrevSubTask',
                          (MOD_KP_SHIFT, KP_9): 'OnIncRate',
@@ -17,6 +17,30 @@ import System, Config
 from Messages import KeyMessage, InboundMessage
 from Constants import *
 
+# resolved focus chains keyed by the id of the pipe at their root
+_chains = {}
+
+def _invalidateChains():
+  '''
+  Discards all cached focus chains. Called whenever any L{Pipe} in the system
+  adopts a new focus since the change may affect the chain of any ancestor.
+  '''
+  _chains.clear()
+
+def handles_repeats(func):
+  '''
+  Decorator for input handler methods that honor the Repeat count of a
+  coalesced message themselves. Handlers not decorated as such are invoked
+  once per repetition instead.
+
+  @param func: Handler method
+  @type func: function
+  @return: The same method flagged as handling repeats
+  @rtype: function
+  '''
+  func.HandlesRepeats = True
+  return func
+
 class Pipe(object):
   '''
   Segment of a pipeline for messages flowing into the system.
@@ -66,6 +90,7 @@ class Pipe(object):
     if new is None:
       old = self.focus
       self.focus = None
+      _invalidateChains()
       ret = False
     else:
       # check if activation interface is supported
@@ -79,6 +104,7 @@ class Pipe(object):
       # have to set new object to focus before activating
       old = self.focus
       self.focus = new
+      _invalidateChains()
       # try to activate
       ret = mtd(message, auto_focus)
     # deactivate the old focus, no interface checks needed here, it was checked
@@ -96,6 +122,30 @@ class Pipe(object):
     @type new: L{Pipe}
     '''
     self.focus = new
+    _invalidateChains()
+
+  def GetFocusChain(self):
+    '''
+    Gets the list of objects from this one down to the deepest focused object.
+    The list is cached until the focus of any L{Pipe} changes through
+    L{ChangeFocus} or L{FocusNow}.
+
+    @return: This object followed by each focused descendant in order
+    @rtype: list of L{Pipe}
+    '''
+    try:
+      root, chain = _chains[id(self)]
+      if root is self:
+        return chain
+    except KeyError:
+      pass
+    chain = [self]
+    pipe = self.focus
+    while pipe:
+      chain.append(pipe)
+      pipe = pipe.focus
+    _chains[id(self)] = (self, chain)
+    return chain
 
   def PropogateInput(self, message):
     '''
@@ -105,17 +155,16 @@ class Pipe(object):
 
     @param message: Input message to pass
     @type message: L{Input.Messages.InboundMessage}
+    @return: Did some object in the chain stop the message?
+    @rtype: boolean
     '''
-    stop = False
     # peek at the message first before processing it
     #self.PreHandleInput(message)
-    if self.focus:
-      # let descendants handle the message first
-      stop = self.focus.PropogateInput(message)
-    if stop or not self.IsReadyForInput(message):
-      return stop
-    # handle the message ourselves
-    return self.PostHandleInput(message)
+    # walk from the deepest focused object back up to this one
+    for pipe in reversed(self.GetFocusChain()):
+      if pipe.IsReadyForInput(message) and pipe.PostHandleInput(message):
+        return True
+    return False
 
   def PreHandleInput(self, message):
     '''
@@ -156,7 +205,18 @@ class Pipe(object):
     # call the method to handle the message
     if method is not None:
       message.Stop = True
-      method(message)
+      if message.Repeat > 1 and not getattr(method, 'HandlesRepeats', False):
+        # replay a coalesced message once per repetition
+        count = message.Repeat
+        message.Repeat = 1
+        try:
+          for i in xrange(count):
+            message.Stop = True
+            method(message)
+        finally:
+          message.Repeat = count
+      else:
+        method(message)
       message.Seen = True
       return message.Stop
     return False
@@ -192,8 +252,12 @@ class Manager(threading.Thread, Pipe):
 
   @ivar alive: Should we be watching for keyboard events and processing them?
   @type alive: boolean
-  @ivar iput: Stores input events for later processing
-  @type iput: Queue.Queue
+  @ivar lanes: Store input events for later processing, one queue per lane in
+    drain order
+  @type lanes: list of Queue.Queue
+  @ivar peaks: Deepest each lane has been since the last call to
+    L{GetLaneDepths} with reset
+  @type peaks: list of integer
   @ivar hm: Manages the system wide key hook
   @type hm: pyHook.HookMananger
   @ivar stateful: Keys with state that are monitored as pressed or not
@@ -204,6 +268,8 @@ class Manager(threading.Thread, Pipe):
   @type LastEventTime: float
   @ivar tid: Thread ID of the message pump
   @type tid: integer
+  @ivar recorder: Recorder logging key messages as they are queued, or None
+  @type recorder: L{Input.Replay.Recorder}
   '''
   instance = None
 
@@ -222,14 +288,29 @@ class Manager(threading.Thread, Pipe):
 
     # build and initialize a new instance
     self = threading.Thread.__new__(cls)
+    self.Initialize()
+    self.start()
+    # store the instance for later
+    cls.instance = self
+    return self
+
+  def __init__(self, *args, **kwargs): pass
+
+  def Initialize(self):
+    '''
+    Initializes the thread, the input pipe, and the message queues without
+    starting the key hook.
+    '''
     threading.Thread.__init__(self)
     Pipe.__init__(self)
 
     self.LastEventTime = time.time()
     self.alive = True
     self.tid = None
-    # create queue for input messages
-    self.iput = Queue.Queue()
+    self.recorder = None
+    # create queues for input messages, one per lane
+    self.lanes = [Queue.Queue() for name in LANE_NAMES]
+    self.peaks = [0] * len(LANE_NAMES)
     # these keys are known as held or unheld
     self.stateful = {L_SHIFT: False, R_SHIFT: False,
                      L_ALT: False, R_ALT: False,
@@ -239,12 +320,6 @@ class Manager(threading.Thread, Pipe):
     # these keys are stateful, but never reported to the OS
     self.stateful_internal = set((KP_0, KP_INSERT, KP_ADD, L_ALT, R_ALT,
                                  KP_ENTER, L_CTRL, R_CTRL))
-    self.start()
-    # store the instance for later
-    cls.instance = self
-    return self
-
-  def __init__(self, *args, **kwargs): pass
 
   def run(self):
     '''Pump windows messages until death.'''
@@ -341,22 +416,86 @@ class Manager(threading.Thread, Pipe):
     kps = (self.stateful[KP_0]|self.stateful[KP_INSERT])*MOD_KP_SHIFT
     return shift|alt|ctrl|kps
 
+  def GetLane(self, message):
+    '''
+    Chooses the queue lane for a message. Messages declaring their own lane
+    keep it. System commands, either by handler name or by negative ID, go in
+    the system lane. All others are user input.
+
+    @param message: Message to classify
+    @type message: L{Messages.InboundMessage}
+    @return: Lane constant
+    @rtype: integer
+    '''
+    if message.Lane is not None:
+      return message.Lane
+    if message.Modified:
+      name = modified_cmd_dispatch.get((message.Modified, message.ID))
+    else:
+      name = cmd_dispatch.get(message.ID)
+    if name in system_cmds or message.ID[0] < 0:
+      return SYSTEM_LANE
+    return USER_LANE
+
   def AddMessage(self, message):
     '''
-    Adds a message to the queue for later processing.
+    Adds a message to the queue lane for its kind for later processing.
 
     @param message: Event to queue
     @type message: L{Messages.InboundMessage}
     '''
-    self.iput.put(message)
+    recorder = self.recorder
+    if recorder is not None and isinstance(message, KeyMessage):
+      recorder.Record(message)
+    lane = self.GetLane(message)
+    queue = self.lanes[lane]
+    queue.put(message)
+    depth = queue.qsize()
+    if depth > self.peaks[lane]:
+      self.peaks[lane] = depth
+
+  def StartRecording(self, filename):
+    '''
+    Starts logging all key messages added to the queue so the session can be
+    replayed later by L{Input.Replay.Replayer}.
+
+    @param filename: Name of the binary log file to write
+    @type filename: string
+    '''
+    import Replay
+    self.StopRecording()
+    self.recorder = Replay.Recorder(filename)
+
+  def StopRecording(self):
+    '''Stops logging key messages and writes the log to disk.'''
+    if self.recorder is not None:
+      self.recorder.Close()
+      self.recorder = None
+
+  def GetLaneDepths(self, reset=False):
+    '''
+    Reports how many messages are waiting in each lane and the most that have
+    waited in each at one time.
+
+    @param reset: Reset the peak depths after reporting them?
+    @type reset: boolean
+    @return: Current and peak depth keyed by lane name
+    @rtype: dictionary of 2-tuple of integer
+    '''
+    depths = {}
+    for lane, name in enumerate(LANE_NAMES):
+      depths[name] = (self.lanes[lane].qsize(), self.peaks[lane])
+      if reset:
+        self.peaks[lane] = 0
+    return depths
 
   def AddInformStartupMessage(self):
     '''Adds the message to play the introductory sound.'''
-    self.iput.put(InboundMessage(SYS_INFORM_STARTUP))
+    self.AddMessage(InboundMessage(SYS_INFORM_STARTUP))
 
   def AddStartupMessage(self):
     '''Adds the message to start interaction.'''
-    self.iput.put(InboundMessage(SYS_STARTUP))
+    self.AddMessage(InboundMessage(SYS_STARTUP))
 
   def Destroy(self):
     '''
@@ -367,32 +506,123 @@ class Manager(threading.Thread, Pipe):
     self.alive = False
     win32api.PostThreadMessage(self.tid, win32con.WM_QUIT, 0, 0)
 
+  def IsRepeatable(self, msg):
+    '''
+    Checks if a message is an unmodified key press of a navigation command
+    that can be coalesced with identical messages around it.
+
+    @param msg: Message to check
+    @type msg: L{Messages.InboundMessage}
+    @return: Can the message be coalesced?
+    @rtype: boolean
+    '''
+    return (isinstance(msg, KeyMessage) and msg.Press and not msg.Modified and
+            msg.Destination is None and msg.StartPipe is None and
+            cmd_dispatch.get(msg.ID) in repeat_cmds)
+
+  def CoalesceRepeats(self, messages):
+    '''
+    Collapses runs of identical repeatable messages into the last message of
+    each run with its Repeat count set to the length of the run.
+
+    @param messages: Messages in the order they were queued
+    @type messages: list of L{Messages.InboundMessage}
+    @return: Messages with runs collapsed
+    @rtype: list of L{Messages.InboundMessage}
+    '''
+    out = []
+    for msg in messages:
+      if out and self.IsRepeatable(msg) and out[-1].ID == msg.ID and \
+         self.IsRepeatable(out[-1]):
+        msg.Repeat = out[-1].Repeat + msg.Repeat
+        out[-1] = msg
+      else:
+        out.append(msg)
+    return out
+
+  def DispatchMessage(self, msg):
+    '''
+    Routes a single message to its destination, its starting pipe, or through
+    the manager.
+
+    @param msg: Message to route
+    @type msg: L{Messages.InboundMessage}
+    '''
+    # route direct messages to their intended listeners
+    if msg.Destination is not None:
+      try:
+        # let the listener handle the message without propogating it first
+        msg.Destination.PostHandleInput(msg)
+      except ReferenceError:
+        # destination has died, just ignore
+        pass
+    elif msg.StartPipe is not None:
+      msg.StartPipe.PropogateInput(msg)
+    else:
+      # default to routing through the manager
+      self.PropogateInput(msg)
+
+  def PopMessage(self, lane):
+    '''
+    Removes the next message from a lane without blocking.
+
+    @param lane: Lane constant
+    @type lane: integer
+    @return: Next message or None if the lane is empty
+    @rtype: L{Messages.InboundMessage}
+    '''
+    try:
+      return self.lanes[lane].get_nowait()
+    except Queue.Empty:
+      return None
+
   def ProcessMessages(self):
     '''
     Notifys observers about all of our queued messages. Messages are either
     passed to the direct descendent of the manager or routed directly to
-    their intended destinations if specified.
+    their intended destinations if specified. When L{Config.coalesce_repeats}
+    is set, auto-repeated navigation keys queued in the same tick are delivered
+    as one message.
+
+    Lanes are drained in priority order. System commands always go first, then
+    user input. Output notifications are handled only when both are empty and
+    at most L{Config.notify_batch_size} of them per call so that a storm of
+    speech events cannot hold up the pump.
     '''
     if not self.alive: return False
+    notified = 0
     # process input messages
     while 1:
-      try:
-        msg = self.iput.get_nowait()
-      except Queue.Empty:
-        break
-      # route direct messages to their intended listeners
-      if msg.Destination is not None:
-        try:
-          # let the listener handle the message without propogating it first
-          msg.Destination.PostHandleInput(msg)
-        except ReferenceError:
-          # destination has died, just ignore
-          pass
-      elif msg.StartPipe is not None:
-        msg.StartPipe.PropogateInput(msg)
+      msg = self.PopMessage(SYSTEM_LANE)
+      if msg is not None:
+        self.DispatchMessage(msg)
+        continue
+      if Config.coalesce_repeats:
+        # take all user input queued so far and collapse repeated keys
+        batch = []
+        msg = self.PopMessage(USER_LANE)
+        while msg is not None:
+          batch.append(msg)
+          msg = self.PopMessage(USER_LANE)
+        if batch:
+          for msg in self.CoalesceRepeats(batch):
+            self.DispatchMessage(msg)
+          continue
       else:
-        # default to routing through the manager
-        self.PropogateInput(msg)
+        msg = self.PopMessage(USER_LANE)
+        if msg is not None:
+          self.DispatchMessage(msg)
+          continue
+      # leave remaining notifications for the next call
+      if notified >= Config.notify_batch_size:
+        break
+      msg = self.PopMessage(NOTIFY_LANE)
+      if msg is None:
+        break
+      notified += 1
+      self.DispatchMessage(msg)
+      # let pooled notifications be reused if no handler kept them
+      msg.Release()
     return True
 
 if __name__ == '__main__':
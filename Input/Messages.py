@@ -41,7 +41,19 @@ class InboundMessage(object):
   @ivar StartPipe: Starting point for input message routing, or None to mean the
     top of the pipe
   @type StartPipe: object
+  @ivar Repeat: Number of identical messages this one stands in for after
+    key repeat coalescing
+  @type Repeat: integer
+  @ivar Kept: Does something hold this message after it is handled?
+  @type Kept: boolean
+  @cvar Lane: Input queue lane for this kind of message, or None to let the
+    manager choose one by ID
+  @type Lane: integer
   '''
+  __slots__ = ('ResultData', 'UserData', 'Stop', 'Seen', 'ID', 'Name', 'Time',
+               'Destination', 'Modified', 'StartPipe', 'Repeat', 'Kept')
+  Lane = None
+
   def __init__(self, ID):
     '''
     Initializes an instance.
@@ -58,6 +70,8 @@ class InboundMessage(object):
     self.Destination = None
     self.Modified = 0
     self.StartPipe = None
+    self.Repeat = 1
+    self.Kept = False
 
   def __eq__(self, o):
     '''
@@ -98,6 +112,21 @@ class InboundMessage(object):
     @type starting: L{Input.Pipe}
     '''
     self.StartPipe = starting
+
+  def Keep(self):
+    '''
+    Marks this message as held after it is handled. Must be called by anything
+    that stores a reference to the message beyond its handler so the message
+    is not reused by a pool.
+    '''
+    self.Kept = True
+
+  def Release(self):
+    '''
+    Virtual method. Called by the input manager after the message has been
+    handled so pooled message types can be reused if not kept.
+    '''
+    pass
     
 class TextMessage(InboundMessage):
   '''
@@ -106,6 +135,8 @@ class TextMessage(InboundMessage):
   @ivar Text: Text chunk
   @type Text: string
   '''
+  __slots__ = ('Text',)
+
   def __init__(self, ID, text):
     '''
     Stores the text chunk. Sets the message ID.
@@ -125,6 +156,8 @@ class KeyMessage(InboundMessage):
   @ivar Press: Was the key pressed (True) or released (False)?
   @type Press: boolean
   '''
+  __slots__ = ('ascii', 'Press')
+
   def __init__(self, event, modified, press):
     '''
     Grabs important information from the event object and stores it. Stores
@@ -0,0 +1,296 @@
+'''
+Defines a recorder that logs user key messages to a compact binary file and a
+driver that replays such a log through the input manager to measure how
+quickly messages are handled.
+
+@author: Peter Parente <parente@cs.unc.edu>
+@copyright: Copyright (c) 2008 Peter Parente
+@license: BSD License
+
+All rights reserved. This program and the accompanying materials are made
+available under the terms of The BSD License which accompanies this
+distribution, and is available at
+U{http://www.opensource.org/licenses/bsd-license.php}
+'''
+import struct, time, threading
+import Manager
+from Messages import KeyMessage
+
+# file header and version of the log format
+MAGIC = 'CLQR\x01'
+# time offset, key ID, extended flag, ascii value, modifiers, press flag
+RECORD = struct.Struct('<dHBBBB')
+
+class Recorder(object):
+  '''
+  Logs key messages as they are queued by the input manager. Records are kept
+  in memory until the recorder is closed so the key hook never waits on disk.
+
+  @ivar filename: Name of the log file
+  @type filename: string
+  @ivar start: Time at which recording started
+  @type start: float
+  @ivar records: Packed records not yet written
+  @type records: list of string
+  '''
+  def __init__(self, filename):
+    '''
+    Initializes an instance.
+
+    See instance variables for parameter descriptions.
+    '''
+    self.filename = filename
+    self.start = time.time()
+    self.records = []
+
+  def Record(self, message):
+    '''
+    Packs the ID, modifiers, press state, and time of a key message.
+
+    @param message: Key message just queued
+    @type message: L{Messages.KeyMessage}
+    '''
+    kid, ext = message.ID
+    self.records.append(RECORD.pack(time.time()-self.start, kid, ext,
+                                    message.ascii, message.Modified,
+                                    message.Press))
+
+  def Close(self):
+    '''Writes all records to the log file.'''
+    f = file(self.filename, 'wb')
+    try:
+      f.write(MAGIC)
+      f.write(''.join(self.records))
+    finally:
+      f.close()
+    self.records = []
+
+class KeyEvent(object):
+  '''
+  Stand-in for a pyHook.KeyboardEvent rebuilt from a log record.
+  '''
+  def __init__(self, kid, ext, ascii):
+    self.KeyID = kid
+    self.Extended = ext
+    self.Ascii = ascii
+    self.Key = None
+    self.Time = 0
+
+def LoadSession(filename):
+  '''
+  Reads a log written by L{Recorder}.
+
+  @param filename: Name of the log file
+  @type filename: string
+  @return: Time offset and key message for each record in order
+  @rtype: list of 2-tuple of (float, L{Messages.KeyMessage})
+  @raise ValueError: When the file is not a session log
+  '''
+  f = file(filename, 'rb')
+  try:
+    data = f.read()
+  finally:
+    f.close()
+  if not data.startswith(MAGIC):
+    raise ValueError('%s is not a session log' % filename)
+  session = []
+  size = RECORD.size
+  for i in xrange(len(MAGIC), len(data)-size+1, size):
+    t, kid, ext, ascii, mod, press = RECORD.unpack_from(data, i)
+    session.append((t, KeyMessage(KeyEvent(kid, ext, ascii), mod, bool(press))))
+  return session
+
+class ReplayManager(Manager.Manager):
+  '''
+  Input manager that queues and dispatches messages like the real one but
+  never hooks the keyboard. Not a singleton.
+  '''
+  def __new__(cls):
+    '''
+    Builds an unhooked manager.
+
+    @return: New instance of this class
+    @rtype: L{ReplayManager}
+    '''
+    self = threading.Thread.__new__(cls)
+    self.Initialize()
+    return self
+
+  def Destroy(self):
+    '''Stops message processing.'''
+    self.alive = False
+
+class FakeView(Manager.Pipe):
+  '''
+  Stand-in for an application view at the end of the input pipe. Handles any
+  command by counting it, optionally taking some time to simulate the cost of
+  talking to a real application model.
+
+  @ivar delay: Seconds spent handling each command
+  @type delay: float
+  @ivar handled: Number of times each command was handled keyed by method name
+  @type handled: dictionary
+  '''
+  def __init__(self, delay=0.0):
+    '''
+    Initializes an instance.
+
+    See instance variables for parameter descriptions.
+    '''
+    Manager.Pipe.__init__(self)
+    self.delay = delay
+    self.handled = {}
+
+  def __getattr__(self, name):
+    '''
+    Provides a handler for any command method name.
+
+    @param name: Name of the method
+    @type name: string
+    @return: Handler that counts the command
+    @rtype: callable
+    @raise AttributeError: When the name is not a command handler
+    '''
+    if not name.startswith('On'):
+      raise AttributeError(name)
+    def Handler(message):
+      self.handled[name] = self.handled.get(name, 0) + 1
+      if self.delay:
+        time.sleep(self.delay)
+    return Handler
+
+class Replayer(object):
+  '''
+  Feeds a recorded session through L{ReplayManager.ProcessMessages} and
+  measures the time from when each message should have arrived until it was
+  handled.
+
+  @ivar session: Time offsets and key messages to replay
+  @type session: list
+  @ivar manager: Manager dispatching the replayed messages
+  @type manager: L{ReplayManager}
+  @ivar speed: Multiple of real time at which to replay, or None to replay as
+    fast as possible
+  @type speed: float
+  @ivar latencies: Seconds between arrival and handling of each message
+  @type latencies: list of float
+  @ivar elapsed: Seconds taken by the whole replay
+  @type elapsed: float
+  '''
+  def __init__(self, filename, root=None, speed=1.0):
+    '''
+    Loads a session and attaches the view that will receive it.
+
+    @param filename: Name of the log file
+    @type filename: string
+    @param root: Top of the pipe that receives messages, defaults to a
+      L{FakeView}
+    @type root: L{Manager.Pipe}
+    @param speed: See instance variables
+    @type speed: float
+    '''
+    self.session = LoadSession(filename)
+    self.manager = ReplayManager()
+    self.manager.FocusNow(root or FakeView())
+    self.speed = speed
+    self.latencies = []
+    self.elapsed = 0.0
+
+  def Run(self):
+    '''
+    Replays the session. Acts as the input manager singleton while running so
+    that views queueing their own messages reach the replay manager.
+
+    @return: Report of the replay
+    @rtype: string
+    '''
+    old = Manager.Manager.instance
+    Manager.Manager.instance = self.manager
+    try:
+      self._Replay()
+    finally:
+      Manager.Manager.instance = old
+    return self.Report()
+
+  def _Replay(self):
+    '''
+    Queues messages when they are due and processes the queue like the main
+    pump does, once per tick.
+    '''
+    self.latencies = []
+    pending = list(self.session)
+    start = time.time()
+    while pending:
+      now = time.time()
+      due = []
+      if self.speed is None:
+        # as fast as possible, one message per tick
+        due.append(now)
+        t, msg = pending.pop(0)
+        self._Queue(msg)
+      else:
+        while pending and start+pending[0][0]/self.speed <= now:
+          t, msg = pending.pop(0)
+          due.append(start+t/self.speed)
+          self._Queue(msg)
+      if not due:
+        time.sleep(min(0.001, start+pending[0][0]/self.speed-now))
+        continue
+      self.manager.ProcessMessages()
+      done = time.time()
+      self.latencies.extend([done-t for t in due])
+    # drain anything left behind by the handlers
+    self.manager.ProcessMessages()
+    self.elapsed = time.time()-start
+
+  def _Queue(self, msg):
+    '''
+    Queues a recorded message for dispatch. Resets its repeat count first since
+    coalescing changes the count on the message itself and the same messages
+    are queued again by every run.
+
+    @param msg: Recorded message
+    @type msg: L{Messages.KeyMessage}
+    '''
+    msg.Repeat = 1
+    self.manager.AddMessage(msg)
+
+  def Report(self):
+    '''
+    Summarizes latency and throughput of the last replay.
+
+    @return: Human readable report
+    @rtype: string
+    '''
+    n = len(self.latencies)
+    if not n:
+      return 'no messages replayed'
+    ordered = sorted(self.latencies)
+    if self.speed is None:
+      mode = 'as fast as possible'
+    else:
+      mode = '%gx' % self.speed
+    lines = ['replayed %d messages at %s in %.3f sec' % (n, mode, self.elapsed),
+             'throughput: %.1f messages/sec' % (n/max(self.elapsed, 1e-9)),
+             'latency mean: %.2f ms' % (sum(ordered)/n*1000),
+             'latency median: %.2f ms' % (ordered[n//2]*1000),
+             'latency 95th: %.2f ms' % (ordered[min(n-1, int(n*0.95))]*1000),
+             'latency max: %.2f ms' % (ordered[-1]*1000)]
+    depths = self.manager.GetLaneDepths()
+    lines.append('peak lane depths: %s' %
+                 ', '.join(['%s %d' % (name, depths[name][1])
+                            for name in sorted(depths)]))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+  import sys
+  if len(sys.argv) < 2:
+    print 'usage: Replay.py session.log [speed|fast]'
+    sys.exit(1)
+  if len(sys.argv) > 2 and sys.argv[2] == 'fast':
+    speed = None
+  elif len(sys.argv) > 2:
+    speed = float(sys.argv[2])
+  else:
+    speed = 1.0
+  print Replayer(sys.argv[1], speed=speed).Run()
@@ -11,6 +11,6 @@ distribution, and is available at
 U{http://www.opensource.org/licenses/bsd-license.php}
 '''
 
-from Manager import Manager, Pipe
+from Manager import Manager, Pipe, handles_repeats
 from Messages import InboundMessage, TextMessage
 import Constants
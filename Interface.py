@@ -98,6 +98,19 @@ class IInfiniteCollection(Interface):
   def NextItem(): pass
   def PrevItem(): pass
     
+class ISkippable(Interface):
+  '''
+  Allows navigation past more than one item at a time.
+  '''
+  def SkipItems(count): pass
+
+class IPrefetchable(Interface):
+  '''
+  Allows reading the items around the selected one ahead of the user moving to
+  them. Yields the name of each item as it is read.
+  '''
+  def PrefetchNeighbors(count): pass
+
 class IFiniteCollection(IInfiniteCollection):
   '''
   Allows navigation to the first item in a bounded collection. Provides methods
@@ -0,0 +1,212 @@
+'''
+Defines a mixin that counts and times calls made on the methods of another
+class and attributes them to the adapter method that made them. Used to see how
+many cross-process calls each key press costs.
+
+@var ledger: Accounts for all calls made since the last key press
+@type ledger: L{Ledger}
+
+@author: Peter Parente <parente@cs.unc.edu>
+@copyright: Copyright (c) 2008 Peter Parente
+@license: BSD License
+
+All rights reserved. This program and the accompanying materials are made
+available under the terms of The BSD License which accompanies this
+distribution, and is available at
+U{http://www.opensource.org/licenses/bsd-license.php}
+'''
+
+import Mixer, Config
+import sys, time
+
+# number of most costly callers reported per key press
+TOP_CALLERS = 5
+
+class Ledger(object):
+  '''
+  Accounts for calls in the span of one input message and over the session.
+
+  @ivar depth: Number of accounted calls in progress
+  @type depth: integer
+  @ivar caller: Adapter method that made the outermost call in progress
+  @type caller: string
+  @ivar span: Count and time of calls keyed by caller and method name for the
+    current input message
+  @type span: dictionary
+  @ivar totals: Count and time of calls keyed by caller and method name for
+    the whole session
+  @type totals: dictionary
+  @ivar log: Open log file or None if not yet opened
+  @type log: file
+  '''
+  def __init__(self):
+    '''
+    Initializes an empty ledger.
+    '''
+    self.depth = 0
+    self.caller = None
+    self.span = {}
+    self.totals = {}
+    self.log = None
+
+  def FindCaller(self, frame):
+    '''
+    Walks up the stack to find the adapter method responsible for a call.
+
+    @param frame: Frame of the wrapper making the call
+    @type frame: frame
+    @return: Module, class, and method name of the caller or 'other' if no
+      adapter is on the stack
+    @rtype: string
+    '''
+    while frame is not None:
+      code = frame.f_code
+      if 'Adapters' in code.co_filename:
+        try:
+          cls = frame.f_locals['self'].__class__
+        except KeyError:
+          return '%s.%s' % (frame.f_globals.get('__name__'), code.co_name)
+        return '%s.%s.%s' % (cls.__module__.split('.')[-1], cls.__name__,
+                             code.co_name)
+      frame = frame.f_back
+    return 'other'
+
+  def Add(self, caller, name, count, elapsed):
+    '''
+    Adds calls to the current span.
+
+    @param caller: Adapter method responsible for the calls
+    @type caller: string
+    @param name: Name of the method called
+    @type name: string
+    @param count: Number of calls
+    @type count: integer
+    @param elapsed: Seconds spent in the calls
+    @type elapsed: float
+    '''
+    try:
+      entry = self.span[(caller, name)]
+    except KeyError:
+      entry = self.span[(caller, name)] = [0, 0.0]
+    entry[0] += count
+    entry[1] += elapsed
+
+  def Begin(self):
+    '''Starts a new span, discarding calls not made during an input message.'''
+    self.span = {}
+
+  def End(self, message):
+    '''
+    Ends the span for an input message. Adds it to the session totals and logs
+    a summary of the calls made while handling the message.
+
+    @param message: Message that was handled
+    @type message: L{Input.Messages.InboundMessage}
+    '''
+    if not self.span:
+      return
+    by_caller = {}
+    count = 0
+    elapsed = 0.0
+    for (caller, name), (n, t) in self.span.iteritems():
+      try:
+        total = self.totals[(caller, name)]
+      except KeyError:
+        total = self.totals[(caller, name)] = [0, 0.0]
+      total[0] += n
+      total[1] += t
+      entry = by_caller.setdefault(caller, [0, 0.0])
+      entry[0] += n
+      entry[1] += t
+      count += n
+      elapsed += t
+    top = by_caller.items()
+    top.sort(key=lambda item: item[1][1], reverse=True)
+    lines = ['%s: %d calls, %.1f ms' % (message.Name or str(message.ID), count,
+                                        elapsed*1000)]
+    for caller, (n, t) in top[:TOP_CALLERS]:
+      lines.append('  %s: %d calls, %.1f ms' % (caller, n, t*1000))
+    self.Write('\n'.join(lines))
+    self.span = {}
+
+  def Write(self, text):
+    '''
+    Appends text to the accounting log.
+
+    @param text: Text to write
+    @type text: string
+    '''
+    if self.log is None:
+      self.log = file(Config.account_log, 'a')
+    self.log.write(text+'\n')
+    self.log.flush()
+
+  def GetTotals(self):
+    '''
+    @return: Count and time of all calls in the session keyed by caller and
+      method name, most costly first
+    @rtype: list of 2-tuple
+    '''
+    totals = self.totals.items()
+    totals.sort(key=lambda item: item[1][1], reverse=True)
+    return totals
+
+ledger = Ledger()
+
+class AccountingMixin(Mixer.ClassMixer):
+  '''
+  Defines wrappers that record every call to the methods of a class, and so
+  every property read through those methods, in the L{ledger}. Only the
+  outermost call is timed so composite methods are not counted twice, but all
+  calls are counted.
+  '''
+  def AccountWrapper(self, name, func):
+    '''
+    Builds a method wrapper that counts and times the original method.
+
+    @param name: Original method name
+    @type name: string
+    @param func: Original method
+    @type func: function
+    @return: Method wrapping the original method
+    @rtype: callable
+    '''
+    def Prototype(self, *args, **kwargs):
+      if ledger.depth:
+        # nested call, count it against the outer caller but do not time it
+        ledger.Add(ledger.caller, name, 1, 0.0)
+        ledger.depth += 1
+        try:
+          return func(self, *args, **kwargs)
+        finally:
+          ledger.depth -= 1
+      caller = ledger.caller = ledger.FindCaller(sys._getframe(1))
+      ledger.depth = 1
+      start = time.clock()
+      try:
+        return func(self, *args, **kwargs)
+      finally:
+        ledger.Add(caller, name, 1, time.clock()-start)
+        ledger.depth = 0
+        ledger.caller = None
+    return Prototype
+
+  def KeystrokeWrapper(self, name, func):
+    '''
+    Builds a method wrapper that accounts for all calls made while an input
+    message is dispatched and logs them when it has been handled.
+
+    @param name: Original method name
+    @type name: string
+    @param func: Original method taking the message as its first argument
+    @type func: function
+    @return: Method wrapping the original method
+    @rtype: callable
+    '''
+    def Prototype(self, message, *args, **kwargs):
+      ledger.Begin()
+      try:
+        return func(self, message, *args, **kwargs)
+      finally:
+        ledger.End(message)
+    return Prototype
@@ -0,0 +1,87 @@
+'''
+Defines a mixin that remembers property reads on objects for the length of one
+input message so that reading the same property twice while handling a key press
+crosses into the other process only once.
+
+@var memo: Values read during the current input message keyed by object
+  identity and method name, or None outside of an input message
+@type memo: dictionary
+
+@author: Peter Parente <parente@cs.unc.edu>
+@copyright: Copyright (c) 2008 Peter Parente
+@license: BSD License
+
+All rights reserved. This program and the accompanying materials are made
+available under the terms of The BSD License which accompanies this
+distribution, and is available at
+U{http://www.opensource.org/licenses/bsd-license.php}
+'''
+
+import Mixer
+
+memo = None
+
+def Forget(self, name):
+  '''
+  Forgets all values read during the current input message. Hooked after
+  methods that change the state of the other process.
+
+  @param name: Name of the method that was called
+  @type name: string
+  '''
+  if memo is not None:
+    memo.clear()
+
+class MemoMixin(Mixer.ClassMixer):
+  '''
+  Defines a wrapper that memoizes argument free getter methods, and so the
+  properties built on them, and a wrapper that scopes the memo to the dispatch
+  of a single input message.
+  '''
+  def MemoWrapper(self, name, func):
+    '''
+    Builds a method wrapper that returns a value read earlier in the same input
+    message instead of calling the original method again.
+
+    @param name: Original method name
+    @type name: string
+    @param func: Original method taking no arguments
+    @type func: function
+    @return: Method wrapping the original method
+    @rtype: callable
+    '''
+    def Prototype(self):
+      if memo is None:
+        return func(self)
+      key = (id(self), name)
+      try:
+        return memo[key][0]
+      except KeyError:
+        pass
+      r = func(self)
+      # hold self so its id is not reused while the entry lives
+      memo[key] = (r, self)
+      return r
+    return Prototype
+
+  def ScopeWrapper(self, name, func):
+    '''
+    Builds a method wrapper that starts a fresh memo before the original method
+    and discards it after.
+
+    @param name: Original method name
+    @type name: string
+    @param func: Original method
+    @type func: function
+    @return: Method wrapping the original method
+    @rtype: callable
+    '''
+    def Prototype(self, *args, **kwargs):
+      global memo
+      outer = memo
+      memo = {}
+      try:
+        return func(self, *args, **kwargs)
+      finally:
+        memo = outer
+    return Prototype
@@ -14,6 +14,46 @@ U{http://www.opensource.org/licenses/bsd-license.php}
 
 import new, types, re
 
+def _BuildHooked(name, func, pre, post):
+  '''
+  Builds one function that calls the pre hooks, the original function, and the
+  post hooks. Avoids looping over the hooks in the common cases of a single pre
+  or post hook.
+
+  @param name: Original method name
+  @type name: string
+  @param func: Original function
+  @type func: function
+  @param pre: Functions to call before the original
+  @type pre: list
+  @param post: Functions to call after the original
+  @type post: list
+  @return: Wrapper function
+  @rtype: function
+  '''
+  pre = tuple(pre)
+  post = tuple(post)
+  if not pre and len(post) == 1:
+    after = post[0]
+    def Prototype(self, *args, **kwargs):
+      r = func(self, *args, **kwargs)
+      after(self, name)
+      return r
+  elif len(pre) == 1 and not post:
+    before = pre[0]
+    def Prototype(self, *args, **kwargs):
+      before(self, name)
+      return func(self, *args, **kwargs)
+  else:
+    def Prototype(self, *args, **kwargs):
+      for hook in pre:
+        hook(self, name)
+      r = func(self, *args, **kwargs)
+      for hook in post:
+        hook(self, name)
+      return r
+  return Prototype
+
 class ClassMixer(object):
   '''  
   Wraps method calls in a class with methods defined in subclasses of this
@@ -24,6 +64,9 @@ class ClassMixer(object):
   @ivar prefix: Text to be prepended to original method names when they are 
     modified
   @type prefix: string
+  @ivar hooks: Original function and lists of pre and post hook functions keyed
+    by the name of each hooked method
+  @type hooks: dictionary
   '''
   def __init__(self, other, prefix='mixed_'):
     '''
@@ -33,6 +76,7 @@ class ClassMixer(object):
     '''
     self.other = other
     self.prefix = prefix
+    self.hooks = {}
 
   def RegenProperties(self, new_meths):
     '''
@@ -59,20 +103,54 @@ class ClassMixer(object):
           except: d = None
           setattr(self.other, name, property(fget=g, fset=s, fdel=d))
 
+  def _GetMethodNames(self, include, exclude):
+    '''
+    Gets the names of methods in the other class named in include or not named
+    in exclude, or all methods if both are None.
+
+    @param include: Method names to select
+    @type include: list
+    @param exclude: Method names to avoid
+    @type exclude: list
+    @return: Names of the selected methods
+    @rtype: list of string
+    '''
+    return [name for name in self.other.__dict__.keys()
+            if isinstance(self.other.__dict__[name], types.FunctionType) and
+            not name.startswith(self.prefix) and
+            (include is None or name in include) and
+            (exclude is None or name not in exclude)]
+
+  def _Install(self, name, func):
+    '''
+    Installs a wrapper function under the name of the method it wraps.
+
+    @param name: Original method name
+    @type name: string
+    @param func: Wrapper function
+    @type func: function
+    @return: Installed method
+    @rtype: function
+    '''
+    method = new.function(func.func_code, func.func_globals, name,
+                          func.func_defaults, func.func_closure)
+    setattr(self.other, name, method)
+    return method
+
   def WrapMethods(self, wrapper, include=None, exclude=None):
     '''    
     Wraps methods named in include or those not in exclude, or all methods if
     both are None, with the callable returned by the function in parameter
     wrapper. Each wrapper method takes the name of the function it is wrapping
-    and the prefix and is expected to return an callable that takes a variable
-    number of positional and keyword arguments. The wrapper is responsible for
-    calling the original function by its new name (i.e. prefix+name) if desired.
-    For example,
+    and the original function and is expected to return an callable that takes
+    a variable number of positional and keyword arguments. The wrapper is 
+    responsible for calling the original function if desired. The original 
+    function remains available by its new name (i.e. prefix+name). For example,
     
-    def MyWrapper(self, name, prefix):
+    def MyWrapper(self, name, func):
       def PrintIt(self, *args, **kwargs):
         print args, kwargs
-        r = getattr(self, prefix+name)(*args, **kwargs)
+        r = func(self, *args, **kwargs)
         print r
         return r
       return PrintIt
@@ -87,25 +165,70 @@ class ClassMixer(object):
     new_meths = {}
 
     # replace unbound methods with our wrapper
-    for name in self.other.__dict__.keys():
-      if isinstance(self.other.__dict__[name], types.FunctionType) and \
-        not name.startswith(self.prefix) and \
-        (include is None or name in include) and \
-        (exclude is None or name not in exclude):
-        # create an internal version of this method
-        setattr(self.other, self.prefix+name, self.other.__dict__[name])
-        # create a wrapper version of this method
-        #method = new.instancemethod(wrapper(name, self.prefix), None, self.other)
-        func = wrapper(name, self.prefix)
-        method = new.function(func.func_code, func.func_globals, name,
-                              func.func_defaults, func.func_closure)
-        setattr(self.other, name, method)
-        # store method locally in case it is referenced by a property
-        new_meths[name] = method
+    for name in self._GetMethodNames(include, exclude):
+      func = self.other.__dict__[name]
+      # later hooks must wrap this wrapper, not fold into earlier hooks
+      self.hooks.pop(name, None)
+      # create an internal version of this method
+      setattr(self.other, self.prefix+name, func)
+      # create a wrapper version of this method that calls the original directly
+      new_meths[name] = self._Install(name, wrapper(name, func))
 
     # regenerate properties in case their methods have changed
     self.RegenProperties(new_meths)
 
+  def _ResolveHook(self, hook):
+    '''
+    Gets the function for a hook given by name or as a callable. Looks for
+    named hooks in the other class first and in this mixer class next.
+
+    @param hook: Hook function or method name
+    @type hook: callable or string
+    @return: Hook function
+    @rtype: callable
+    '''
+    if callable(hook):
+      return hook
+    try:
+      return self.other.__dict__[hook]
+    except KeyError:
+      return getattr(self.__class__, hook).im_func
+
+  def HookMethods(self, pre=None, post=None, include=None, exclude=None):
+    '''
+    Calls hook functions before or after methods named in include or those not
+    in exclude, or all methods if both are None. Each hook is called with the
+    object and the name of the method. Hooks added to a method that already has
+    hooks are folded into the same wrapper rather than wrapping it again, so a
+    call costs one wrapper no matter how many hooks there are.
+
+    @param pre: Hooks, or names of methods, to call before the original
+    @type pre: list
+    @param post: Hooks, or names of methods, to call after the original
+    @type post: list
+    @param include: Method names to hook
+    @type include: list
+    @param exclude: Method names to avoid hooking
+    @type exclude: list
+    '''
+    pre = [self._ResolveHook(hook) for hook in pre or []]
+    post = [self._ResolveHook(hook) for hook in post or []]
+    new_meths = {}
+    for name in self._GetMethodNames(include, exclude):
+      try:
+        func, old_pre, old_post = self.hooks[name]
+      except KeyError:
+        func = self.other.__dict__[name]
+        setattr(self.other, self.prefix+name, func)
+        old_pre, old_post = [], []
+      all_pre = old_pre + pre
+      all_post = old_post + post
+      self.hooks[name] = (func, all_pre, all_post)
+      new_meths[name] = self._Install(name,
+                                      _BuildHooked(name, func, all_pre,
+                                                   all_post))
+    self.RegenProperties(new_meths)
+
   def StirInto(self, include=None, exclude=None):
     '''    
     Adds the methods named in include or those not in exclude, or all methods if
@@ -130,3 +253,40 @@ class ClassMixer(object):
         method = new.function(func.func_code, func.func_globals, name,
                               func.func_defaults, func.func_closure)
         setattr(self.other, name, method)
+
+if __name__ == '__main__':
+  import timeit
+  
+  class Raw(object):
+    def Get(self, x):
+      return x
+    def Hook(self, name):
+      pass
+  
+  class Target(Raw):
+    def Get(self, x):
+      return x
+    
+  class Old(Target):
+    def Get(self, x):
+      return x
+  
+  def OldWrapper(name, prefix):
+    # wrapper in the style of previous releases, looked up by name every call
+    def Prototype(self, *args, **kwargs):
+      r = getattr(self, prefix+name)(*args, **kwargs)
+      self.Hook(name)
+      return r
+    return Prototype
+  Old.mixed_Get = Old.__dict__['Get']
+  Old.Get = OldWrapper('Get', 'mixed_')
+  
+  mix = ClassMixer(Target)
+  mix.HookMethods(post=[Raw.__dict__['Hook']], include=['Get'])
+  
+  n = 1000000
+  for label, cls in (('raw', Raw), ('getattr wrapper', Old), 
+                     ('closure hook', Target)):
+    t = timeit.Timer('o.Get(1)', 'from __main__ import %s; o = %s()' % 
+                     (cls.__name__, cls.__name__)).timeit(n)
+    print '%-16s %.3f us/call' % (label, t/n*1e6)
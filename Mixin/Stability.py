@@ -16,9 +16,6 @@ import Mixer, pyAA, System
 from View.Task import Container
 import win32com.client, weakref, pythoncom, time, ctypes
 
-SPIN_DELAY = 0.01 #0.01
-SAFE_WAIT = 0.1 #0.5
-
 # create an instance of WSH Shell
 ws_shell = win32com.client.Dispatch("WScript.Shell")
 # get a reference to the user32 DLL
@@ -26,10 +23,10 @@ user32 = ctypes.windll.user32
 
 class StabilityMixin(Mixer.ClassMixer):
   '''
-  Defines prefix and suffix methods that check-in with a stability manager and
-  perturb it. Also defines an initialization method that establishes a reference
-  to the proper stability manager instance. This class is used to add stability
-  checks to pyAA.AccessibleObject.
+  Defines methods that check-in with a stability manager before reads and
+  perturb it after modifications. Also defines an initialization method that
+  establishes a reference to the proper stability manager instance. This class
+  is used to add stability checks to pyAA.AccessibleObject.
 
   @ivar stable: Stability manager for the process that created this object
   @type stable: weakref.proxy for L{UIA.StabilityWatcher}
@@ -60,18 +57,24 @@ class StabilityMixin(Mixer.ClassMixer):
 
   def CheckStability(self):
     '''
-    Checks the last time an event occurred in a process and compares it against
-    a threshold. Blocks until the threshold has been passed.
+    Checks the time at which the process will be stable given the last event
+    that occurred in it. Sleeps until then, again if events arrived during the
+    sleep, and not at all if the process is already stable.
     '''
     stab = self.GetStabilityWatcher()
     if stab is None: return
-    while 1:
-      # sleep and pump messages
-      System.Sleep(SPIN_DELAY)
-      # check if the interface is stable
-      if (time.time() - stab.LastTime) > SAFE_WAIT:
-        break
-    stab.LastStable = time.time()
+    # deliver events already waiting before judging
+    pythoncom.PumpWaitingMessages()
+    start = now = time.time()
+    deadline = stab.StableAt()
+    while now < deadline:
+      # sleep and pump messages, which may deliver new events
+      System.Sleep(deadline - now)
+      now = time.time()
+      deadline = stab.StableAt()
+    if now > start:
+      stab.AddWait(now - start)
+    stab.LastStable = now
 
   def Disturb(self, name):
     '''Disturbs the last event time in the stability manager.'''
@@ -102,54 +105,60 @@ class StabilityMixin(Mixer.ClassMixer):
     self.stable = pm.GetStabilityWatcher(pid)
     return self.stable
 
-  def CheckWrapper(self, name, prefix):
+  def CheckWrapper(self, name, func):
     '''
     Builds a method wrapper that checks with the stability manager before
-    executing the original method.
+    executing the original method. Returns the result of an identical earlier
+    call instead when no event has disturbed the process since that call.
 
     @param name: Original method name
     @type name: string
-    @param prefix: Prefix used to rename the original method
-    @type prefix: string
+    @param func: Original method
+    @type func: function
     @return: Method wrapping the original method
     @rtype: callable
     '''
     def Prototype(self, *args, **kwargs):
+      stab = self.GetStabilityWatcher()
+      if stab is None:
+        return func(self, *args, **kwargs)
+      # deliver waiting events so the generation is current
+      pythoncom.PumpWaitingMessages()
+      key = (id(self), name, args, tuple(sorted(kwargs.items())))
+      try:
+        r = stab.GetCached(key)
+      except (KeyError, TypeError):
+        pass
+      else:
+        if isinstance(r, list):
+          return r[:]
+        return r
       self.CheckStability()
-      return getattr(self, prefix+name)(*args, **kwargs)
-    return Prototype
-
-  def DisturbWrapper(self, name, prefix):
-    '''
-    Builds a method wrapper that disturbs the stability manager after executing
-    the original method.
-
-    @param name: Original method name
-    @type name: string
-    @param prefix: Prefix used to rename the original method
-    @type prefix: string
-    @return: Method wrapping the original method
-    @rtype: callable
-    '''
-    def Prototype(self, *args, **kwargs):
-      r = getattr(self, prefix+name)(*args, **kwargs)
-      self.Disturb(name)
+      generation = stab.Generation
+      r = func(self, *args, **kwargs)
+      try:
+        # hold self so its id is not reused while the entry lives
+        stab.SetCached(key, r, generation, self)
+      except TypeError:
+        return r
+      if isinstance(r, list):
+        return r[:]
       return r
     return Prototype
 
-  def InitializeWrapper(self, name, prefix):
+  def InitializeWrapper(self, name, func):
     '''
     Builds a method wrapper that checks establihes a reference to the stability
     manager after executing the class constructor.
 
     @param name: Original method name
     @type name: string
-    @param prefix: Prefix used to rename the original method
-    @type prefix: string
+    @param func: Original method
+    @type func: function
     @return: Method wrapping the original method
     @rtype: callable
     '''
     def Prototype(self, *args, **kwargs):
-      getattr(self, prefix+name)(*args, **kwargs)
+      func(self, *args, **kwargs)
       self.GetStabilityWatcher()
     return Prototype
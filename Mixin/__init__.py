@@ -13,3 +13,6 @@ U{http://www.opensource.org/licenses/bsd-license.php}
 
 from Search import CircularSearchMixin
 from Stability import StabilityMixin
+from Accounting import AccountingMixin
+from Memo import MemoMixin
+import Memo
@@ -100,6 +100,12 @@ INTERMITTENT = 3
 
 # size of the output history
 HISTORY_SIZE = 50
+# most speech renderings kept for reuse
+RENDER_CACHE_SIZE = 32
+# most speculative packets waiting to be rendered
+SPECULATIVE_SIZE = 8
+# longest speech rendered speculatively, in characters
+SPECULATIVE_CHARS = 80
 
 # bookmark type constants
 BM_SOUND = 0
@@ -12,7 +12,7 @@ distribution, and is available at
 U{http://www.opensource.org/licenses/bsd-license.php}
 '''
 
-import threading, Queue, time, weakref
+import threading, Queue, time, weakref, collections
 import Worker, Constants, Storage
 import Input
 from Messages import OutboundPacket, OutboundMessage, PacketMessage
@@ -64,7 +64,7 @@ class Group(Worker.Worker):
     '''
     if packet.Listen:
       # route a message stating the packet is starting
-      pmsg = PacketMessage(Constants.PACKET_START, packet)
+      pmsg = PacketMessage.Create(Constants.PACKET_START, packet)
       pmsg.RouteTo(packet.Source)
       self.im.AddMessage(pmsg)    
     
@@ -79,7 +79,7 @@ class Group(Worker.Worker):
     '''
     if packet.Listen:
       # route a message stating the packet is done
-      pmsg = PacketMessage(Constants.PACKET_DONE, packet)
+      pmsg = PacketMessage.Create(Constants.PACKET_DONE, packet)
       pmsg.RouteTo(packet.Source)
       self.im.AddMessage(pmsg)
       
@@ -95,7 +95,7 @@ class Group(Worker.Worker):
     old_packet = self.old[0]
     if old_packet.Listen:
       # route a message stating the packet is preempted
-      pmsg = PacketMessage(Constants.PACKET_PREEMPT, packet, old_packet)
+      pmsg = PacketMessage.Create(Constants.PACKET_PREEMPT, packet, old_packet)
       pmsg.RouteTo(old_packet.Source)
       self.im.AddMessage(pmsg)
     self.old = None
@@ -111,6 +111,8 @@ class ActiveGroup(Group):
   @type speakers: dictionary
   @ivar incoming: Queue of incoming packets
   @type incoming: L{Output.Storage.PeekQueue}
+  @ivar speculative: Packets that may be played soon, rendered while idle
+  @type speculative: collections.deque
   '''
   def __init__(self, om, speakers):
     '''
@@ -126,6 +128,7 @@ class ActiveGroup(Group):
     self.speech_fac = self.speakers[k[0]].CloneSpeechFactory()
     # initialize queue and addition lock
     self.incoming = Storage.PeekQueue()
+    self.speculative = collections.deque()
     # start our thread loop running
     self.start()
     
@@ -154,6 +157,8 @@ class ActiveGroup(Group):
       except Queue.Empty:
         # no packet available, release the preempt lock
         self.plock.release()
+        # use the idle time to render speech that may be needed soon
+        self.RenderSpeculative()
     # the thread is dead
     return (None,)
     
@@ -204,6 +209,43 @@ class ActiveGroup(Group):
         pass
       index += 1
     return False
+
+  def RenderSpeculative(self):
+    '''
+    Renders the speech of one packet handed to L{Prerender} so that it is
+    ready if the packet is played later. A render cannot be interrupted, so 
+    renders nothing while a packet is waiting or preempting and skips packets
+    with long speech that would delay the next real packet.
+    '''
+    while not self.preempt.isSet() and self.incoming.empty():
+      try:
+        packet = self.speculative.popleft()
+      except IndexError:
+        return
+      try:
+        m = packet.GetMessage(Constants.CONTENT)
+      except KeyError:
+        continue
+      if m.Speech is None or len(str(m.Speech)) > Constants.SPECULATIVE_CHARS:
+        continue
+      m.Prepare(self.speech_fac)
+      return
+
+  def Prerender(self, packet):
+    '''
+    Queues a packet that is not played but may be played soon so its speech is
+    rendered while the group is idle. Drops the oldest packets when too many
+    are waiting.
+
+    @param packet: Collection of output messages
+    @type packet: L{Messages.OutboundPacket}
+    '''
+    self.speculative.append(packet)
+    while len(self.speculative) > Constants.SPECULATIVE_SIZE:
+      try:
+        self.speculative.popleft()
+      except IndexError:
+        break
     
   def Stop(self):
     '''Stop all speakers immediately.'''
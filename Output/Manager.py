@@ -41,6 +41,17 @@ class Pipe(object):
     '''
     self.parent.Output(self, packets)
 
+  def Prerender(self, source, packets):
+    '''
+    Forwards packets that may be output soon towards the output manager.
+
+    @param source: Object that called this method
+    @type source: object
+    @param packets: Packets to render ahead
+    @type packets: tuple or single L{Output.Messages.OutboundPacket}
+    '''
+    self.parent.Prerender(self, packets)
+
 class Manager(Input.Pipe):
   '''
   Public interface to the audio output system. Directs output messages to the
@@ -206,6 +217,28 @@ class Manager(Input.Pipe):
       g = self.groups[p.Group]
       g.Play(p)
 
+  def Prerender(self, source, packets):
+    '''
+    Hands packets that may be output soon to groups that render speech ahead.
+    Plays nothing.
+
+    @param source: Object that called this method
+    @type source: L{Output.Manager.Pipe}
+    @param packets: Packets to render ahead
+    @type packets: L{Messages.OutboundPacket} or tuple of same
+    '''
+    try:
+      len(packets)
+    except:
+      packets = (packets,)
+    for p in packets:
+      if p is None: continue
+      try:
+        prerender = self.groups[p.Group].Prerender
+      except AttributeError:
+        continue
+      prerender(p)
+
   def PutHistory(self, packet):
     '''
     Adds a packet to the history. Unprepares the packet first to avoid
@@ -11,9 +11,9 @@ distribution, and is available at
 U{http://www.opensource.org/licenses/bsd-license.php}
 '''
 
-import aspell, re, weakref, time
+import aspell, re, weakref, time, sys
 import Input, Interface
-import Constants
+import Constants, Config
 
 # global objects used for spell checking
 ltgt_regex = re.compile('(<)|(>)')
@@ -156,6 +156,9 @@ class OutboundPacket(object):
     self.Group = group
     self.IntendedGroup = group
     self.InputMessage = message
+    if message is not None:
+      # the packet outlives the handler, so keep the message out of its pool
+      message.Keep()
     self.Listen = listen
     self.Name = name
     self.Preemptive = self.InputMessage is not None
@@ -503,6 +506,67 @@ class BookmarkMessage(object):
     '''
     return self.bookmark_string
     
+class MessagePool(object):
+  '''
+  Free list of spent messages of one class that can be reinitialized instead of
+  allocating new ones. Only used when L{Config.pool_messages} is set.
+
+  @ivar cls: Class of message held in the pool
+  @type cls: class
+  @ivar size: Most spent messages to keep
+  @type size: integer
+  @ivar free: Spent messages ready for reuse
+  @type free: list
+  @ivar created: Number of messages allocated by the pool
+  @type created: integer
+  @ivar reused: Number of messages taken from the free list
+  @type reused: integer
+  '''
+  def __init__(self, cls, size):
+    '''
+    Initializes an instance.
+
+    See instance variables for parameter descriptions.
+    '''
+    self.cls = cls
+    self.size = size
+    self.free = []
+    self.created = 0
+    self.reused = 0
+
+  def Acquire(self, *args, **kwargs):
+    '''
+    Gets a message initialized with the given arguments, reusing a spent one if
+    one is available.
+
+    @param args: Positional arguments to the message constructor
+    @type args: list
+    @param kwargs: Keyword arguments to the message constructor
+    @type kwargs: dictionary
+    @return: Initialized message
+    @rtype: L{Input.Messages.InboundMessage}
+    '''
+    try:
+      msg = self.free.pop()
+    except IndexError:
+      self.created += 1
+      return self.cls(*args, **kwargs)
+    self.reused += 1
+    msg.__init__(*args, **kwargs)
+    return msg
+
+  def Release(self, msg):
+    '''
+    Returns a spent message to the free list if there is room. Clears its
+    fields so it does not keep packets or text alive while waiting.
+
+    @param msg: Message no longer referenced anywhere else
+    @type msg: L{Input.Messages.InboundMessage}
+    '''
+    if len(self.free) < self.size:
+      msg.__init__()
+      self.free.append(msg)
+
 class PacketMessage(Input.InboundMessage):
   '''
   Notification of an event during packet processing.
@@ -512,6 +576,9 @@ class PacketMessage(Input.InboundMessage):
   @ivar Old: Preempted packet
   @type Old: L{OutboundPacket}
   '''
+  __slots__ = ('Packet', 'Old')
+  Lane = Input.Constants.NOTIFY_LANE
+
   def __init__(self, ID=None, packet=None, old=None):
     '''
     Initialize an instance.
@@ -522,6 +589,28 @@ class PacketMessage(Input.InboundMessage):
     self.Packet = packet
     self.Old = old
 
+  def Create(cls, ID=None, packet=None, old=None):
+    '''
+    Gets a new or recycled packet message.
+
+    See instance variables for parameter descriptions.
+
+    @return: Initialized message
+    @rtype: L{PacketMessage}
+    '''
+    if Config.pool_messages:
+      return packet_pool.Acquire(ID, packet, old)
+    return cls(ID, packet, old)
+  Create = classmethod(Create)
+
+  def Release(self):
+    '''
+    Returns this message to the pool if pooling is enabled and no handler
+    kept it.
+    '''
+    if Config.pool_messages and not self.Kept:
+      packet_pool.Release(self)
+
 class StreamMessage(Input.InboundMessage):
   '''
   Notification of an event within a speech stream. 
@@ -544,6 +633,10 @@ class StreamMessage(Input.InboundMessage):
   @ivar Name: Optional identifying name for this message
   @type Name: string
   '''
+  __slots__ = ('Sound', 'Text', 'AllText', 'RawPosition', 'TruePosition',
+               'Difference')
+  Lane = Input.Constants.NOTIFY_LANE
+
   def __init__(self, sound=None, ID=None, text=None, raw_position=None,
                true_position=None, difference=None, all_text=None,
                name=None):
@@ -561,6 +654,28 @@ class StreamMessage(Input.InboundMessage):
     self.TruePosition = true_position
     self.Difference = difference
     self.Name = None
+
+  def Create(cls, **kwargs):
+    '''
+    Gets a new or recycled stream message.
+
+    @param kwargs: Keyword arguments to the constructor
+    @type kwargs: dictionary
+    @return: Initialized message
+    @rtype: L{StreamMessage}
+    '''
+    if Config.pool_messages:
+      return stream_pool.Acquire(**kwargs)
+    return cls(**kwargs)
+  Create = classmethod(Create)
+
+  def Release(self):
+    '''
+    Returns this message to the pool if pooling is enabled and no handler
+    kept it.
+    '''
+    if Config.pool_messages and not self.Kept:
+      stream_pool.Release(self)
     
   def Clone(self):
     '''
@@ -570,11 +685,11 @@ class StreamMessage(Input.InboundMessage):
     @return: Deep copy of this object sharing no references with the original
     @rtype: L{StreamMessage}
     '''
-    return StreamMessage(sound=self.Sound, ID=self.ID, text=self.Text, 
-                         raw_position=self.RawPosition, 
-                         true_position=self.TruePosition, 
-                         difference=self.Difference, all_text=self.AllText,
-                         name=self.Name)
+    return StreamMessage.Create(sound=self.Sound, ID=self.ID, text=self.Text, 
+                                raw_position=self.RawPosition, 
+                                true_position=self.TruePosition, 
+                                difference=self.Difference,
+                                all_text=self.AllText, name=self.Name)
 
   def Prepare(self, message):
     '''
@@ -585,8 +700,66 @@ class StreamMessage(Input.InboundMessage):
     @type message: L{OutboundMessage}
     '''
     self.Name = message.Name
-    
+
+packet_pool = MessagePool(PacketMessage, Config.message_pool_size)
+stream_pool = MessagePool(StreamMessage, Config.message_pool_size)
+
+def BenchmarkAllocation(minutes=10, wpm=180, words_per_packet=12):
+  '''
+  Simulates the notification traffic of a continuous read of the given length
+  with and without pooling and prints the allocations and time taken for each.
+  Every word produces a stream event routed to its source plus a clone for the
+  speaker observer. Every packet produces start and done messages. Each message
+  is released the way the input manager releases it after dispatch.
+
+  @param minutes: Length of the simulated read
+  @type minutes: number
+  @param wpm: Speech rate in words per minute
+  @type wpm: integer
+  @param words_per_packet: Words spoken per packet
+  @type words_per_packet: integer
+  '''
+  words = int(minutes*wpm)
+  text = 'the quick brown fox jumps over the lazy dog'
+  old = Config.pool_messages
+  try:
+    for pooled in (False, True):
+      Config.pool_messages = pooled
+      stream_pool.created = stream_pool.reused = 0
+      packet_pool.created = packet_pool.reused = 0
+      total = 0
+      start = time.clock()
+      for i in xrange(words):
+        if i % words_per_packet == 0:
+          msg = PacketMessage.Create(Constants.PACKET_START, None)
+          msg.Release()
+          total += 1
+        msg = StreamMessage.Create(ID=Constants.SAY_WORD, text='fox',
+                                   raw_position=i, true_position=i,
+                                   difference=4, all_text=text)
+        clone = msg.Clone()
+        msg.Release()
+        clone.Release()
+        total += 2
+        if i % words_per_packet == words_per_packet-1:
+          msg = PacketMessage.Create(Constants.PACKET_DONE, None)
+          msg.Release()
+          total += 1
+      elapsed = time.clock()-start
+      if pooled:
+        allocated = stream_pool.created+packet_pool.created
+      else:
+        allocated = total
+      print '%s: %d words, %d messages, %d allocated, %.3f sec' % \
+            (pooled and 'pooled' or 'unpooled', words, total, allocated,
+             elapsed)
+  finally:
+    Config.pool_messages = old
+
 if __name__ == '__main__':
+  if sys.argv[1:] == ['bench']:
+    BenchmarkAllocation()
+    sys.exit(0)
   p = OutboundPacket(object, object)
   p.AddMessage(person=0, speech='<Thiss> is a testt of the <systeem >. Oncee upon a time, there was a < little boyy.', spell=True)
   p.AddMessage(person=1, speech='http://www.cs.unc.edu', letters=True)
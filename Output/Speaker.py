@@ -16,6 +16,29 @@ import pythoncom, pySonic, pyTTS
 import Storage, Worker, Constants
 import Input, Support, Config
 
+# wave data, format, and stream events of rendered speech keyed by voice, text,
+# markup flag, and rate, shared by all factories so speech rendered ahead by
+# one is played by another
+_rendered = {}
+
+class RenderedEvent(object):
+  '''
+  Copy of a speech stream event. A fresh copy is handed to every stream queue 
+  built from a cached rendering since the queue adjusts events in place.
+  '''
+  def __init__(self, event):
+    '''
+    Copies the event fields used by L{Storage.StreamQueue}.
+
+    @param event: Event to copy
+    @type event: pyTTS.Event or L{RenderedEvent}
+    '''
+    self.EventType = event.EventType
+    self.StreamPosition = event.StreamPosition
+    self.CharacterPosition = getattr(event, 'CharacterPosition', None)
+    self.Length = getattr(event, 'Length', None)
+    self.Name = getattr(event, 'Name', None)
+
 class Factory(object):
   '''
   Base audio output class that returns empty sounds that can be played, but make
@@ -64,6 +87,8 @@ class SpeechFactory(Factory):
 
   @ivar tts: Text-to-speech synthesizer
   @type tts: pyTTS.?
+  @ivar voice: Name of the voice
+  @type voice: string
   '''
   def __init__(self, voice):
     '''
@@ -72,6 +97,7 @@ class SpeechFactory(Factory):
     @param voice: Name of the voice to use when generating speech
     @type voice: string
     '''
+    self.voice = voice
     self.tts = pyTTS.Create(output=False)
     self.tts.SetOutputFormat(16, 16, 1)
     self.tts.Voice = voice
@@ -89,7 +115,9 @@ class SpeechFactory(Factory):
 
   def Create(self, message):
     '''
-    Produce speech audio output based on the output message.
+    Produce speech audio output based on the output message. Reuses the wave
+    data and events of the same text rendered earlier in the same voice and
+    rate by any factory.
 
     @param message: Message containing information about the audio to generate
     @type message: L{Messages.OutboundMessage}
@@ -100,31 +128,58 @@ class SpeechFactory(Factory):
     sound = pySonic.Sound()
     # only render if we actually have speech data
     if message.Speech is not None:
-      # compute the xml flag
-      xml = (message.IsXML and pyTTS.tts_is_xml) or \
-            (not message.IsXML and pyTTS.tts_is_not_xml)
+      key = (self.voice, message.Speech, message.IsXML, Config.speech_rate)
       try:
-        # update the speech rate
-        self.tts.Rate = Config.speech_rate
-        # try to generate audio data
-        stream, tts_events = self.tts.Speak(message.Speech, xml)
-      except pythoncom.com_error:
-        # ensure coinit called in this thread context and retry
-        pythoncom.CoInitialize()
-        return self.Create(message)
-      except:
-        return sound, events
-      # get audio format info and wave data
-      format = stream.Format.GetWaveFormatEx()
-      data = stream.GetData()[int(-0.0125*self.tts.Rate+0.2):-1600]
+        data, format, tts_events = _rendered[key]
+      except KeyError:
+        try:
+          data, format, tts_events = self.Render(message)
+        except ValueError:
+          return sound, events
+        if len(_rendered) >= Constants.RENDER_CACHE_SIZE:
+          _rendered.clear()
+        _rendered[key] = (data, format, tts_events)
+      channels, bits, rate = format
       if len(data) > 0:
         # create the audio data as a sample so playback position is accurate
-        sound = pySonic.MemorySample(data, format.Channels, format.BitsPerSample,
-                        format.SamplesPerSec, pySonic.Constants.FSOUND_HW3D)
+        sound = pySonic.MemorySample(data, channels, bits, rate,
+                                     pySonic.Constants.FSOUND_HW3D)
       # there might be events regardless of whether or not sound was made
-      events = Storage.StreamQueue(tts_events, message, format.BitsPerSample/8)
+      events = Storage.StreamQueue([RenderedEvent(e) for e in tts_events], 
+                                   message, bits/8)
     return sound, events
 
+  def Render(self, message):
+    '''
+    Synthesizes the speech of a message.
+
+    @param message: Message containing speech to render
+    @type message: L{Messages.OutboundMessage}
+    @return: Wave data, channels, bits per sample, and sample rate, and 
+      copies of the stream events
+    @rtype: 3-tuple of (string, 3-tuple of integer, list of L{RenderedEvent})
+    @raise ValueError: When the speech cannot be rendered
+    '''
+    # compute the xml flag
+    xml = (message.IsXML and pyTTS.tts_is_xml) or \
+          (not message.IsXML and pyTTS.tts_is_not_xml)
+    try:
+      # update the speech rate
+      self.tts.Rate = Config.speech_rate
+      # try to generate audio data
+      stream, tts_events = self.tts.Speak(message.Speech, xml)
+    except pythoncom.com_error:
+      # ensure coinit called in this thread context and retry
+      pythoncom.CoInitialize()
+      return self.Render(message)
+    except:
+      raise ValueError
+    # get audio format info and wave data
+    format = stream.Format.GetWaveFormatEx()
+    data = stream.GetData()[int(-0.0125*self.tts.Rate+0.2):-1600]
+    return (data, (format.Channels, format.BitsPerSample, format.SamplesPerSec),
+            [RenderedEvent(e) for e in tts_events])
+
 class Player(Worker.Worker):
   '''
   A virtual instrument capable of playing a single non-verbal sound at a time.
@@ -395,7 +450,7 @@ class Speaker(Player):
     @return: Clone of the speech factory
     @rtype: L{SpeechFactory}
     '''
-    return SpeechFactory(self.speech_fac.Voice)
+    return SpeechFactory(self.speech_fac.voice)
 
   def IsPlaying(self):
     '''
@@ -484,14 +539,22 @@ class Speaker(Player):
         self.sound_src.Sound = self.sound_fac.Create(smsg)
         self.sound_src.Volume = getattr(Config, self.sound_vol)
         self.sound_src.Play()
-      elif message.Listen:
+        # the event is spent
+        smsg.Release()
+        continue
+      if message.Listen:
+        if self.observer is not None:
+          # clone the message for the observer before routing the original
+          omsg = smsg.Clone()
+          omsg.RouteTo(self.observer)
         # route a message directly to the source of the output message
         smsg.RouteTo(message.Source)
         smsg.Prepare(message)
         Input.Manager().AddMessage(smsg)
-      if self.observer is not None and not smsg.Sound:
-        # notify the speaker observer by cloning the message and routing it
-        smsg = smsg.Clone()
+        if self.observer is not None:
+          Input.Manager().AddMessage(omsg)
+      elif self.observer is not None:
+        # nobody else wants the original so route it to the observer
         smsg.RouteTo(self.observer)
         Input.Manager().AddMessage(smsg)
 
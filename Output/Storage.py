@@ -105,7 +105,7 @@ class StreamQueue(object):
     if e.EventType == pyTTS.tts_event_bookmark:
       cmd, payload = e.Name.split(':')
       if int(cmd) == Constants.BM_SOUND:
-        return StreamMessage(sound=payload)
+        return StreamMessage.Create(sound=payload)
     elif e.EventType == pyTTS.tts_event_word:
       # offset the position by any xml tags in the stream
       while len(self.tags) > 0 and \
@@ -116,7 +116,7 @@ class StreamQueue(object):
       tp = e.CharacterPosition+self.offset
       diff = tp - self.last_pos
       self.last_pos = tp
-      return StreamMessage(ID=Constants.SAY_WORD,
+      return StreamMessage.Create(ID=Constants.SAY_WORD,
                text=self.text[e.CharacterPosition:e.CharacterPosition+e.Length],
                raw_position=e.CharacterPosition, true_position=tp,
                difference=diff, all_text=self.text)
@@ -129,8 +129,9 @@ class StreamQueue(object):
       tp = len(self.text)+self.offset
       diff = tp - self.last_pos
       self.last_pos = tp
-      return StreamMessage(ID=Constants.SAY_DONE, raw_position=len(self.text),
-                           true_position=tp, difference=diff)
+      return StreamMessage.Create(ID=Constants.SAY_DONE,
+                                  raw_position=len(self.text),
+                                  true_position=tp, difference=diff)
 
 class HistoryRing(object):
   '''
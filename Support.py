@@ -111,6 +111,12 @@ class MethodGeneratorProxy(object):
       except TypeError:
         wobj = obj
       self.gen = self.func(wobj, *args, **kwargs)
+      # the generator holds its arguments across calls, so keep any messages
+      # among them out of their pools
+      for arg in args:
+        keep = getattr(arg, 'Keep', None)
+        if keep is not None:
+          keep()
 
     try:
       # generate next item
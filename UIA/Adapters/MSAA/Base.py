@@ -11,12 +11,244 @@ distribution, and is available at
 U{http://www.opensource.org/licenses/bsd-license.php}
 '''
 
-import protocols, pyAA, weakref
+import protocols, pyAA, weakref, re, ctypes
 import View
+from UIA import EventManager
 from Interface import IInteractive, IContext
 from protocols import advise
 from Constants import *
 
+user32 = ctypes.windll.user32
+# flag asking GetAncestor for the top level window
+GA_ROOT = 2
+# events after which objects resolved under a window may have moved or died
+PATH_EVENTS = (pyAA.Constants.EVENT_OBJECT_REORDER,
+               pyAA.Constants.EVENT_OBJECT_DESTROY,
+               pyAA.Constants.EVENT_OBJECT_SHOW)
+# one step in a path, a role and a child index
+PATH_STEP = re.compile(r'/([^/\[]+)\[(\d+)\]')
+
+# paths parsed so far keyed by path string
+_paths = {}
+# live path resolvers
+_resolvers = weakref.WeakKeyDictionary()
+
+class CompiledPath(object):
+  '''
+  Path string parsed once into its steps.
+
+  @ivar path: Original path
+  @type path: string
+  @ivar steps: Role and child index of each step, or None if the path could not
+    be parsed
+  @type steps: tuple of 2-tuple of (string, integer)
+  @ivar prefixes: Path from the root to the end of each step
+  @type prefixes: tuple of string
+  @ivar relative: Path of each step alone, rooted at the object before it
+  @type relative: tuple of string
+  '''
+  def __init__(self, path):
+    '''
+    Parses a path.
+
+    @param path: Path to parse
+    @type path: string
+    '''
+    self.path = path
+    matches = list(PATH_STEP.finditer(path))
+    relative = [m.group(0) for m in matches]
+    if not relative or ''.join(relative) != path:
+      # not a path we understand, resolve it in whole
+      self.steps = None
+      self.prefixes = ()
+      self.relative = ()
+      return
+    self.steps = tuple([(m.group(1), int(m.group(2))) for m in matches])
+    self.relative = tuple(relative)
+    self.prefixes = tuple([''.join(relative[:i+1]) 
+                           for i in xrange(len(relative))])
+
+def CompilePath(path):
+  '''
+  Gets the parsed form of a path, parsing it only the first time it is seen.
+
+  @param path: Path to parse
+  @type path: string
+  @return: Parsed path
+  @rtype: L{CompiledPath}
+  '''
+  try:
+    return _paths[path]
+  except KeyError:
+    cp = _paths[path] = CompiledPath(path)
+    return cp
+
+def _onStructureChange(event):
+  '''
+  Forgets objects resolved under the top level window of an event that may 
+  have changed the structure of its tree. Forgets objects under all windows if
+  the top level window cannot be found, as when the window of the event has
+  been destroyed.
+
+  @param event: Accessible event
+  @type event: pyAA.WinEvent
+  '''
+  root = user32.GetAncestor(event.Window, GA_ROOT)
+  for resolver in _resolvers.keys():
+    if not root or resolver.root == root:
+      resolver.Invalidate()
+
+def ForgetObject(ao):
+  '''
+  Forgets a resolved object found to be dead and all objects resolved through
+  it so the next resolution of their paths walks the tree again.
+
+  @param ao: Dead accessible object
+  @type ao: pyAA.AccessibleObject
+  '''
+  for resolver in _resolvers.keys():
+    resolver.Forget(ao)
+
+def GetResolver(model):
+  '''
+  Gets the resolver for paths rooted at a model, building it the first time.
+
+  @param model: Root object paths are resolved against
+  @type model: pyAA.AccessibleObject
+  @return: Resolver kept on the model
+  @rtype: L{PathResolver}
+  '''
+  try:
+    return model.path_resolver
+  except AttributeError:
+    resolver = model.path_resolver = PathResolver(model)
+    return resolver
+
+class PathResolver(object):
+  '''
+  Resolves paths against one model, remembering the object at the end of 
+  every step taken. Resolving a path again while the tree is unchanged costs a 
+  dictionary lookup. Resolving a path sharing a prefix with one seen before 
+  only walks the steps after the prefix. All objects are forgotten when the 
+  tree under the top level window of the model changes.
+
+  @ivar root: Top level window of the model, or None if unknown
+  @type root: integer
+  @ivar nodes: Objects resolved so far keyed by path
+  @type nodes: dictionary
+  '''
+  watching = False
+
+  def __init__(self, model):
+    '''
+    Initializes an instance. Starts watching for structure changes the first 
+    time any resolver is built. Does not hold the model since the model holds
+    the resolver.
+
+    @param model: Root object paths are resolved against
+    @type model: pyAA.AccessibleObject
+    '''
+    self.nodes = {}
+    try:
+      self.root = user32.GetAncestor(model.Window, GA_ROOT) or None
+    except pyAA.Error:
+      self.root = None
+    _resolvers[self] = None
+    if not PathResolver.watching:
+      for eid in PATH_EVENTS:
+        EventManager.addObserver(eid, _onStructureChange)
+      PathResolver.watching = True
+
+  def Invalidate(self):
+    '''Forgets all resolved objects.'''
+    self.nodes.clear()
+
+  def Forget(self, ao):
+    '''
+    Forgets an object and all objects resolved through it.
+
+    @param ao: Accessible object to forget
+    @type ao: pyAA.AccessibleObject
+    '''
+    for path, node in self.nodes.items():
+      if node is ao:
+        self.Discard(path)
+        return
+
+  def Discard(self, path):
+    '''
+    Forgets the object at a path and all objects resolved through it.
+
+    @param path: Path rooted at the model
+    @type path: string
+    '''
+    below = path+'/'
+    for other in self.nodes.keys():
+      if other == path or other.startswith(below):
+        del self.nodes[other]
+
+  def _Walk(self, node, cp, start):
+    '''
+    Walks the steps of a path from an object, remembering the object at the
+    end of each step.
+
+    @param node: Object at the end of the step before start
+    @type node: pyAA.AccessibleObject
+    @param cp: Parsed path
+    @type cp: L{CompiledPath}
+    @param start: Index of the first step to take
+    @type start: integer
+    @return: Object at the end of the path
+    @rtype: pyAA.AccessibleObject
+    @raise pyAA.Error: When an object along the path does not exist
+    '''
+    nodes = self.nodes
+    for i in xrange(start, len(cp.relative)):
+      node = node.ChildFromPath(cp.relative[i])
+      nodes[cp.prefixes[i]] = node
+    return node
+
+  def Resolve(self, model, path):
+    '''
+    Gets the object at a path starting from the deepest object already resolved
+    along it. Waits for the process of the model to settle first, as a live
+    read would, so observers forget objects changed by events already sent.
+
+    @param model: Root object the path is rooted at
+    @type model: pyAA.AccessibleObject
+    @param path: Path rooted at the model
+    @type path: string
+    @return: Object at the path
+    @rtype: pyAA.AccessibleObject
+    @raise pyAA.Error: When the object does not exist
+    '''
+    cp = CompilePath(path)
+    if cp.steps is None or self.root is None:
+      # cannot cache what cannot be invalidated
+      return model.ChildFromPath(path)
+    # deliver waiting events, including those caused by the last modification,
+    # so no object is taken from before a change even if the whole path is kept
+    model.CheckStability()
+    nodes = self.nodes
+    node = model
+    start = 0
+    for i in xrange(len(cp.prefixes)-1, -1, -1):
+      try:
+        node = nodes[cp.prefixes[i]]
+      except KeyError:
+        continue
+      start = i+1
+      break
+    try:
+      return self._Walk(node, cp, start)
+    except pyAA.Error:
+      if not start:
+        raise
+    # a remembered object along the path died without notice, so forget it and
+    # everything resolved through it and walk once more from the model
+    self.Discard(cp.prefixes[start-1])
+    return self._Walk(model, cp, 0)
+
 class Adapter(object):
   '''
   Base class for all MSAA adapters. Gets object at the given path from the 
@@ -61,6 +293,8 @@ class Adapter(object):
     try:
       self.subject.Name
     except (pyAA.Error, AttributeError):
+      # do not get the same dead object back from the context
+      ForgetObject(self.subject)
       # activate the new model if possible
       if self.Activate():
         return True
@@ -92,7 +326,9 @@ class ContextForView(protocols.Adapter):
   
   def GetObjectAt(self, path): 
     '''
-    Retrieves the object at the given path within this content.
+    Retrieves the object at the given path within this content. Resolves paths
+    through a L{PathResolver} kept for the view as long as its model is the 
+    same.
     
     @param path: Path to the desired object
     @type path: string
@@ -102,7 +338,7 @@ class ContextForView(protocols.Adapter):
     try:
       model = self.subject.Model
       print '*** adapter:', model.RoleText, model.Name
-      return model.ChildFromPath(path)
+      return GetResolver(model).Resolve(model, path)
     except pyAA.Error:
       return None
     
@@ -0,0 +1,607 @@
+'''
+Defines a virtual buffer that flattens a hypertext document into one record per
+node in reading order so that moving through the document is an index
+operation instead of a walk of the accessible tree. The buffer also keeps the
+position of every node by role and state, for seeking, and its parent, for
+reporting ancestors. The buffer is filled a few nodes at a time so reading a
+long page never blocks input for long. Also defines searches over the text of
+the whole document, across node boundaries, and a trigram index that narrows
+literal searches on long documents. Run this module to benchmark the searches.
+
+@var NODE: Position of the accessible node in a record
+@type NODE: integer
+@var ROLE: Position of the role text in a record
+@type ROLE: integer
+@var STATE: Position of the state text in a record
+@type STATE: integer
+@var OFFSET: Position of the offset of the node text in the whole document
+@type OFFSET: integer
+@var NAME: Position of the node text in a record
+@type NAME: integer
+@var RELOCATE_SPAN: Records searched on either side of an old position for the
+  same node in a refreshed buffer
+@type RELOCATE_SPAN: integer
+@var BACK_WINDOW: Characters searched first when looking backward for a match
+@type BACK_WINDOW: integer
+
+@author: Peter Parente <parente@cs.unc.edu>
+@copyright: Copyright (c) 2008 Peter Parente
+@license: BSD License
+
+All rights reserved. This program and the accompanying materials are made
+available under the terms of The BSD License which accompanies this
+distribution, and is available at
+U{http://www.opensource.org/licenses/bsd-license.php}
+'''
+import bisect, re, array
+
+NODE, ROLE, STATE, OFFSET, NAME = range(5)
+RELOCATE_SPAN = 50
+BACK_WINDOW = 4096
+
+def CompilePattern(target, regex=False, case=False):
+  '''
+  Builds the pattern for a search.
+
+  @param target: Text to find or a regular expression
+  @type target: string
+  @param regex: Is the target a regular expression?
+  @type regex: boolean
+  @param case: Match case?
+  @type case: boolean
+  @return: Compiled pattern
+  @rtype: regex
+  @raise ValueError: When the target is not a valid regular expression, as
+    when a regular expression is only partly typed
+  '''
+  if not regex:
+    target = re.escape(target)
+  flags = 0
+  if not case:
+    flags |= re.IGNORECASE
+  try:
+    return re.compile(target, flags)
+  except re.error, e:
+    raise ValueError(str(e))
+
+def FindNext(pattern, text, start):
+  '''
+  Finds the first match starting at or after an offset. Matches of nothing are
+  skipped.
+
+  @param pattern: Compiled pattern
+  @type pattern: regex
+  @param text: Text to search
+  @type text: string
+  @param start: Offset where matches may start
+  @type start: integer
+  @return: Start and end offsets of the match or None if not found
+  @rtype: 2-tuple of integer
+  '''
+  m = pattern.search(text, start)
+  while m is not None and m.start() == m.end():
+    if m.start() >= len(text):
+      return None
+    m = pattern.search(text, m.start()+1)
+  return m and m.span()
+
+def FindPrev(pattern, text, end):
+  '''
+  Finds the last match starting before an offset. Searches a window before the
+  offset first and doubles it until a match is found or the start of the text
+  is reached. Matches of nothing are skipped.
+
+  @param pattern: Compiled pattern
+  @type pattern: regex
+  @param text: Text to search
+  @type text: string
+  @param end: Offset before which matches must start
+  @type end: integer
+  @return: Start and end offsets of the match or None if not found
+  @rtype: 2-tuple of integer
+  '''
+  window = BACK_WINDOW
+  while 1:
+    s = max(end-window, 0)
+    last = None
+    m = pattern.search(text, s)
+    while m is not None and m.start() < end:
+      if m.start() < m.end():
+        last = m
+      m = pattern.search(text, m.start()+1)
+    if last is not None:
+      return last.span()
+    if s == 0:
+      return None
+    window *= 2
+
+class TrigramIndex(object):
+  '''
+  Positions of every three character sequence in the lowercase text of a
+  document. A literal search looks up the least common trigram of its target
+  and only tests the text around its positions. Filled a number of characters
+  at a time like L{VirtualBuffer}.
+
+  @ivar text: Lowercase text of the document
+  @type text: string
+  @ivar positions: Ascending positions keyed by trigram
+  @type positions: dictionary of array
+  @ivar done: Number of positions indexed so far
+  @type done: integer
+  '''
+  def __init__(self, text):
+    '''
+    Initializes an empty index.
+
+    @param text: Lowercase text of the document
+    @type text: string
+    '''
+    self.text = text
+    self.positions = {}
+    self.done = 0
+
+  def IsComplete(self):
+    '''
+    @return: Have all positions been indexed?
+    @rtype: boolean
+    '''
+    return self.done >= len(self.text)-2
+
+  def Fill(self, count):
+    '''
+    Indexes up to count more positions.
+
+    @param count: Most positions to index
+    @type count: integer
+    @return: Have all positions been indexed?
+    @rtype: boolean
+    '''
+    text = self.text
+    positions = self.positions
+    stop = min(self.done+count, len(text)-2)
+    for i in xrange(self.done, stop):
+      tg = text[i:i+3]
+      try:
+        positions[tg].append(i)
+      except KeyError:
+        positions[tg] = array.array('l', [i])
+    self.done = max(stop, self.done)
+    return self.IsComplete()
+
+  def Find(self, pattern, text, literal, offset, ahead):
+    '''
+    Finds a literal target by testing the pattern only where the least common
+    trigram of the target occurs.
+
+    @param pattern: Compiled pattern for the target
+    @type pattern: regex
+    @param text: Text of the document
+    @type text: string
+    @param literal: Target text at least three characters long
+    @type literal: string
+    @param offset: Offset where matches may start when searching ahead, or 
+      before which they must start when searching back
+    @type offset: integer
+    @param ahead: Search toward the end?
+    @type ahead: boolean
+    @return: Start and end offsets of the match or None if not found
+    @rtype: 2-tuple of integer
+    '''
+    literal = literal.lower()
+    best = None
+    for k in xrange(len(literal)-2):
+      try:
+        found = self.positions[literal[k:k+3]]
+      except KeyError:
+        # a trigram that never occurs means the target never occurs
+        return None
+      if best is None or len(found) < len(best[1]):
+        best = (k, found)
+    k, found = best
+    if ahead:
+      for j in xrange(bisect.bisect_left(found, offset+k), len(found)):
+        m = pattern.match(text, found[j]-k)
+        if m is not None:
+          return m.span()
+    else:
+      for j in xrange(bisect.bisect_left(found, offset+k)-1, -1, -1):
+        m = pattern.match(text, found[j]-k)
+        if m is not None:
+          return m.span()
+    return None
+
+class LiveRecord(object):
+  '''
+  Stand-in for a buffer record that reads the node as it is indexed. Used when
+  walking the live document so code handling records does not care where they
+  came from.
+
+  @ivar node: Accessible node
+  @type node: pyAA.AccessibleObject
+  '''
+  def __init__(self, node):
+    self.node = node
+
+  def __getitem__(self, i):
+    if i == NODE:
+      return self.node
+    elif i == ROLE:
+      return self.node.RoleText
+    elif i == STATE:
+      return self.node.StateText
+    elif i == NAME:
+      return self.node.Name
+    # offsets are only known in the buffer
+    return None
+
+class VirtualBuffer(object):
+  '''
+  Document flattened into records of node, role text, state text, text offset,
+  and text in reading order.
+
+  @ivar records: Records in reading order
+  @type records: list of 5-tuple
+  @ivar offsets: Text offset of every record, for bisecting
+  @type offsets: list of integer
+  @ivar length: Length of all text read so far
+  @type length: integer
+  @ivar walker: Generator reading the next records or None when the end of the
+    document was reached
+  @type walker: generator
+  @ivar text: Text of all records joined or None if not joined yet
+  @type text: string
+  @ivar lower: Lowercase text of all records or None if not needed yet
+  @type lower: string
+  @ivar trigrams: Index of the text or None if not indexed
+  @type trigrams: L{TrigramIndex}
+  @ivar parents: Position of the parent of every record, None for the first
+  @type parents: list of integer
+  @ivar kinds: Ascending positions of records keyed by role and state text
+  @type kinds: dictionary of list
+  @ivar matches: Ascending positions of records satisfying a seek predicate,
+    keyed by predicate
+  @type matches: dictionary of list
+  @ivar chains: Fields of a record and its ancestors keyed by position, filled
+    by the document adapter
+  @type chains: dictionary of tuple
+  @ivar dirty: Might names and states in the records be out of date?
+  @type dirty: boolean
+  '''
+  def __init__(self, start, nav):
+    '''
+    Initializes an empty buffer.
+
+    @param start: Node where the document starts
+    @type start: pyAA.AccessibleObject
+    @param nav: Function returning the node after the one given in reading
+      order and the number of levels climbed to reach it, or -1 for a first
+      child, and raising ReferenceError at the end of the document
+    @type nav: callable
+    '''
+    self.records = []
+    self.offsets = []
+    self.length = 0
+    self.walker = self._Walk(start, nav)
+    self.text = None
+    self.lower = None
+    self.trigrams = None
+    self.parents = []
+    self.kinds = {}
+    self.matches = {}
+    self.chains = {}
+    self.dirty = False
+
+  def __len__(self):
+    return len(self.records)
+
+  def _Walk(self, node, nav):
+    '''
+    Reads records from the start of the document to its end.
+
+    @param node: Node where the document starts
+    @type node: pyAA.AccessibleObject
+    @param nav: Function returning the next node in reading order and the
+      levels climbed
+    @type nav: callable
+    @return: Generator yielding after every record is added
+    @rtype: generator
+    '''
+    # positions of the ancestors of the current node, nearest last
+    ancestors = []
+    parent = None
+    while 1:
+      i = len(self.records)
+      name = node.Name
+      role = node.RoleText
+      state = node.StateText
+      self.records.append((node, role, state, self.length, name))
+      self.offsets.append(self.length)
+      self.parents.append(parent)
+      self.kinds.setdefault((role, state), []).append(i)
+      self.length += len(name or '')
+      yield None
+      try:
+        node, up = nav(node)
+      except ReferenceError:
+        return
+      if up < 0:
+        ancestors.append(i)
+      elif up > 0:
+        # never climb past the document
+        del ancestors[max(len(ancestors)-up, 1):]
+      if ancestors:
+        parent = ancestors[-1]
+
+  def IsComplete(self):
+    '''
+    @return: Has the whole document been read?
+    @rtype: boolean
+    '''
+    return self.walker is None
+
+  def Fill(self, count):
+    '''
+    Reads up to count more records.
+
+    @param count: Most records to read
+    @type count: integer
+    @return: Has the whole document been read?
+    @rtype: boolean
+    @raise pyAA.Error: When the document goes away while it is read
+    '''
+    if self.walker is None:
+      return True
+    try:
+      for i in xrange(count):
+        self.walker.next()
+    except StopIteration:
+      self.walker = None
+    return self.walker is None
+
+  def FindOffset(self, offset):
+    '''
+    Gets the position of the record holding a text offset.
+
+    @param offset: Offset into the text of the whole document
+    @type offset: integer
+    @return: Position of the record
+    @rtype: integer
+    '''
+    return max(bisect.bisect_right(self.offsets, offset)-1, 0)
+
+  def Relocate(self, record):
+    '''
+    Gets the position in this buffer of a record taken from an older buffer of
+    the same document. Looks for a record of the same text and role near the
+    same text offset, preferring the closest, and settles for the record at the
+    offset if there is none.
+
+    @param record: Record from the older buffer
+    @type record: 5-tuple
+    @return: Position of the matching record
+    @rtype: integer
+    '''
+    i = min(self.FindOffset(record[OFFSET]), len(self.records)-1)
+    for d in xrange(RELOCATE_SPAN+1):
+      for j in (i+d, i-d):
+        if 0 <= j < len(self.records):
+          r = self.records[j]
+          if r[NAME] == record[NAME] and r[ROLE] == record[ROLE]:
+            return j
+    return i
+
+  def Locate(self, name, role, near=0):
+    '''
+    Gets the position in this buffer of a node walked to live, which is never
+    the object held in a record. Looks for a record of the same text and role,
+    preferring the one closest to where the node was last known to be.
+
+    @param name: Text of the node
+    @type name: string
+    @param role: Role text of the node
+    @type role: string
+    @param near: Position near which the node is expected
+    @type near: integer
+    @return: Position of the matching record or None if there is none
+    @rtype: integer
+    '''
+    best = None
+    for j, r in enumerate(self.records):
+      if r[NAME] == name and r[ROLE] == role:
+        if best is None or abs(j-near) < abs(best-near):
+          best = j
+        elif j > near:
+          # records only get farther from here on
+          break
+    return best
+
+  def GetMatches(self, pred):
+    '''
+    Gets the positions of all records satisfying a seek predicate. Tests the
+    predicate once per distinct role and state instead of once per record, and
+    remembers the result for the predicate.
+
+    @param pred: Function taking role and state text
+    @type pred: callable
+    @return: Ascending positions
+    @rtype: list of integer
+    '''
+    try:
+      return self.matches[pred]
+    except KeyError:
+      pass
+    found = []
+    for (role, state), positions in self.kinds.iteritems():
+      try:
+        if pred(role, state):
+          found.extend(positions)
+      except Exception:
+        pass
+    found.sort()
+    self.matches[pred] = found
+    return found
+
+  def Seek(self, pred, index, ahead):
+    '''
+    Finds the nearest record after or before a position satisfying a seek
+    predicate.
+
+    @param pred: Function taking role and state text
+    @type pred: callable
+    @param index: Position to start from
+    @type index: integer
+    @param ahead: Seek toward the end?
+    @type ahead: boolean
+    @return: Position of the record or None if there is none
+    @rtype: integer
+    '''
+    found = self.GetMatches(pred)
+    if ahead:
+      j = bisect.bisect_right(found, index)
+      if j < len(found):
+        return found[j]
+    else:
+      j = bisect.bisect_left(found, index)-1
+      if j >= 0:
+        return found[j]
+    return None
+
+  def GetText(self):
+    '''
+    Gets the text of the whole document, joining the text of all records the
+    first time it is needed.
+
+    @return: Text of all records in reading order
+    @rtype: string
+    '''
+    if self.text is None:
+      self.text = ''.join([r[NAME] or '' for r in self.records])
+    return self.text
+
+  def GetLowerText(self):
+    '''
+    @return: Lowercase text of all records in reading order
+    @rtype: string
+    '''
+    if self.lower is None:
+      self.lower = self.GetText().lower()
+    return self.lower
+
+  def Index(self):
+    '''
+    Starts a trigram index of the text. The index is only used once it has been
+    filled.
+
+    @return: Empty index
+    @rtype: L{TrigramIndex}
+    '''
+    self.trigrams = TrigramIndex(self.GetLowerText())
+    return self.trigrams
+
+  def Find(self, pattern, offset, ahead, literal=None):
+    '''
+    Finds a match in the text of the whole document so matches may span nodes.
+
+    @param pattern: Compiled pattern
+    @type pattern: regex
+    @param offset: Offset where matches may start when searching ahead, or
+      before which they must start when searching back
+    @type offset: integer
+    @param ahead: Search toward the end?
+    @type ahead: boolean
+    @param literal: Target text if the pattern matches it literally, allowing
+      plain string searches and the trigram index to be used
+    @type literal: string
+    @return: Start and end offsets of the match or None if not found
+    @rtype: 2-tuple of integer
+    '''
+    text = self.GetText()
+    if not literal:
+      if ahead:
+        return FindNext(pattern, text, offset)
+      return FindPrev(pattern, text, offset)
+    if (len(literal) >= 3 and self.trigrams is not None and
+        self.trigrams.IsComplete()):
+      return self.trigrams.Find(pattern, text, literal, offset, ahead)
+    # string searches are faster than a pattern ignoring case
+    if pattern.flags & re.IGNORECASE:
+      text = self.GetLowerText()
+      literal = literal.lower()
+    if ahead:
+      i = text.find(literal, offset)
+    else:
+      i = text.rfind(literal, 0, offset-1+len(literal))
+    if i < 0:
+      return None
+    return (i, i+len(literal))
+
+def Benchmark(count=20000, target='parente wrote'):
+  '''
+  Measures typeahead search for a target in a synthetic document one prefix at
+  a time, as it is typed, by testing every node in turn, by searching the
+  joined text with a pattern and as a string, and by using the trigram index.
+
+  @param count: Number of nodes in the document
+  @type count: integer
+  @param target: Text typed, found only near the end of the document
+  @type target: string
+  @return: Human readable report
+  @rtype: string
+  '''
+  import time, random
+  r = random.Random(0)
+  words = ['the', 'page', 'link', 'news', 'parent', 'wrote', 'story', 'home',
+           'search', 'about', 'contact', 'more', 'Parents', 'write']
+  names = [' '.join([r.choice(words) for i in xrange(r.randint(1, 12))])+' '
+           for i in xrange(count)]
+  # the target spans two nodes
+  names[-10] = 'At the end Peter Par'
+  names[-9] = 'ente Wrote this.'
+  # fill the buffer directly, there are no nodes to walk
+  buf = VirtualBuffer(None, None)
+  buf.walker = None
+  length = 0
+  for i, name in enumerate(names):
+    buf.records.append((i, 'text', '', length, name))
+    buf.offsets.append(length)
+    length += len(name)
+  buf.length = length
+  prefixes = [target[:i] for i in xrange(3, len(target)+1)]
+  lines = ['%d nodes, %d characters, %d prefixes' % (count, length, 
+                                                     len(prefixes))]
+  # old search, node by node without matches across nodes
+  start = time.time()
+  for prefix in prefixes:
+    p = prefix.lower()
+    for rec in buf.records:
+      if rec[NAME].lower().find(p) > -1:
+        break
+  lines.append('node by node: %.2f ms/search' % 
+               ((time.time()-start)/len(prefixes)*1e3))
+  start = time.time()
+  buf.GetText()
+  lines.append('join text: %.2f ms once' % ((time.time()-start)*1e3))
+  found = []
+  start = time.time()
+  for prefix in prefixes:
+    found.append(buf.Find(CompilePattern(prefix), 0, True))
+  lines.append('joined text, pattern: %.2f ms/search' %
+               ((time.time()-start)/len(prefixes)*1e3))
+  start = time.time()
+  buf.GetLowerText()
+  for i, prefix in enumerate(prefixes):
+    assert buf.Find(CompilePattern(prefix), 0, True, prefix) == found[i]
+  lines.append('joined text, string: %.2f ms/search' %
+               ((time.time()-start)/len(prefixes)*1e3))
+  start = time.time()
+  buf.Index().Fill(length)
+  lines.append('trigram index: %.2f ms once' % ((time.time()-start)*1e3))
+  start = time.time()
+  for i, prefix in enumerate(prefixes):
+    assert buf.Find(CompilePattern(prefix), 0, True, prefix) == found[i]
+  lines.append('trigrams: %.3f ms/search' %
+               ((time.time()-start)/len(prefixes)*1e3))
+  return '\n'.join(lines)
+
+if __name__ == '__main__':
+  print Benchmark()
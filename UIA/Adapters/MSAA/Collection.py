@@ -18,6 +18,40 @@ from Interface import *
 from protocols import advise
 from Constants import *
 from Base import Adapter
+from Fields import ParseFields, FIELDS
+from UIA import EventManager
+
+# events after which counts and indices of items may be wrong
+STRUCTURE_EVENTS = (pyAA.Constants.EVENT_OBJECT_REORDER,
+                    pyAA.Constants.EVENT_OBJECT_CREATE,
+                    pyAA.Constants.EVENT_OBJECT_DESTROY)
+# events after which names of items read earlier may be wrong
+CONTENT_EVENTS = (pyAA.Constants.EVENT_OBJECT_NAMECHANGE,
+                  pyAA.Constants.EVENT_OBJECT_DESCRIPTIONCHANGE)
+
+# runs of digits in a field compared as numbers when sorting
+NUMBER_RUN = re.compile(r'(\d+)')
+
+def _sortKey(value):
+  '''
+  Builds a key that orders field values without regard to case and with runs of
+  digits in numeric order, so that 9 KB comes before 10 KB.
+
+  @param value: Field value
+  @type value: string
+  @return: Sort key
+  @rtype: tuple
+  '''
+  parts = NUMBER_RUN.split((value or '').lower())
+  for i in xrange(1, len(parts), 2):
+    parts[i] = int(parts[i])
+  return tuple(parts)
+
+def _startsWith(name, text):
+  return name.startswith(text)
+
+def _contains(name, text):
+  return name.find(text) > -1
 
 class Collection(Adapter, Mixin.CircularSearchMixin):
   '''
@@ -31,6 +65,11 @@ class Collection(Adapter, Mixin.CircularSearchMixin):
   @type hack_type: string
   @ivar search_anchor: Default start of a full text search
   @type search_anchor: integer
+  @ivar structure_hwnd: Window watched for changes to the items while active,
+    or None if counts should not be kept
+  @type structure_hwnd: integer
+  @ivar changes: Number of changes to the items observed so far
+  @type changes: integer
   '''
   def __init__(self, context, path, select_hack=False, hack_type='left'):
     '''
@@ -42,6 +81,9 @@ class Collection(Adapter, Mixin.CircularSearchMixin):
     self.select_hack = select_hack
     self.hack_type = 'left'
     self.search_anchor = None
+    self.structure_hwnd = None
+    self.changes = 0
+    self.InvalidateItems()
 
   def Activate(self):
     '''
@@ -52,6 +94,8 @@ class Collection(Adapter, Mixin.CircularSearchMixin):
     @rtype: boolean
     '''
     rv = Adapter.Activate(self)
+    if rv:
+      self._WatchStructure()
     if rv and self.GetSelectedItem() is None:
       self.subject.SetFocus()
       # create a selection if there isn't one
@@ -73,8 +117,92 @@ class Collection(Adapter, Mixin.CircularSearchMixin):
       self.last_count = self.GetItemCount()
     except AttributeError:
       return
+    finally:
+      # changes are not seen while inactive
+      self._UnwatchStructure()
     self.last_selected = self.GetSelectedName()
 
+  def _WatchStructure(self):
+    '''
+    Starts watching for items added, removed, reordered, or renamed in the 
+    window of the subject so that counts, indices, and names can be kept 
+    between calls. Observes events rather than adding conditions so no change
+    is missed when a condition of a macro or task claims the event first.
+    '''
+    self._UnwatchStructure()
+    try:
+      hwnd = self.subject.Window
+    except pyAA.Error:
+      return
+    for eid in STRUCTURE_EVENTS+CONTENT_EVENTS:
+      EventManager.addObserver(eid, self._OnStructureChange)
+    self.structure_hwnd = hwnd
+
+  def _UnwatchStructure(self):
+    '''Stops watching for changes to the items and forgets what was kept.'''
+    if self.structure_hwnd is not None:
+      for eid in STRUCTURE_EVENTS+CONTENT_EVENTS:
+        EventManager.removeObserver(eid, self._OnStructureChange)
+      self.structure_hwnd = None
+    self.InvalidateItems()
+
+  def _OnStructureChange(self, event):
+    '''
+    Forgets what was kept when the items in the watched window change. Only 
+    forgets what was kept about one item when just its name or description 
+    changed.
+
+    @param event: Accessible event
+    @type event: pyAA.WinEvent
+    '''
+    if event.Window != self.structure_hwnd:
+      return
+    self.changes += 1
+    if event.EventID in CONTENT_EVENTS and event.ChildID:
+      self.InvalidateItem(event.ChildID)
+    else:
+      self.InvalidateItems()
+
+  def _SyncItems(self):
+    '''
+    Waits for the process of the subject to settle, as a live read would, so
+    events sent by the last change to the items are observed and whatever they
+    outdate is forgotten before anything kept is used.
+
+    @return: Number of changes observed so far, for L{_CanKeep}
+    @rtype: integer
+    '''
+    if self.structure_hwnd is not None:
+      self.subject.CheckStability()
+    return self.changes
+
+  def _CanKeep(self, changes):
+    '''
+    @param changes: Number of changes returned by L{_SyncItems} before reading
+    @type changes: integer
+    @return: Can what was read be kept, since the items are watched and did not
+      change while they were read?
+    @rtype: boolean
+    '''
+    return self.structure_hwnd is not None and changes == self.changes
+
+  def InvalidateItems(self):
+    '''
+    Virtual method. Forgets item counts, indices, and names kept since the 
+    items last changed.
+    '''
+    pass
+
+  def InvalidateItem(self, child_id):
+    '''
+    Forgets what was kept about one item after its name or description 
+    changed. Forgets everything unless overridden.
+
+    @param child_id: Child ID of the item
+    @type child_id: integer
+    '''
+    self.InvalidateItems()
+
   def HasChanged(self):
     '''
     Checks if the selected item name or item count has changed since the control
@@ -340,37 +468,325 @@ class List(Collection):
   Simple list box of items. Adapted for use with L{View.Control.List}.
   '''
   advise(instancesProvide=[IList, ISeekable, ISearchable, IInteractive,
-                           ISelectable])
+                           ISelectable, ISkippable, IPrefetchable])
+
+  def InvalidateItems(self):
+    '''
+    Forgets the child IDs of the first and last items, the snapshot, and the
+    items read ahead.
+    '''
+    self.bounds = None
+    self.snapshot = None
+    self.prefetched = {}
+
+  def InvalidateItem(self, child_id):
+    '''
+    Forgets the name of one item read ahead and the snapshot holding its old
+    name. Keeps the bounds since no item was added or removed.
+
+    @param child_id: Child ID of the item
+    @type child_id: integer
+    '''
+    self.snapshot = None
+    self.prefetched.pop(child_id, None)
+
+  def _GetSearchName(self, item):
+    '''
+    Gets the text of an item searched by L{SeekToItem} and L{SearchForNextMatch}.
+
+    @param item: Item in the list
+    @type item: pyAA.AccessibleObject
+    @return: Searchable text
+    @rtype: string
+    '''
+    return item.Name
+
+  def _GetSnapshot(self):
+    '''
+    Gets all items and their lowercase search names, reading them in one pass 
+    only if the items changed since they were last read.
+
+    @return: Items in order and their names
+    @rtype: 2-tuple of list
+    @raise pyAA.Error: When the list is empty
+    '''
+    changes = self._SyncItems()
+    if self.snapshot is not None:
+      return self.snapshot
+    items = self._ReadItems()
+    names = [(self._GetSearchName(item) or '').lower() for item in items]
+    snapshot = (items, names)
+    if self._CanKeep(changes):
+      self.snapshot = snapshot
+    return snapshot
+
+  def _ReadItems(self):
+    '''
+    Gets all items in one call.
+
+    @return: Items in order
+    @rtype: list of pyAA.AccessibleObject
+    @raise pyAA.Error: When the list is empty
+    '''
+    first, last = self._GetBounds()
+    # skip children that are not items, like the header of a list view
+    return [item for item in self.subject.GetChildren() 
+            if first <= item.ChildID <= last]
+
+  def _FindInSnapshot(self, items, item):
+    '''
+    Gets the position of an item in the snapshot.
+
+    @param items: Items in the snapshot
+    @type items: list of pyAA.AccessibleObject
+    @param item: Item to find
+    @type item: pyAA.AccessibleObject
+    @return: Position of the item
+    @rtype: integer
+    @raise ValueError: When the item is not in the snapshot
+    '''
+    try:
+      i = item.ChildID - items[0].ChildID
+      if items[i].ChildID == item.ChildID and i >= 0:
+        return i
+    except IndexError:
+      pass
+    raise ValueError
+
+  def _SearchSnapshot(self, test, text, ahead, current):
+    '''
+    Searches the snapshot in memory the same way L{CircularSearch} walks the 
+    live items and selects only the match.
+
+    @param test: Function taking a lowercase name and lowercase text
+    @type test: callable
+    @param text: Text to locate
+    @type text: string
+    @param ahead: Search toward the end?
+    @type ahead: boolean
+    @param current: Start the search on the current item?
+    @type current: boolean
+    @return: True if wrapped, False if not wrapped, None if not found
+    @rtype: boolean
+    @raise ValueError: When the selection is not in the snapshot
+    '''
+    try:
+      items, names = self._GetSnapshot()
+    except pyAA.Error:
+      return None
+    n = len(items)
+    selected = self.GetSelectedItem()
+    if selected is None or not n:
+      return None
+    start = self._FindInSnapshot(items, selected)
+    if not current:
+      start += ahead and 1 or -1
+    if ahead:
+      passes = ((False, xrange(start, n)), (True, xrange(0, n)))
+    else:
+      passes = ((False, xrange(start, -1, -1)), (True, xrange(n-1, -1, -1)))
+    text = text.lower()
+    for wrapped, order in passes:
+      for i in order:
+        if test(names[i], text):
+          self._SelectSnapshotItem(items[i])
+          return wrapped
+    return None
+
+  def _SelectSnapshotItem(self, item):
+    '''
+    Selects an item found in the snapshot.
+
+    @param item: Item to select
+    @type item: pyAA.AccessibleObject
+    '''
+    self.SetSelectedItem(item)
+
+  def SeekToItem(self, char):
+    '''
+    Selects the next item beginning with the given character, if possible. 
+    Searches the snapshot while the items are watched for changes.
+
+    @param char: Character of interest
+    @type char: string
+    @return: True if wrapped, False if not wrapped, None if not found
+    @rtype: boolean
+    '''
+    if self.structure_hwnd is not None:
+      try:
+        return self._SearchSnapshot(_startsWith, char, True, False)
+      except ValueError:
+        self.InvalidateItems()
+    return super(List, self).SeekToItem(char)
+
+  def SearchForNextMatch(self, text, current):
+    '''
+    Selects the next item containing the search string, if possible. Searches
+    the snapshot while the items are watched for changes.
+
+    @param text: String of interest
+    @type text: string
+    @param current: Include current item in the search?
+    @type current: boolean
+    @return: True if wrapped, False if not wrapped, None if not found
+    @rtype: boolean
+    '''
+    if self.structure_hwnd is not None:
+      try:
+        return self._SearchSnapshot(_contains, text, True, current)
+      except ValueError:
+        self.InvalidateItems()
+    return super(List, self).SearchForNextMatch(text, current)
+
+  def SearchForPrevMatch(self, text, current):
+    '''
+    Selects the previous item containing the search string, if possible. 
+    Searches the snapshot while the items are watched for changes.
+
+    @param text: String of interest
+    @type text: string
+    @param current: Include current item in the search?
+    @type current: boolean
+    @return: True if wrapped, False if not wrapped, None if not found
+    @rtype: boolean
+    '''
+    if self.structure_hwnd is not None:
+      try:
+        return self._SearchSnapshot(_contains, text, False, current)
+      except ValueError:
+        self.InvalidateItems()
+    return super(List, self).SearchForPrevMatch(text, current)
+
+  def _ReadRow(self, item):
+    '''
+    Reads what is kept about an item read ahead of the selection.
+
+    @param item: Item in the list
+    @type item: pyAA.AccessibleObject
+    @return: Name of the item and its fields
+    @rtype: 2-tuple
+    '''
+    return (item.Name, None)
+
+  def PrefetchNeighbors(self, count):
+    '''
+    Reads up to count items on either side of the selection, nearest first, one
+    item per step. Keeps what was read by child ID for L{GetSelectedName} until
+    the items change. Reads nothing while the items are not watched for changes
+    since what was read could not be trusted later. Stops quietly when the
+    selection or an item dies, since nothing was asked of it.
+
+    @param count: Number of items to read on each side
+    @type count: integer
+    @return: Generator yielding the name of each item read
+    @rtype: generator
+    '''
+    if self.structure_hwnd is None:
+      return
+    changes = self._SyncItems()
+    try:
+      selected = self.GetSelectedItem()
+    except pyAA.Error:
+      return
+    if selected is None:
+      return
+    old = self.prefetched
+    new = self.prefetched = {}
+    ends = [selected, selected]
+    for i in xrange(count):
+      for j, step in enumerate((NEXT, PREVIOUS)):
+        try:
+          item = ends[j] = ends[j].Navigate(step)
+        except (AttributeError, pyAA.Error):
+          # ran off the end of the list
+          ends[j] = None
+          continue
+        try:
+          row = old[item.ChildID]
+        except KeyError:
+          try:
+            row = self._ReadRow(item)
+          except pyAA.Error:
+            # the item died while being read
+            return
+        if self.prefetched is not new or not self._CanKeep(changes):
+          # the items changed or a newer prefetch started
+          return
+        new[item.ChildID] = row
+        yield row[0]
+
+  def GetSelectedName(self, default=''):
+    '''
+    Gets the name of the selected item, using the name read ahead if there is
+    one.
+
+    @param default: Default name to return when collection empty
+    @type default: string
+    @return: Value of the name property
+    @rtype: string or None
+    '''
+    selected = self.GetSelectedItem()
+    if selected is None:
+      return default
+    try:
+      return self._GetPrefetched(selected)[0]
+    except KeyError:
+      return selected.Name
+
+  def _GetPrefetched(self, item):
+    '''
+    Gets what was read ahead about an item after observing any change that
+    outdates it.
+
+    @param item: Item in the list
+    @type item: pyAA.AccessibleObject
+    @return: Name of the item and its fields
+    @rtype: 2-tuple
+    @raise KeyError: When the item was not read ahead or changed since
+    '''
+    self._SyncItems()
+    return self.prefetched[item.ChildID]
+
+  def _GetBounds(self):
+    '''
+    Gets the child IDs of the first and last items, navigating to them only if
+    the items changed since they were last found.
+
+    @return: Child IDs of the first and last items
+    @rtype: 2-tuple of integer
+    @raise pyAA.Error: When the list is empty
+    '''
+    changes = self._SyncItems()
+    if self.bounds is not None:
+      return self.bounds
+    bounds = (self.subject.Navigate(FIRST).ChildID, 
+              self.subject.Navigate(LAST).ChildID)
+    if self._CanKeep(changes):
+      self.bounds = bounds
+    return bounds
 
   def GetItemCount(self):
     '''
     @return: Number of child items in the collection
     @rtype: number
     '''
-    # get the first item
     try:
-      first = self.subject.Navigate(FIRST)
+      first, last = self._GetBounds()
     except pyAA.Error:
       return 0
-    # get the last item
-    try:
-      last = self.subject.Navigate(LAST)
-    except pyAA.Error:
-      return 0
-    return last.ChildID-first.ChildID+1
+    return last-first+1
 
   def GetIndex(self):
     '''
     @return: Index of the focused item
     @rtype: integer
     '''
-    # get the first item
     try:
-      first = self.subject.Navigate(FIRST)
+      first, last = self._GetBounds()
     except pyAA.Error:
       return 0
     # compute the offset
-    return self.GetSelectedItem().ChildID - first.ChildID
+    return self.GetSelectedItem().ChildID - first
 
   def SelectAll(self):
     '''Selects all items.'''
@@ -437,6 +853,34 @@ class List(Collection):
     self.SetSelectedItem(n)
     return res
 
+  def SkipItems(self, count):
+    '''
+    Selects the item count places after the current item, or before it if
+    count is negative, wrapping at the ends like repeated calls to L{NextItem}
+    or L{PrevItem}. Only the final item is selected.
+
+    @param count: Number of items to move
+    @type count: integer
+    @return: Did the selection wrap?
+    @rtype: boolean
+    '''
+    if count > 0:
+      step, restart = NEXT, FIRST
+    else:
+      step, restart = PREVIOUS, LAST
+    n = self.GetSelectedItem()
+    if n is None:
+      return False
+    res = False
+    for i in xrange(abs(count)):
+      try:
+        n = n.Navigate(step)
+      except pyAA.Error:
+        n = self.subject.Navigate(restart)
+        res = True
+    self.SetSelectedItem(n)
+    return res
+
   def _SearchAhead(self, curr):
     try:
       return curr.Navigate(NEXT)
@@ -471,7 +915,7 @@ class EditableList(List):
   L{View.Control.List}.
   '''
   advise(instancesProvide=[IList, ISeekable, ISearchable, IInteractive,
-                           IDeletable])
+                           IDeletable, IPrefetchable])
 
   def Delete(self):
     '''
@@ -492,10 +936,22 @@ class ColumnList(List):
   @type sort_col: integer
   @ivar sort_asc: True to sort ascending, False to sort descending
   @type sort_asc: boolean
+  @ivar rows: Item, fields, and name of every item in the order of the control
+    or None if not read since the items last changed
+  @type rows: list of 3-tuple
+  @ivar sort_keys: Sort keys of every row keyed by column name
+  @type sort_keys: dictionary
+  @ivar order: Positions in L{rows} in sorted order or None if not sorted since
+    the items last changed
+  @type order: list of integer
+  @ivar positions: Positions in L{order} keyed by item child ID
+  @type positions: dictionary
+  @ivar dirty: Child IDs of items whose rows must be read again
+  @type dirty: set
   '''
   advise(instancesProvide=[IList, ISeekable, ISearchable, ISortable, 
-                           IInteractive, IDetailable])
-  fields_regex = re.compile('^[^:,]+: ?|,[^:,]+: ?')
+                           IInteractive, IDetailable, IPrefetchable])
+  fields_regex = FIELDS
 
   def __init__(self, context, path, name_key='Name', primary_keys=None):
     super(ColumnList, self).__init__(context, path)
@@ -514,11 +970,343 @@ class ColumnList(List):
     '''
     # only get context first
     if Adapter.Activate(self):
+      self._WatchStructure()
       if self.sort_col is None and self.GetItemCount() > 1:
         # sort on the name key, starting ascending
-        self._SortByHeader(self.name_key, True)
+        self._Sort(self.name_key, True)
     # now do selection and such to account for new sort order
     return super(ColumnList, self).Activate()
+
+  def InvalidateItems(self):
+    '''Forgets the rows read from the items and their sorted order.'''
+    super(ColumnList, self).InvalidateItems()
+    self.rows = None
+    self.sort_keys = {}
+    self.order = None
+    self.positions = None
+    self.dirty = set()
+
+  def InvalidateItem(self, child_id):
+    '''
+    Marks the row of one item to be read again after its name or description 
+    changed, so that a change to one item does not cost reading all of them 
+    again. Does not read the item here since observers run inside the hook.
+
+    @param child_id: Child ID of the item
+    @type child_id: integer
+    '''
+    super(ColumnList, self).InvalidateItem(child_id)
+    if self.rows is not None:
+      self.dirty.add(child_id)
+
+  def _UpdateRow(self, child_id):
+    '''
+    Reads the row of one item again and moves it to its new place in sorted 
+    order. Forgets all rows if the item is not among them or cannot be read.
+
+    @param child_id: Child ID of the item
+    @type child_id: integer
+    '''
+    rows = self.rows
+    try:
+      if self.positions is not None:
+        i = self.order[self.positions[child_id]]
+      else:
+        i = [item.ChildID for item, fields, name in rows].index(child_id)
+      item = rows[i][0]
+      fields = self._GetFieldsFor(item)
+      rows[i] = (item, fields, self._GetNameFor(item, fields))
+    except (KeyError, ValueError, pyAA.Error):
+      self.InvalidateItems()
+      return
+    if self.rows is not rows:
+      # the items changed while the row was read
+      return
+    for key, keys in self.sort_keys.iteritems():
+      keys[i] = _sortKey(fields.get(key))
+    if self.order is not None:
+      self._Reposition(rows, i)
+
+  def _Precedes(self, rows, a, b):
+    '''
+    Compares two rows the way L{_GetOrder} sorts them.
+
+    @param rows: Rows in the order of the control
+    @type rows: list of 3-tuple
+    @param a: Position of one row in L{rows}
+    @type a: integer
+    @param b: Position of another row in L{rows}
+    @type b: integer
+    @return: Does row a come before row b in sorted order?
+    @rtype: boolean
+    '''
+    keys = self._GetSortKeys(rows, self.sort_col)
+    if keys[a] != keys[b]:
+      return (keys[a] < keys[b]) == bool(self.sort_asc)
+    for key in (self.primary_keys or []):
+      if key == self.sort_col:
+        continue
+      keys = self._GetSortKeys(rows, key)
+      if keys[a] != keys[b]:
+        return keys[a] < keys[b]
+    return a < b
+
+  def _Reposition(self, rows, i):
+    '''
+    Moves one row to its place in sorted order after its fields changed and
+    updates the positions of the rows it passed.
+
+    @param rows: Rows in the order of the control
+    @type rows: list of 3-tuple
+    @param i: Position of the row in L{rows}
+    @type i: integer
+    '''
+    order = self.order
+    old = self.positions[rows[i][0].ChildID]
+    del order[old]
+    lo, hi = 0, len(order)
+    while lo < hi:
+      mid = (lo+hi)//2
+      if self._Precedes(rows, order[mid], i):
+        lo = mid+1
+      else:
+        hi = mid
+    order.insert(lo, i)
+    for p in xrange(min(old, lo), max(old, lo)+1):
+      self.positions[rows[order[p]][0].ChildID] = p
+
+  def _Sort(self, key, asc):
+    '''
+    Sorts the items in memory while they are watched for changes. Otherwise,
+    sorts the control itself by clicking its headers.
+
+    @param key: Column key
+    @type key: string
+    @param asc: Sort in ascending (True) or descending (False) order?
+    @type asc: boolean
+    '''
+    if self.structure_hwnd is not None:
+      self.sort_col = key
+      self.sort_asc = asc
+      self.order = None
+      self.positions = None
+      self.snapshot = None
+    else:
+      self._SortByHeader(key, asc)
+
+  def _GetRows(self):
+    '''
+    Gets the item, fields, and name of every item, reading them in one pass 
+    only if the items changed since they were last read. Otherwise reads again
+    only the rows of items renamed since.
+
+    @return: Rows in the order of the control
+    @rtype: list of 3-tuple
+    @raise pyAA.Error: When the list is empty
+    '''
+    changes = self._SyncItems()
+    while self.rows is not None and self.dirty:
+      self._UpdateRow(self.dirty.pop())
+    if self.rows is not None:
+      return self.rows
+    rows = []
+    for item in self._ReadItems():
+      fields = self._GetFieldsFor(item)
+      rows.append((item, fields, self._GetNameFor(item, fields)))
+    if self._CanKeep(changes):
+      self.rows = rows
+    return rows
+
+  def _GetSortKeys(self, rows, key):
+    '''
+    Gets the sort key of a column for every row, building them only the first 
+    time the column is sorted since the items last changed.
+
+    @param rows: Rows in the order of the control
+    @type rows: list of 3-tuple
+    @param key: Column key
+    @type key: string
+    @return: Sort key of every row
+    @rtype: list of tuple
+    '''
+    try:
+      if rows is self.rows:
+        return self.sort_keys[key]
+    except KeyError:
+      pass
+    keys = [_sortKey(fields.get(key)) for item, fields, name in rows]
+    if rows is self.rows:
+      self.sort_keys[key] = keys
+    return keys
+
+  def _GetOrder(self):
+    '''
+    Gets the positions of the rows in sorted order. Ties on the sort column are
+    broken by the other primary keys in order, ascending, and then by the order
+    of the control.
+
+    @return: Rows and the positions of the rows in sorted order, or None when 
+      the items are not sorted in memory
+    @rtype: 2-tuple of list
+    @raise pyAA.Error: When the list is empty
+    '''
+    if self.structure_hwnd is None or self.sort_col is None:
+      return None
+    rows = self._GetRows()
+    if self.order is not None:
+      return rows, self.order
+    order = range(len(rows))
+    # stable sorts, least significant key first
+    ties = [key for key in (self.primary_keys or []) if key != self.sort_col]
+    for key in reversed(ties):
+      keys = self._GetSortKeys(rows, key)
+      order.sort(key=keys.__getitem__)
+    keys = self._GetSortKeys(rows, self.sort_col)
+    order.sort(key=keys.__getitem__, reverse=not self.sort_asc)
+    if rows is self.rows:
+      # rows read while the items changed are not kept, nor is their order
+      self.order = order
+      self.positions = dict([(rows[i][0].ChildID, p) 
+                             for p, i in enumerate(order)])
+    return rows, order
+
+  def _GetViewPosition(self):
+    '''
+    Gets the position of the selected item in sorted order.
+
+    @return: Rows, their sorted order, and the position of the selection, or 
+      None when the items are not sorted in memory or the selection is not 
+      among them
+    @rtype: 3-tuple
+    '''
+    try:
+      rows, order = self._GetOrder()
+      return rows, order, self.positions[self.GetSelectedItem().ChildID]
+    except (TypeError, AttributeError, KeyError, pyAA.Error):
+      return None
+
+  def _SelectPosition(self, rows, order, p):
+    '''
+    Selects the live item at a position in sorted order.
+
+    @param rows: Rows in the order of the control
+    @type rows: list of 3-tuple
+    @param order: Positions of the rows in sorted order
+    @type order: list of integer
+    @param p: Position in sorted order
+    @type p: integer
+    '''
+    self.SetSelectedItem(rows[order[p]][0])
+
+  def GetIndex(self):
+    '''
+    @return: Index of the focused item in sorted order
+    @rtype: integer
+    '''
+    pos = self._GetViewPosition()
+    if pos is None:
+      return super(ColumnList, self).GetIndex()
+    return pos[2]
+
+  def FirstItem(self):
+    '''
+    Selects the first item in sorted order.
+
+    @return: Was the first item selected?
+    @rtype: boolean
+    '''
+    try:
+      view = self._GetOrder()
+    except pyAA.Error:
+      return False
+    if view is None:
+      return super(ColumnList, self).FirstItem()
+    self._SelectPosition(view[0], view[1], 0)
+    return True
+
+  def LastItem(self):
+    '''
+    Selects the last item in sorted order.
+
+    @return: Was the last item selected?
+    @rtype: boolean
+    '''
+    try:
+      view = self._GetOrder()
+    except pyAA.Error:
+      return False
+    if view is None:
+      return super(ColumnList, self).LastItem()
+    self._SelectPosition(view[0], view[1], len(view[1])-1)
+    return True
+
+  def SkipItems(self, count):
+    '''
+    Selects the item count places after the current item in sorted order, or 
+    before it if count is negative, wrapping at the ends.
+
+    @param count: Number of items to move
+    @type count: integer
+    @return: Did the selection wrap?
+    @rtype: boolean
+    '''
+    pos = self._GetViewPosition()
+    if pos is None:
+      return super(ColumnList, self).SkipItems(count)
+    rows, order, p = pos
+    p += count
+    self._SelectPosition(rows, order, p % len(order))
+    return not 0 <= p < len(order)
+
+  def NextItem(self):
+    '''
+    Selects the next item in sorted order or wraps to the first.
+
+    @return: Did the selection wrap?
+    @rtype: boolean
+    '''
+    if self._GetViewPosition() is None:
+      return super(ColumnList, self).NextItem()
+    return self.SkipItems(1)
+
+  def PrevItem(self):
+    '''
+    Selects the previous item in sorted order or wraps to the last.
+
+    @return: Did the selection wrap?
+    @rtype: boolean
+    '''
+    if self._GetViewPosition() is None:
+      return super(ColumnList, self).PrevItem()
+    return self.SkipItems(-1)
+
+  def _GetSnapshot(self):
+    '''
+    Gets all items and their lowercase search names in sorted order.
+
+    @return: Items in order and their names
+    @rtype: 2-tuple of list
+    @raise pyAA.Error: When the list is empty
+    '''
+    view = self._GetOrder()
+    if view is None:
+      return super(ColumnList, self)._GetSnapshot()
+    if self.snapshot is not None:
+      return self.snapshot
+    rows, order = view
+    snapshot = ([rows[i][0] for i in order], 
+                [(rows[i][2] or '').lower() for i in order])
+    if rows is self.rows:
+      self.snapshot = snapshot
+    return snapshot
+
+  def _FindInSnapshot(self, items, item):
+    if self.positions is None:
+      return super(ColumnList, self)._FindInSnapshot(items, item)
+    try:
+      return self.positions[item.ChildID]
+    except KeyError:
+      raise ValueError
     
   def _SortByHeader(self, key, asc):
     '''
@@ -574,25 +1362,25 @@ class ColumnList(List):
     s = item.Description
     d = {}
     if s is not None:
-      # split the description
-      keys = [k.strip(' ,:') for k in ColumnList.fields_regex.findall(s)]
-      values = self.fields_regex.split(s)[1:]
-      # build a dictionary of fields
-      d = dict(zip(keys, values))
+      # split the description, copying the shared result
+      d = dict(ParseFields(s))
       # add the name field
       d[self.name_key] = item.Name or 'None'
     return d
 
-  def _GetNameFor(self, item):
+  def _GetNameFor(self, item, fields=None):
     '''
     Gets the name for the given item, not the current selection.
 
     @param item: Item in the list
     @type item: pyAA.Accessible
+    @param fields: Fields of the item if already read
+    @type fields: dictionary
     @return: Name of the item given by the L{primary_keys} fields.
     @rtype: string
     '''
-    fields = self._GetFieldsFor(item)
+    if fields is None:
+      fields = self._GetFieldsFor(item)
     if fields is not None and self.primary_keys:
       # select those of interest
       o = []
@@ -620,7 +1408,7 @@ class ColumnList(List):
       wrap = (i-1 < 0)
       self.sort_col = self.primary_keys[(i-1) % len(self.primary_keys)] 
     # flip the sort
-    self._SortByHeader(self.sort_col, not self.sort_asc)
+    self._Sort(self.sort_col, not self.sort_asc)
     return wrap
   
   def SortNext(self):
@@ -639,7 +1427,7 @@ class ColumnList(List):
       wrap = (i+1 >= l)
       self.sort_col = self.primary_keys[(i+1) % l]      
     # flip the sort
-    self._SortByHeader(self.sort_col, not self.sort_asc)
+    self._Sort(self.sort_col, not self.sort_asc)
     return wrap
   
   def GetSortName(self): 
@@ -663,19 +1451,67 @@ class ColumnList(List):
     @return: Values of the primary field(s) which defaults to the Name property
     @rtype: string
     '''
+    pos = self._GetViewPosition()
+    if pos is not None:
+      rows, order, p = pos
+      return rows[order[p]][2]
     # quit immediately if there is no focus
     selected = self.GetSelectedItem()
     if selected is None:
       return default
-    return self._GetNameFor(selected)
+    try:
+      return self._GetPrefetched(selected)[0]
+    except KeyError:
+      return self._GetNameFor(selected)
 
   def GetFields(self):
     '''
     @return: Field values keyed by field name
     @rtype: dictionary
     '''
+    pos = self._GetViewPosition()
+    if pos is not None:
+      rows, order, p = pos
+      return dict(rows[order[p]][1])
     selected = self.GetSelectedItem()
-    return self._GetFieldsFor(selected)
+    try:
+      fields = self._GetPrefetched(selected)[1]
+    except (KeyError, AttributeError):
+      return self._GetFieldsFor(selected)
+    return fields and dict(fields)
+
+  def _ReadRow(self, item):
+    fields = self._GetFieldsFor(item)
+    return (self._GetNameFor(item, fields), fields)
+
+  def PrefetchNeighbors(self, count):
+    '''
+    Yields the names of up to count items on either side of the selection in
+    sorted order, nearest first, when the rows are already in memory so that
+    only their speech is rendered ahead. Otherwise, reads the items around the
+    selection in the order of the control.
+
+    @param count: Number of items on each side
+    @type count: integer
+    @return: Generator yielding the name of each item
+    @rtype: generator
+    '''
+    pos = self._GetViewPosition()
+    if pos is None:
+      for name in super(ColumnList, self).PrefetchNeighbors(count):
+        yield name
+      return
+    rows, order, p = pos
+    for i in xrange(1, count+1):
+      for q in (p+i, p-i):
+        if 0 <= q < len(order):
+          yield rows[order[q]][2]
+          if self.order is not order:
+            # the items changed or were sorted again
+            return
+
+  def _GetSearchName(self, item):
+    return self._GetNameFor(item)
 
   def _SearchTestStartsWith(self, curr, text):
     return self._GetNameFor(curr).lower().startswith(text.lower())
@@ -689,7 +1525,7 @@ class EditableColumnList(ColumnList):
   L{View.Control.List}.
   '''
   advise(instancesProvide=[IList, IDeletable, ISeekable, ISearchable,
-                           IInteractive])
+                           IInteractive, IPrefetchable])
 
   def Delete(self):
     '''
@@ -760,6 +1596,24 @@ class DropDownList(List):
     except AttributeError:
       return False
 
+  def SkipItems(self, count):
+    '''
+    Moves one item at a time so the keystrokes keep the list open.
+
+    @param count: Number of items to move
+    @type count: integer
+    @return: Did the selection wrap?
+    @rtype: boolean
+    '''
+    if count > 0:
+      step = self.NextItem
+    else:
+      step = self.PrevItem
+    res = False
+    for i in xrange(abs(count)):
+      res = step() or res
+    return res
+
   def Activate(self):
     '''
     Refreshes the drop down list model. Makes the list the subject. Gets a
@@ -776,6 +1630,7 @@ class DropDownList(List):
     self.button = self.subject.Children[1]
     # reference the list
     self.subject = self.subject.Children[2].Children[3]
+    self._WatchStructure()
     #self.subject.FindOneChild(lambda x:
                    #x.Role == pyAA.Constants.ROLE_SYSTEM_LIST)
     # ensure the list is visible first by pressing the button
@@ -787,11 +1642,28 @@ class DropDownList(List):
 
   def Deactivate(self):
     '''Closes drop down with the current selection active.'''
+    self._UnwatchStructure()
     try:
       self.button.DoDefaultAction()
     except AttributeError:
       pass
 
+  def _SelectSnapshotItem(self, item):
+    '''
+    Moves to an item found in the snapshot with keystrokes to avoid closing the
+    list.
+
+    @param item: Item to select
+    @type item: pyAA.AccessibleObject
+    '''
+    if not self.ResetFocus():
+      return
+    delta = item.ChildID - self.GetSelectedItem().ChildID
+    if delta > 0:
+      self.subject.SendKeys('{DOWN}'*delta)
+    elif delta < 0:
+      self.subject.SendKeys('{UP}'*-delta)
+
   def _SearchStart(self):
     self.search_count = [0, False]
     return super(DropDownList, self)._SearchStart()
@@ -829,6 +1701,50 @@ class Tree(Collection):
   advise(instancesProvide=[ITree, ISeekable, ISearchable, IInteractive,
                            IStrideable])
 
+  def InvalidateItems(self):
+    '''Forgets the position of the focused item and all child counts.'''
+    # child ID, index in its level, and size of its level, either may be None
+    self.position = None
+    # positions of the items above the focused item in the order entered
+    self.ancestors = []
+    self.child_counts = {}
+
+  def _GetPosition(self, curr):
+    '''
+    Gets the index and level size known for an item.
+
+    @param curr: Item in the tree
+    @type curr: pyAA.AccessibleObject
+    @return: Index and level size, each None if unknown
+    @rtype: 2-tuple
+    '''
+    try:
+      cid, index, count = self.position
+      if curr.ChildID == cid:
+        return index, count
+    except (TypeError, AttributeError):
+      pass
+    return None, None
+
+  def _SetPosition(self, curr, index, count, changes):
+    '''
+    Remembers the index and level size of an item while the items are watched
+    for changes and did not change since they were read.
+
+    @param curr: Item in the tree
+    @type curr: pyAA.AccessibleObject
+    @param index: Index in its level or None if unknown
+    @type index: integer
+    @param count: Number of items in its level or None if unknown
+    @type count: integer
+    @param changes: Number of changes returned by L{_SyncItems} before reading
+    @type changes: integer
+    '''
+    if self._CanKeep(changes):
+      self.position = (curr.ChildID, index, count)
+    else:
+      self.position = None
+
   def ShowChildren(self):
     '''
     Make any children of the focused node visible. Navigation to child nodes
@@ -870,16 +1786,24 @@ class Tree(Collection):
     @return: Number of items in this level only
     @rtype: integer
     '''
+    changes = self._SyncItems()
     curr = self.GetSelectedItem()
-    i = self.GetIndex()+1
+    index, count = self._GetPosition(curr)
+    if count is not None:
+      return count
+    if index is None:
+      index = self._WalkIndex(curr)
+    i = index+1
+    last = curr
     while 1:
       try:
-        curr = curr.Navigate(DOWN)
+        last = last.Navigate(DOWN)
         i += 1
       except pyAA.Error:
         break
       except AttributeError:
         return 0
+    self._SetPosition(curr, index, i, changes)
     return i
 
   def GetChildCount(self):
@@ -889,8 +1813,14 @@ class Tree(Collection):
     '''
     # ensure children exist
     self.ShowChildren()
+    changes = self._SyncItems()
+    parent = self.GetSelectedItem()
+    try:
+      return self.child_counts[parent.ChildID]
+    except (KeyError, AttributeError):
+      pass
     try:
-      curr = self.GetSelectedItem().Navigate(RIGHT)
+      curr = parent.Navigate(RIGHT)
     except (AttributeError, pyAA.Error):
       return 0
     i = 1
@@ -900,6 +1830,8 @@ class Tree(Collection):
         i += 1
       except pyAA.Error:
         break
+    if self._CanKeep(changes):
+      self.child_counts[parent.ChildID] = i
     return i
 
   def GetIndex(self):
@@ -907,7 +1839,25 @@ class Tree(Collection):
     @return: Index relative to the first sibling in this level
     @rtype: integer
     '''
+    changes = self._SyncItems()
     curr = self.GetSelectedItem()
+    index, count = self._GetPosition(curr)
+    if index is not None:
+      return index
+    index = self._WalkIndex(curr)
+    if curr is not None:
+      self._SetPosition(curr, index, count, changes)
+    return index
+
+  def _WalkIndex(self, curr):
+    '''
+    Counts the siblings before an item.
+
+    @param curr: Item in the tree
+    @type curr: pyAA.AccessibleObject
+    @return: Index relative to the first sibling in its level
+    @rtype: integer
+    '''
     i = 0
     while 1:
       try:
@@ -924,20 +1874,29 @@ class Tree(Collection):
     @return: Did the selection wrap?
     @rtype: boolean
     '''
+    changes = self._SyncItems()
     curr = self.GetSelectedItem()
+    index, count = self._GetPosition(curr)
     try:
       curr = curr.Navigate(DOWN)
       res = False
+      if index is not None:
+        index += 1
     except AttributeError:
       return False
     except pyAA.Error:
+      # wrapping walks the whole level, so count it
+      steps = 0
       while 1:
         try:
           curr = curr.Navigate(UP)
+          steps += 1
         except pyAA.Error:
           break
       res = True
+      index, count = 0, steps+1
     self.SetSelectedItem(curr)
+    self._SetPosition(curr, index, count, changes)
     self.ShowChildren()
     return res
 
@@ -948,20 +1907,29 @@ class Tree(Collection):
     @return: Did the selection wrap?
     @rtype: boolean
     '''
+    changes = self._SyncItems()
     curr = self.GetSelectedItem()
+    index, count = self._GetPosition(curr)
     try:
       curr = curr.Navigate(UP)
       res = False
+      if index is not None:
+        index -= 1
     except AttributeError:
       return False
     except pyAA.Error:
+      # wrapping walks the whole level, so count it
+      steps = 0
       while 1:
         try:
           curr = curr.Navigate(DOWN)
+          steps += 1
         except:
           break
       res = True
+      index, count = steps, steps+1
     self.SetSelectedItem(curr)
+    self._SetPosition(curr, index, count, changes)
     self.ShowChildren()
     return res
 
@@ -1001,11 +1969,18 @@ class Tree(Collection):
     '''
     if self.HasChildren():
       # navigate to the next item
+      changes = self._SyncItems()
+      curr = self.GetSelectedItem()
       try:
-        n = self.GetSelectedItem().Navigate(RIGHT)
+        n = curr.Navigate(RIGHT)
       except (AttributeError, pyAA.Error):
         return False
+      index, count = self._GetPosition(curr)
       self.SetSelectedItem(n)
+      if self._CanKeep(changes):
+        # remember where we were to restore it on the way back up
+        self.ancestors.append((curr.ChildID, index, count))
+      self._SetPosition(n, 0, self.child_counts.get(curr.ChildID), changes)
       self.ShowChildren()
       return True
     return False
@@ -1019,11 +1994,25 @@ class Tree(Collection):
     '''
     if self.HasParent():
       # navigate to the next item
+      changes = self._SyncItems()
+      curr = self.GetSelectedItem()
       try:
-        n = self.GetSelectedItem().Navigate(LEFT)
+        n = curr.Navigate(LEFT)
       except:
         return False
+      index, count = self._GetPosition(curr)
+      if count is not None and self._CanKeep(changes):
+        # the level we are leaving holds the children of the parent
+        self.child_counts[n.ChildID] = count
       self.SetSelectedItem(n)
+      index = count = None
+      if self.ancestors:
+        cid, index, count = self.ancestors.pop()
+        if cid != n.ChildID:
+          # focus moved some other way since, the path down is stale
+          self.ancestors = []
+          index = count = None
+      self._SetPosition(n, index, count, changes)
       self.ShowChildren()
       return True
     return False
@@ -1074,7 +2063,8 @@ class ButtonList(Collection):
     list. Mapping from index in list to label.
   @type labels: dictionary
   '''
-  advise(instancesProvide=[IList, ISeekable, ISearchable, IInteractive])
+  advise(instancesProvide=[IList, ISeekable, ISearchable, IInteractive,
+                           ISkippable])
   def __init__(self, context, path, select_hack=False, labels={}, curr=0, hack_type='left'):
     super(ButtonList, self).__init__(context, path, select_hack, hack_type)
     self.curr = curr
@@ -1258,6 +2248,27 @@ class ButtonList(Collection):
       return False
     return rv
 
+  def SkipItems(self, count):
+    '''
+    Selects the item count places after the current item, or before it if
+    count is negative, wrapping at the ends.
+
+    @param count: Number of items to move
+    @type count: integer
+    @return: Did the selection wrap?
+    @rtype: boolean
+    '''
+    total = self.GetItemCount()
+    curr = self.curr + count
+    rv = curr < 0 or curr >= total
+    self.curr = curr % total
+    try:
+      n = self.GetItem(self.curr)
+      self.SetSelectedItem(n)
+    except (pyAA.Error, AttributeError):
+      return False
+    return rv
+
   def _SearchStart(self):
     '''
     Callback for L{CircularSearch}. Gets the currently selected item.
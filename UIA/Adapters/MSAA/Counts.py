@@ -0,0 +1,190 @@
+'''
+Defines running totals of the characters and words in the chunks of a text box
+so that the position of the caret in the whole text and the number of words
+before it are found without joining the text before the caret. Run this module
+to benchmark the totals.
+
+@author: Peter Parente <parente@cs.unc.edu>
+@copyright: Copyright (c) 2008 Peter Parente
+@license: BSD License
+
+All rights reserved. This program and the accompanying materials are made
+available under the terms of The BSD License which accompanies this
+distribution, and is available at
+U{http://www.opensource.org/licenses/bsd-license.php}
+'''
+
+def _MakeTree(values):
+  '''
+  Builds a Fenwick tree over values in linear time.
+
+  @param values: Value of every position
+  @type values: list of integer
+  @return: Tree indexed from one
+  @rtype: list of integer
+  '''
+  tree = [0]+values
+  n = len(tree)
+  for i in xrange(1, n):
+    j = i+(i & -i)
+    if j < n:
+      tree[j] += tree[i]
+  return tree
+
+def _Sum(tree, n):
+  '''
+  Sums the first n values in a Fenwick tree.
+
+  @param tree: Tree indexed from one
+  @type tree: list of integer
+  @param n: Number of values to sum
+  @type n: integer
+  @return: Sum of the values
+  @rtype: integer
+  '''
+  total = 0
+  while n > 0:
+    total += tree[n]
+    n -= n & -n
+  return total
+
+def _Add(tree, i, delta):
+  '''
+  Adds to one value in a Fenwick tree.
+
+  @param tree: Tree indexed from one
+  @type tree: list of integer
+  @param i: Position of the value, from zero
+  @type i: integer
+  @param delta: Amount to add
+  @type delta: integer
+  '''
+  i += 1
+  n = len(tree)
+  while i < n:
+    tree[i] += delta
+    i += i & -i
+
+class ChunkCounts(object):
+  '''
+  Characters and words in every chunk of a text held in Fenwick trees. The
+  counts of a chunk are updated in place when its text is edited. Adding or
+  removing chunks shifts the positions of all chunks after them, so the counts
+  are built again instead.
+
+  @ivar chunks: Chunks counted
+  @type chunks: list of L{Text.Chunk}
+  @ivar chars: Number of characters in every chunk
+  @type chars: list of integer
+  @ivar words: Number of words in every chunk
+  @type words: list of integer
+  @ivar char_tree: Tree of L{chars}
+  @type char_tree: list of integer
+  @ivar word_tree: Tree of L{words}
+  @type word_tree: list of integer
+  '''
+  def __init__(self, chunks):
+    '''
+    Counts all chunks.
+
+    @param chunks: Chunks to count
+    @type chunks: list of L{Text.Chunk}
+    '''
+    self.chunks = chunks
+    self.chars = [len(c.text) for c in chunks]
+    self.words = [len(c.text.split()) for c in chunks]
+    self.char_tree = _MakeTree(self.chars)
+    self.word_tree = _MakeTree(self.words)
+
+  def IsCurrent(self, chunks):
+    '''
+    @param chunks: Chunks of the text now
+    @type chunks: list of L{Text.Chunk}
+    @return: Are these counts of the same chunks?
+    @rtype: boolean
+    '''
+    return chunks is self.chunks and len(chunks) == len(self.chars)
+
+  def Update(self, i):
+    '''
+    Counts one chunk again after its text changed.
+
+    @param i: Position of the chunk
+    @type i: integer
+    '''
+    text = self.chunks[i].text
+    chars = len(text)
+    words = len(text.split())
+    _Add(self.char_tree, i, chars-self.chars[i])
+    _Add(self.word_tree, i, words-self.words[i])
+    self.chars[i] = chars
+    self.words[i] = words
+
+  def GetChars(self, n):
+    '''
+    @param n: Number of chunks
+    @type n: integer
+    @return: Characters in the first n chunks
+    @rtype: integer
+    '''
+    return _Sum(self.char_tree, n)
+
+  def GetWords(self, n):
+    '''
+    @param n: Number of chunks
+    @type n: integer
+    @return: Words in the first n chunks
+    @rtype: integer
+    '''
+    return _Sum(self.word_tree, n)
+
+def Benchmark(count=50000, queries=200):
+  '''
+  Measures finding the caret index and the words before it in a synthetic
+  text of count lines by joining the text before the caret, as before, and by
+  summing the counts, along with the cost of building the counts and of
+  updating them after a typed character.
+
+  @param count: Number of chunks
+  @type count: integer
+  @param queries: Number of caret positions queried
+  @type queries: integer
+  @return: Human readable report
+  @rtype: string
+  '''
+  import time, random
+  r = random.Random(0)
+  words = ['the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog']
+  class Line(object):
+    def __init__(self, text):
+      self.text = text
+    def __str__(self):
+      return self.text
+  chunks = [Line(' '.join([r.choice(words) for i in xrange(r.randint(0, 15))]))
+            for j in xrange(count)]
+  positions = [r.randint(0, count-1) for i in xrange(queries)]
+  lines = ['%d chunks, %d characters, %d queries' %
+           (count, sum([len(c.text)+1 for c in chunks]), queries)]
+  start = time.time()
+  joined = []
+  for pos in positions:
+    wgen = [str(c) for c in chunks[:pos]]
+    joined.append((len(' '.join(wgen)), len('\n'.join(wgen).split())))
+  lines.append('join: %.2f ms/query' % ((time.time()-start)/queries*1e3))
+  start = time.time()
+  counts = ChunkCounts(chunks)
+  lines.append('build counts: %.2f ms once' % ((time.time()-start)*1e3))
+  start = time.time()
+  for i, pos in enumerate(positions):
+    index = counts.GetChars(pos)+max(pos-1, 0)
+    assert (index, counts.GetWords(pos)) == joined[i]
+  lines.append('counts: %.4f ms/query' % ((time.time()-start)/queries*1e3))
+  start = time.time()
+  for pos in positions:
+    chunks[pos].text += 'x'
+    counts.Update(pos)
+  lines.append('update: %.4f ms/edit' % ((time.time()-start)/queries*1e3))
+  return '\n'.join(lines)
+
+if __name__ == '__main__':
+  print Benchmark()
@@ -14,43 +14,92 @@ U{http://www.opensource.org/licenses/bsd-license.php}
 '''
 import unicodedata
 import re, pyAA
+import System, Config
 from Base import Adapter
 from protocols import advise
 from Constants import *
 from Interface import *
 from Text import CaretDelta, Chunk
+from Buffer import VirtualBuffer, LiveRecord, NODE, ROLE, STATE, OFFSET, NAME
+from Buffer import CompilePattern, FindNext, FindPrev
+from UIA import EventManager
 # clipboard functions for getting all text
 import win32clipboard as clip
 import win32con
 
+# events after which nodes in the flattened document may be out of order
+STRUCTURE_EVENTS = (pyAA.Constants.EVENT_OBJECT_REORDER,
+                    pyAA.Constants.EVENT_OBJECT_CREATE,
+                    pyAA.Constants.EVENT_OBJECT_DESTROY)
+# events after which names and states in the flattened document may be old
+CONTENT_EVENTS = (pyAA.Constants.EVENT_OBJECT_SHOW,
+                  pyAA.Constants.EVENT_OBJECT_HIDE,
+                  pyAA.Constants.EVENT_OBJECT_NAMECHANGE,
+                  pyAA.Constants.EVENT_OBJECT_DESCRIPTIONCHANGE,
+                  pyAA.Constants.EVENT_OBJECT_VALUECHANGE,
+                  pyAA.Constants.EVENT_OBJECT_STATECHANGE)
+
 class HypertextDocument(Adapter):
   '''
   Complex hypertext document that stores its data across a number of child nodes
   of varying roles. Document is walked as is, and not pulled entirely into the
   client first. Adapted for use with L{View.Control.Text}.
 
+  While active, the document is also flattened into a L{VirtualBuffer} a few
+  nodes at a time when idle. Once the buffer is complete, moving through the
+  document is an index operation on the buffer. The buffer is read again when
+  nodes are added, removed, or reordered and swapped in when done, so the old
+  buffer is used until then. When only names or states change, the buffer is
+  marked dirty instead and the node under the pointer is read live.
+
   @ivar pointer: Current location within the document
   @type pointer: Accessible
+  @ivar index: Position of the pointer in reading order or None if unknown
+  @type index: integer
+  @ivar hint: Last known position of the pointer, used to find it in a new
+    buffer when its position is unknown
+  @type hint: integer
   @ivar chunk: Current chunk of text
   @type chunk: L{Text.Chunk}
   @ivar first_activate: Will the next call to L{Activate} be the first?
   @type first_activate: boolean
-  @ivar search_anchor: Position at the start of a search
-  @type search_anchor: Accessible
+  @ivar search_anchor: Position, its index, and the buffer it was taken from at
+    the start of a search
+  @type search_anchor: 3-tuple
+  @ivar buffer: Complete flattened document or None if not read yet
+  @type buffer: L{VirtualBuffer}
+  @ivar pending: Flattened document being read or None if not reading
+  @type pending: L{VirtualBuffer}
+  @ivar document_hwnd: Window watched for changed nodes while active, or None
+  @type document_hwnd: integer
+  @ivar stale: Did nodes change after the pending buffer started reading?
+  @type stale: boolean
+  @ivar search_regex: Are search targets regular expressions?
+  @type search_regex: boolean
+  @ivar search_case: Do searches match case?
+  @type search_case: boolean
   '''
   advise(instancesProvide=[IHypertext, IInteractive, ISeekable, ISearchable])
   END_CHUNK_CHAR = 'break'
 
-  def __init__(self, context, path):
+  def __init__(self, context, path, search_regex=False, search_case=False):
     '''
     Initializes an instance.
 
     See instance variables for parameter descriptions.
     '''
     super(HypertextDocument, self).__init__(context, path)
+    self.search_regex = search_regex
+    self.search_case = search_case
     self.pointer = None
+    self.index = None
+    self.hint = 0
     self.chunk = Chunk()
     self.first_activate = True
+    self.buffer = None
+    self.pending = None
+    self.document_hwnd = None
+    self.stale = False
 
   def Activate(self):
     # only set the pointer to the start of the doc on first activate
@@ -58,13 +107,152 @@ class HypertextDocument(Adapter):
     if rv:
       if self.first_activate or self.pointer is None:
         # first time, build pointer
-        self._MovePointer(self.subject)
+        self._MovePointer(self.subject, 0)
         self.first_activate = False
+      # changes are not seen while inactive, so always read the buffer again
+      self._WatchDocument()
+      self._Refresh()
     return rv
 
+  def Deactivate(self):
+    '''
+    Stops watching for changed nodes and stops reading the buffer. Keeps the
+    buffer until a new one is read on the next activation.
+    '''
+    self._UnwatchDocument()
+    self.pending = None
+
   def HasChanged(self):
-    '''Make sure pointer is refreshed on next activate.'''
+    '''Make sure pointer and buffer are refreshed on next activate.'''
     self.pointer = None
+    self.buffer = None
+
+  def _WatchDocument(self):
+    '''
+    Starts watching for nodes changed in the window of the subject. Observes 
+    events rather than adding conditions so no change is missed when a 
+    condition of a macro or task claims the event first.
+    '''
+    self._UnwatchDocument()
+    try:
+      hwnd = self.subject.Window
+    except pyAA.Error:
+      return
+    for eid in STRUCTURE_EVENTS+CONTENT_EVENTS:
+      EventManager.addObserver(eid, self._OnDocumentChange)
+    self.document_hwnd = hwnd
+
+  def _UnwatchDocument(self):
+    '''Stops watching for changed nodes.'''
+    if self.document_hwnd is not None:
+      for eid in STRUCTURE_EVENTS+CONTENT_EVENTS:
+        EventManager.removeObserver(eid, self._OnDocumentChange)
+      self.document_hwnd = None
+
+  def _OnDocumentChange(self, event):
+    '''
+    Starts reading the buffer again when nodes in the watched window are added,
+    removed, or reordered. Lets a reading in progress finish and starts another
+    after it so a steady stream of changes cannot keep any reading from
+    finishing. Only marks the buffers dirty when names or states change, since
+    live pages change them constantly and reading would never stop.
+
+    @param event: Accessible event
+    @type event: pyAA.WinEvent
+    '''
+    if event.Window != self.document_hwnd:
+      return
+    if event.EventID in CONTENT_EVENTS:
+      for buf in (self.buffer, self.pending):
+        if buf is not None:
+          buf.dirty = True
+          # fields built from the old states
+          buf.chains.clear()
+      return
+    if self.pending is None:
+      self._Refresh()
+    elif len(self.pending):
+      # a reading that has not started yet will see the change anyway
+      self.stale = True
+
+  def _Refresh(self):
+    '''Starts reading a new buffer, abandoning any reading in progress.'''
+    self.stale = False
+    self.pending = VirtualBuffer(self.subject, self._NavNextLevel)
+    System.Pump().RegisterFuture(Config.buffer_delay, self._FillStep,
+                                 self.pending)
+
+  def _FillStep(self, buf):
+    '''
+    Reads the next nodes into a buffer. Re-registers itself until the buffer is
+    complete, then swaps it in and finds the pointer in it.
+
+    @param buf: Buffer started by L{_Refresh}
+    @type buf: L{VirtualBuffer}
+    '''
+    if buf is not self.pending:
+      return
+    try:
+      done = buf.Fill(Config.buffer_batch)
+    except pyAA.Error:
+      # the document went away, keep walking it live
+      self.pending = None
+      return
+    if not done:
+      System.Pump().RegisterFuture(Config.buffer_delay, self._FillStep, buf)
+      return
+    self.pending = None
+    if self.stale:
+      # nodes changed while reading, so read again after swapping this in
+      self._Refresh()
+    old = self.buffer
+    self.buffer = buf
+    if Config.trigram_chars and buf.length >= Config.trigram_chars:
+      buf.Index()
+      System.Pump().RegisterFuture(Config.buffer_delay, self._IndexStep, buf)
+    if self.index is None:
+      # the pointer was walked to live, so find it by its text and role
+      try:
+        role = self.pointer.RoleText
+      except (AttributeError, pyAA.Error):
+        return
+      self.index = buf.Locate(self.chunk.text, role, self.hint)
+      if self.index is None:
+        return
+    elif old is not None and self.index < len(old):
+      # nodes may have moved since the old buffer was read
+      self.index = buf.Relocate(old.records[self.index])
+    elif self.index >= len(buf):
+      self.index = None
+      return
+    # keep the caret unless the text under it changed
+    record = buf.records[self.index]
+    self.pointer = record[NODE]
+    if not buf.dirty and record[NAME] != self.chunk.text:
+      self.chunk = Chunk(record[NAME])
+
+  def _IndexStep(self, buf):
+    '''
+    Indexes the next characters of the buffer text for search. Re-registers
+    itself until the index is complete or the buffer is replaced.
+
+    @param buf: Buffer swapped in by L{_FillStep}
+    @type buf: L{VirtualBuffer}
+    '''
+    if buf is not self.buffer:
+      return
+    if not buf.trigrams.Fill(Config.trigram_batch):
+      System.Pump().RegisterFuture(Config.buffer_delay, self._IndexStep, buf)
+
+  def _GetBuffer(self):
+    '''
+    @return: Buffer to move through or None if the document must be walked
+      live because it has not been read or the pointer is not in it
+    @rtype: L{VirtualBuffer}
+    '''
+    if self.index is None:
+      return None
+    return self.buffer
 
   def GetTitle(self):
     '''
@@ -90,30 +278,92 @@ class HypertextDocument(Adapter):
     '''
     Gets role, state, and description strings from the current chunk. Also
     returns a flag indicating whether the information is trivial, namely 
-    the current pointer rests on regular document text.
+    the current pointer rests on regular document text. Only the role is taken
+    from the buffer since the state changes without the node moving.
 
     @return: Fields keyed by role, state, and description
     @rtype: dictionary
     '''
-    rt = self.pointer.RoleText
-    st = self.pointer.StateText
+    buf = self._GetBuffer()
+    if buf is not None:
+      record = buf.records[self.index]
+      return self._MakeFields(record[ROLE], self.pointer.StateText,
+                              self.pointer.Description)
+    return self._MakeFields(self.pointer.RoleText, self.pointer.StateText,
+                            self.pointer.Description)
+
+  def _MakeFields(self, rt, st, description):
+    '''
+    Builds the fields of a node.
+
+    @param rt: Role text
+    @type rt: string
+    @param st: State text
+    @type st: string
+    @param description: Description of the node
+    @type description: string
+    @return: Fields keyed by role, state, and description
+    @rtype: dictionary
+    '''
     # compute whether field information is trivial
     triv = (rt == 'editable text' and st.find('read only') > -1)
     return dict(role=rt,
                 state=st,
-                description=self.pointer.Description,
+                description=description,
                 trivial=triv)
 
+  def _GetChain(self, buf, i):
+    '''
+    Gets the fields of a buffered node and its ancestors up to the document,
+    building them only the first time they are needed. Chains are shared so
+    the fields of an ancestor are built once for all of its descendants. States
+    are read live while the buffer is dirty.
+
+    @param buf: Complete buffer
+    @type buf: L{VirtualBuffer}
+    @param i: Position of the node
+    @type i: integer
+    @return: Fields of the node and its ancestors, top level first
+    @rtype: tuple of dictionary
+    '''
+    try:
+      return buf.chains[i]
+    except KeyError:
+      pass
+    record = buf.records[i]
+    node = record[NODE]
+    state = record[STATE]
+    if buf.dirty:
+      state = node.StateText
+    fields = self._MakeFields(record[ROLE], state, node.Description)
+    parent = buf.parents[i]
+    if fields['role'] == 'document' or parent is None:
+      # stop after storing info about the document
+      chain = (fields,)
+    else:
+      chain = self._GetChain(buf, parent)+(fields,)
+    buf.chains[i] = chain
+    return chain
+
   def GetInheritedFields(self):
     '''
     Gets role, state, and description strings from the current chunk and all
     ancestors of the chunk. Also returns a flag indicating whether the
     information is trivial, namely the current pointer rests on regular
-    document text.
+    document text. Ancestors are found in the buffer when it can be used, but
+    the fields of the current chunk are always read as in L{GetFields}.
 
     @return: List of fields keyed by role, state, and description
     @rtype: list of dict
     '''
+    buf = self._GetBuffer()
+    if buf is not None:
+      fields = self.GetFields()
+      parent = buf.parents[self.index]
+      if fields['role'] == 'document' or parent is None:
+        return [fields]
+      # copy the shared fields
+      return [dict(f) for f in self._GetChain(buf, parent)]+[fields]
     orig = self.pointer
     result = []
 
@@ -234,7 +484,7 @@ class HypertextDocument(Adapter):
     caret = CaretDelta(i, *self._GetBounds())
     if not this and not self.IsFirstChunk():
       # moved into the previous chunk
-      self._MovePointer(self._NavPrev(self.pointer))
+      self._MovePrev()
       caret.NewChunk = True
       j = self.chunk.MoveLastWordFromEnd()
       caret.Moved = i+j-1
@@ -287,7 +537,7 @@ class HypertextDocument(Adapter):
     caret = CaretDelta(i, *self._GetBounds())
     if not self.IsLastChunk():
       # moved the caret to the next chunk if this one is not the last
-      self._MovePointer(self._NavNext(self.pointer))
+      self._MoveNext()
       caret.NewChunk = True
       caret.Moved += 1
       if skip:
@@ -307,7 +557,7 @@ class HypertextDocument(Adapter):
     caret = CaretDelta(i, *self._GetBounds())
     if i == 0 and not self.IsFirstChunk():
       # moved to the previous chunk
-      self._MovePointer(self._NavPrev(self.pointer))
+      self._MovePrev()
       caret.NewChunk = True
       j, tmp = self.chunk.MoveFirstWordFromCurrent()
       caret.Moved = -i-o-j-1
@@ -323,6 +573,9 @@ class HypertextDocument(Adapter):
     @return: In the last chunk?
     @rtype: boolean
     '''
+    buf = self._GetBuffer()
+    if buf is not None:
+      return self.index == len(buf)-1
     try:
       self._NavNext(self.pointer)
       return False
@@ -336,6 +589,8 @@ class HypertextDocument(Adapter):
     @return: In the first chunk?
     @rtype: boolean
     '''
+    if self._GetBuffer() is not None:
+      return self.index == 0
     return self.pointer.Role == pyAA.Constants.ROLE_SYSTEM_DOCUMENT
 
   def MoveXChars(self, val):
@@ -366,8 +621,11 @@ class HypertextDocument(Adapter):
     @return: Info about the new caret state
     @rtype: L{CaretDelta}
     '''
-    self._MovePointer(self.subject)
-    return CaretDelta(o, *self._GetBounds())
+    if self.buffer is not None:
+      self._MoveRecord(0, self.buffer.records[0])
+    else:
+      self._MovePointer(self.subject, 0)
+    return CaretDelta(0, *self._GetBounds())
   
   def MoveEndChunk(self):
     '''
@@ -386,6 +644,10 @@ class HypertextDocument(Adapter):
     @return: Info about the new caret state
     @rtype: L{CaretDelta}
     '''
+    if self.buffer is not None:
+      i = len(self.buffer)-1
+      self._MoveRecord(i, self.buffer.records[i])
+      return CaretDelta(0, *self._GetBounds())
     pointer = self.subject
     while 1:
       try:
@@ -393,20 +655,115 @@ class HypertextDocument(Adapter):
         pointer = pointer.Navigate(pyAA.Constants.NAVDIR_LASTCHILD)
       except pyAA.Error:
         break
-    # update our pointer and return caret information
+    # update our pointer and return caret information, position unknown
     self._MovePointer(pointer)
     return CaretDelta(0, *self._GetBounds())
 
-  def _MovePointer(self, pointer):
+  def _MovePointer(self, pointer, index=None):
     '''
     Sets the pointer to a new location, and creates a corresponding chunk for
     its content.
 
     @param pointer: Pointer to an accessible
     @type pointer: Accessible
+    @param index: Position of the pointer in reading order or None if unknown
+    @type index: integer
+    '''
+    self._MoveRecord(index, LiveRecord(pointer))
+
+  def _MoveRecord(self, index, record):
+    '''
+    Sets the pointer to the node of a buffer or live record, and creates a
+    corresponding chunk for its content. Reads the text of the node live when
+    the buffer is dirty.
+
+    @param index: Position of the node in reading order or None if unknown
+    @type index: integer
+    @param record: Record of the node
+    @type record: 5-tuple or L{LiveRecord}
+    '''
+    self.pointer = record[NODE]
+    self.index = index
+    name = record[NAME]
+    if index is not None:
+      self.hint = index
+      if self.buffer is not None and self.buffer.dirty:
+        try:
+          name = self.pointer.Name
+        except pyAA.Error:
+          # the node is gone, and a structure event will read the buffer again
+          pass
+    self.chunk = Chunk(name)
+
+  def _MoveNext(self):
+    '''
+    Moves the pointer to the next node in reading order.
+
+    @raise ReferenceError: When there is no next node
     '''
-    self.pointer = pointer
-    self.chunk = Chunk(self.pointer.Name)
+    buf = self._GetBuffer()
+    if buf is None:
+      if self.index is None:
+        self._MovePointer(self._NavNext(self.pointer))
+      else:
+        self._MovePointer(self._NavNext(self.pointer), self.index+1)
+    elif self.index+1 < len(buf):
+      self._MoveRecord(self.index+1, buf.records[self.index+1])
+    else:
+      raise ReferenceError
+
+  def _MovePrev(self):
+    '''
+    Moves the pointer to the previous node in reading order.
+
+    @raise ReferenceError: When there is no previous node
+    '''
+    buf = self._GetBuffer()
+    if buf is None:
+      # walking back live does not retrace the reading order exactly, so the
+      # position is lost
+      self._MovePointer(self._NavPrev(self.pointer))
+    elif self.index > 0:
+      self._MoveRecord(self.index-1, buf.records[self.index-1])
+    else:
+      raise ReferenceError
+
+  def _Walk(self, ahead):
+    '''
+    Visits the nodes after or before the pointer in reading order, from the
+    buffer if it can be used or by walking the live document otherwise.
+
+    @param ahead: Visit the nodes after the pointer?
+    @type ahead: boolean
+    @return: Generator yielding the position of each node, or None if unknown,
+      and its record
+    @rtype: generator
+    '''
+    buf = self._GetBuffer()
+    if buf is not None:
+      if ahead:
+        order = xrange(self.index+1, len(buf))
+      else:
+        order = xrange(self.index-1, -1, -1)
+      for i in order:
+        yield i, buf.records[i]
+      return
+    if ahead:
+      nav = self._NavNext
+      i = self.index
+    else:
+      # walking back live does not retrace the reading order exactly
+      nav = self._NavPrev
+      i = None
+    pointer = self.pointer
+    while 1:
+      try:
+        pointer = nav(pointer)
+      except ReferenceError:
+        return
+      if i is not None:
+        i += 1
+      yield i, LiveRecord(pointer)
 
   def _GetBounds(self):
     '''
@@ -474,16 +831,31 @@ class HypertextDocument(Adapter):
     @type pointer: Accessible
     @return: New pointer position
     @rtype: Accessible
+    @raise ReferenceError: When there is no next node
+    '''
+    return self._NavNextLevel(pointer)[0]
+
+  def _NavNextLevel(self, pointer):
+    '''
+    Navigate to the next element in the document starting at the given
+    pointer, noting how many levels of the tree were crossed to reach it.
+    
+    @param pointer: Acessible object reference
+    @type pointer: Accessible
+    @return: New pointer position and the number of levels climbed, or -1 if
+      the new position is the first child of the given pointer
+    @rtype: 2-tuple of (Accessible, integer)
+    @raise ReferenceError: When there is no next node
     '''
     if not pointer.Name or pointer.Role == pyAA.Constants.ROLE_SYSTEM_DOCUMENT:
       # try to get the first child of this node
       try:
-        return pointer.Navigate(pyAA.Constants.NAVDIR_FIRSTCHILD)
+        return pointer.Navigate(pyAA.Constants.NAVDIR_FIRSTCHILD), -1
       except pyAA.Error:
         pass
     # try to get the next peer of this node
     try:
-      return pointer.Navigate(pyAA.Constants.NAVDIR_NEXT)
+      return pointer.Navigate(pyAA.Constants.NAVDIR_NEXT), 0
     except pyAA.Error:
       pass
 
@@ -492,15 +864,17 @@ class HypertextDocument(Adapter):
     except pyAA.Error:
       raise ReferenceError
 
+    up = 1
     while parent.Role != pyAA.Constants.ROLE_SYSTEM_DOCUMENT:
       # try to get the next peer of the parent node
       try:
-        return parent.Navigate(pyAA.Constants.NAVDIR_NEXT)
+        return parent.Navigate(pyAA.Constants.NAVDIR_NEXT), up
       except pyAA.Error:
         pass
       try:
         # move one level up
         parent = parent.Parent
+        up += 1
       except pyAA.Error:
         raise ReferenceError
     raise ReferenceError
@@ -517,33 +891,31 @@ class HypertextDocument(Adapter):
       no match
     @rtype: boolean
     '''
-    pointer = self.pointer
-    if direction == ISeekable.FORWARD:
-      nav = self._NavNext
-    else:
-      nav = self._NavPrev
-
-    while 1:
-      try:
-        pointer = nav(pointer)
-      except ReferenceError:
+    buf = self._GetBuffer()
+    if buf is not None:
+      i = buf.Seek(pred, self.index, direction == ISeekable.FORWARD)
+      if i is None:
         return None
+      # a match, but not wrapped
+      self._MoveRecord(i, buf.records[i])
+      return False
+    for i, record in self._Walk(direction == ISeekable.FORWARD):
       try:
         # test predicate
-        rv = pred(pointer.RoleText, pointer.StateText)
+        rv = pred(record[ROLE], record[STATE])
       except Exception, e:
         pass
       else:
         if rv: 
           # a match, but not wrapped
-          self._MovePointer(pointer)
+          self._MoveRecord(i, record)
           return False
     # no match
     return None
 
   def SearchStart(self):
     '''Stores the current pointer in case of a reset.'''
-    self.search_anchor = self.pointer
+    self.search_anchor = (self.pointer, self.index, self.buffer)
 
   def SearchReset(self): 
     '''
@@ -552,12 +924,69 @@ class HypertextDocument(Adapter):
     @return: Info about the new caret state
     @rtype: L{CaretDelta}
     '''
-    self._MovePointer(self.search_anchor)
+    pointer, index, buf = self.search_anchor
+    if buf is not self.buffer:
+      # the position may have changed when the buffer was read again
+      index = None
+    self._MovePointer(pointer, index)
     # number of chars moved is unknown
     return CaretDelta(0, *self._GetBounds())
 
+  def _CompileSearch(self, text):
+    '''
+    Builds the pattern for a search in the mode of this document.
+
+    @param text: Search target
+    @type text: string
+    @return: Pattern and the target if it is matched literally
+    @rtype: 2-tuple of (regex, string)
+    @raise ValueError: When the target is not a valid regular expression
+    '''
+    pattern = CompilePattern(text, self.search_regex, self.search_case)
+    if self.search_regex:
+      return pattern, None
+    return pattern, text
+
+  def _SearchBuffer(self, buf, text, current, ahead):
+    '''
+    Searches the text of the whole buffer so matches may span nodes. Moves the
+    pointer to the node where a match starts and the caret to the start of the
+    match.
+
+    @param buf: Complete buffer
+    @type buf: L{VirtualBuffer}
+    @param text: Search target
+    @type text: string
+    @param current: Consider a match at the caret too?
+    @type current: boolean
+    @param ahead: Search toward the end?
+    @type ahead: boolean
+    @return: False if found, None if not found
+    @rtype: boolean
+    '''
+    try:
+      pattern, literal = self._CompileSearch(text)
+    except ValueError:
+      return None
+    offset = buf.records[self.index][OFFSET]+self.chunk.GetIndex()
+    if ahead:
+      # offset by one (not current) guarantees no hit within the same match
+      offset += int(not current)
+    span = buf.Find(pattern, offset, ahead, literal)
+    if span is None:
+      return None
+    i = buf.FindOffset(span[0])
+    record = buf.records[i]
+    self._MoveRecord(i, record)
+    self.chunk.MoveXChars(span[0]-record[OFFSET])
+    # found, but no wrap
+    return False
+
   def SearchForNextMatch(self, text, current):
     '''
+    Searches the whole document text once it is buffered, otherwise node by
+    node.
+
     @param text: Search target
     @type text: string
     @param current: Consider the current match too?
@@ -565,38 +994,44 @@ class HypertextDocument(Adapter):
     @return: True if wrapped, False if not wrapped, None if not found
     @rtype: boolean
     '''
+    buf = self._GetBuffer()
+    if buf is not None:
+      return self._SearchBuffer(buf, text, current, True)
+    try:
+      pattern, literal = self._CompileSearch(text)
+    except ValueError:
+      return None
     # check current chunk for a hit, possibly within the current match
     # offset by one (not current) guarantees no hit within the same match
-    i = self.chunk.FindNext(text, int(not current))
-    if i is not None:
+    pos = self.chunk.GetIndex()
+    span = FindNext(pattern, self.chunk.text or '', pos+int(not current))
+    if span is not None:
       # move caret to new location
-      self.chunk.MoveXChars(i)
+      self.chunk.MoveXChars(span[0]-pos)
       # found, but no wrap
       return False
 
-    # store current pointer
-    pointer = self.pointer
-
     # search through all following chunks until end of doc
-    while 1:
-      try:
-        pointer = self._NavNext(pointer)
-      except ReferenceError:
-        # not found
-        break
+    for index, record in self._Walk(True):
       # check the new chunk
-      i = Chunk(pointer.Name).FindNext(text, 0)
-      if i is not None:
+      c = Chunk(record[NAME])
+      span = FindNext(pattern, c.text or '', 0)
+      if span is not None:
         # found a match, move there
-        self._MovePointer(pointer)
+        self.pointer = record[NODE]
+        self.index = index
+        self.chunk = c
         # move caret within the chunk
-        self.chunk.MoveXChars(i)
+        self.chunk.MoveXChars(span[0])
         # found, but no wrap
         return False
     return None
 
   def SearchForPrevMatch(self, text, current):
     '''
+    Searches the whole document text once it is buffered, otherwise node by
+    node.
+
     @param text: Search target
     @type text: string
     @param current: Consider the current match too?
@@ -604,35 +1039,35 @@ class HypertextDocument(Adapter):
     @return: True if wrapped, False if not wrapped, None if not found
     @rtype: boolean
     '''
-    # check current chunk for a hit, possibly within the current match
-    # offset by one (not current) guarantees no hit within the same match
-    i = self.chunk.FindPrev(text, 0)
-    if i is not None:
+    buf = self._GetBuffer()
+    if buf is not None:
+      return self._SearchBuffer(buf, text, current, False)
+    try:
+      pattern, literal = self._CompileSearch(text)
+    except ValueError:
+      return None
+    # check current chunk for a hit starting before the caret
+    pos = self.chunk.GetIndex()
+    span = FindPrev(pattern, self.chunk.text or '', pos)
+    if span is not None:
       # move caret to new location
-      self.chunk.MoveXChars(i)
+      self.chunk.MoveXChars(span[0]-pos)
       # found, but no wrap
       return False
 
-    # store current pointer
-    pointer = self.pointer
-
-    # search through all following chunks until end of doc
-    while 1:
-      try:
-        pointer = self._NavPrev(pointer)
-      except ReferenceError:
-        # not found
-        break
+    # search through all preceding chunks until start of doc
+    for index, record in self._Walk(False):
       # check the new chunk
-      c = Chunk(pointer.Name)
-      c.MoveEnd()
-      i = c.FindPrev(text, 0)
-      if i is not None:
+      c = Chunk(record[NAME])
+      end = c.MoveEnd()
+      span = FindPrev(pattern, c.text or '', end)
+      if span is not None:
         # found a match, move there
-        self.pointer = pointer
+        self.pointer = record[NODE]
+        self.index = index
         self.chunk = c
         # move caret within the chunk
-        self.chunk.MoveXChars(i)
+        self.chunk.MoveXChars(span[0]-end)
         # found, but no wrap
         return False
     return None
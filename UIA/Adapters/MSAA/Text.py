@@ -14,6 +14,7 @@ U{http://www.opensource.org/licenses/bsd-license.php}
 import unicodedata
 import re, pyAA
 from Base import Adapter
+from Counts import ChunkCounts
 from protocols import advise
 from Constants import *
 from Interface import *
@@ -598,6 +599,8 @@ class TextBox(Adapter):
   @type last_chunks: list of L{DynamicChunk}
   @ivar search_anchor: Position at the start of a search
   @type search_anchor: 2-tuple
+  @ivar counts: Characters and words in L{chunks} or None if not yet counted
+  @type counts: L{Counts.ChunkCounts}
   '''
   advise(instancesProvide=[IText, ISearchable, IInteractive])
   END_CHUNK_CHAR = 'new line'
@@ -615,6 +618,7 @@ class TextBox(Adapter):
     self.multiline = multiline
     self.last_chunks = None
     self.search_anchor = None
+    self.counts = None
 
   def _NewChunk(self, text=''):
     '''
@@ -630,10 +634,23 @@ class TextBox(Adapter):
     @return: Index of the virtual caret within all chunk characters
     @rtype: integer
     '''
-    wgen = [str(c) for c in self.chunks[:self.pos]]
-    return len(' '.join(wgen)) + self.Chunk.Index
+    # chunks before this one are counted as joined by single spaces
+    chars = self._GetCounts().GetChars(self.pos)
+    return chars + max(self.pos-1, 0) + self.Chunk.Index
   Index = property(GetIndex)
 
+  def _GetCounts(self):
+    '''
+    Counts the characters and words in all chunks again if the chunks were
+    replaced, added, or removed since they were last counted.
+
+    @return: Counts of the current chunks
+    @rtype: L{Counts.ChunkCounts}
+    '''
+    if self.counts is None or not self.counts.IsCurrent(self.chunks):
+      self.counts = ChunkCounts(self.chunks)
+    return self.counts
+
   def Deactivate(self):
     '''
     Stores the current text before losing activation so that indirect changes
@@ -719,12 +736,11 @@ class TextBox(Adapter):
     @return: Number of words in the text
     @rtype: integer
     '''
+    counts = self._GetCounts()
     if all:
-      wgen = [str(c) for c in self.chunks]
-      return len('\n'.join(wgen).split())
+      return counts.GetWords(len(self.chunks))
     else:
-      wgen = [str(c) for c in self.chunks[:self.pos]]
-      return len('\n'.join(wgen).split()) + \
+      return counts.GetWords(self.pos) + \
              len(self.Chunk.GetFromBeginning().split())
 
   def GetAllText(self):
@@ -1281,6 +1297,14 @@ class EditableTextBox(TextBox):
     '''Deletes all text.'''
     self.SetText('')
 
+  def _UpdateCounts(self):
+    '''
+    Counts the active chunk again after its text was edited. Nothing is done if
+    the chunks have not been counted yet.
+    '''
+    if self.counts is not None and self.counts.IsCurrent(self.chunks):
+      self.counts.Update(self.pos)
+
   def DeleteNext(self):
     '''
     Deletes character to the right of the cursor.
@@ -1292,6 +1316,7 @@ class EditableTextBox(TextBox):
     prev, curr = self.Chunk.PrevWord, self.Chunk.Word
     is_del, del_char = self.Chunk.Delete()
     if is_del:
+      self._UpdateCounts()
       caret.Char = del_char
       if prev and curr and self.Chunk.Word == prev+curr:
         # words joined
@@ -1306,6 +1331,7 @@ class EditableTextBox(TextBox):
       caret.Char = self.END_CHUNK_CHAR
       self.Chunk.Join(self.chunks[self.pos+1])
       self.chunks.pop(self.pos+1)
+      self.counts = None
       self.subject.SendKeys('{DEL}')
       caret.NewChunk = True
       caret.Joined = True
@@ -1323,6 +1349,7 @@ class EditableTextBox(TextBox):
     is_del, del_char = self.Chunk.DeletePrev()
     caret = CaretDelta(int(is_del), *pos)
     if is_del:
+      self._UpdateCounts()
       caret.Char = del_char
       if prev and curr and self.Chunk.Word == prev+curr:
         # words joined
@@ -1337,6 +1364,7 @@ class EditableTextBox(TextBox):
       self.pos -= 1
       self.Chunk.Join(self.chunks[self.pos+1])
       self.chunks.pop(self.pos+1)
+      self.counts = None
       self.subject.SendKeys('{BACKSPACE}')
       caret.NewChunk = True
       caret.Joined = True
@@ -1362,6 +1390,7 @@ class EditableTextBox(TextBox):
     @type char: string
     '''
     prev, next = self.Chunk.Put(char)
+    self._UpdateCounts()
     caret = CaretDelta(1, *self.GetBounds())
     caret.Char = char
     # determine unicode categories
@@ -1403,6 +1432,7 @@ class EditableTextBox(TextBox):
       caret.NewChunk = True
     self.pos += 1
     self.chunks.insert(self.pos, nc)
+    self.counts = None
     if nc.Size != 0:
       # chunk split in two
       caret.Split = True
@@ -8,6 +8,21 @@ conditions are met.
 @type _conditions: dictionary
 @var _watchers: Dictionary of L{ConditionWatcher}s keyed by event type.
 @type _watchers: dictionary
+@var _observers: Callbacks given every event as soon as it is received, keyed
+  by event type
+@type _observers: dictionary
+@var _pending: Raw events waiting to be dispatched in order of arrival
+@type _pending: list
+@var _slots: Positions of events in L{_pending} keyed by event type, window,
+  object, and child ID
+@type _slots: dictionary
+@var _counts: Numbers of raw events received and dispatched
+@type _counts: list of integer
+@var _tracer: Recorder capturing raw events, or None
+@type _tracer: L{Trace.Recorder}
+@var INDEXED_FEATURES: Names of the features conditions may declare as exact
+  match keys, in the order they are used to index conditions
+@type INDEXED_FEATURES: tuple of string
 
 @author: Peter Parente <parente@cs.unc.edu>
 @copyright: Copyright (c) 2008 Peter Parente
@@ -19,9 +34,89 @@ distribution, and is available at
 U{http://www.opensource.org/licenses/bsd-license.php}
 '''
 import traceback, pyAA
+import System, Config
 
 _watchers = {}
 _conditions = {}
+_observers = {}
+_pending = []
+_slots = {}
+_counts = [0, 0]
+_tracer = None
+INDEXED_FEATURES = ('Window', 'ClassName', 'RoleText', 'Name')
+
+def _normalizeKey(value):
+  '''
+  Converts a feature value to the form used to index conditions so that numbers
+  compare numerically and strings compare without regard to case.
+
+  @param value: Any integer or string value
+  @type value: object
+  @return: Integer, lowercase string, or the value itself
+  @rtype: object
+  '''
+  try:
+    return int(value)
+  except (ValueError, TypeError):
+    pass
+  try:
+    return value.lower()
+  except AttributeError:
+    return value
+
+def _makeHashable(value):
+  '''
+  Converts a value to one that can be hashed, recursively for containers. Uses
+  the identity of any other object that cannot be hashed.
+
+  @param value: Any object
+  @type value: object
+  @return: Hashable equivalent of the value
+  @rtype: object
+  '''
+  try:
+    hash(value)
+    return value
+  except TypeError:
+    pass
+  if isinstance(value, dict):
+    items = [(k, _makeHashable(v)) for k, v in value.items()]
+    items.sort()
+    return tuple(items)
+  elif isinstance(value, (list, tuple)):
+    return tuple([_makeHashable(v) for v in value])
+  return ('id', id(value))
+
+def _getFeature(event, ao, name, cache):
+  '''
+  Gets the normalized value of a feature from the accessible object or, if it
+  does not have it, from the event. Stores the value in the cache so each
+  feature is read at most once per event.
+
+  @param event: Accessible event
+  @type event: pyAA.WinEvent
+  @param ao: Accessible object that is the source of the event
+  @type ao: pyAA.AccessibleObject
+  @param name: Name of the feature
+  @type name: string
+  @param cache: Features already read for this event
+  @type cache: dictionary
+  @return: Normalized feature value or None if not available
+  @rtype: object
+  '''
+  try:
+    return cache[name]
+  except KeyError:
+    pass
+  try:
+    value = _normalizeKey(getattr(ao, name))
+  except (AttributeError, pyAA.Error):
+    try:
+      value = _normalizeKey(getattr(event, name))
+    except (AttributeError, pyAA.Error):
+      value = None
+  cache[name] = value
+  return value
 
 class Condition(object):
   '''
@@ -43,8 +138,15 @@ class Condition(object):
   @type args: list
   @ivar kwargs: Keyword arguments to provide to the test function
   @type kwargs: dictionary
+  @ivar Keys: Normalized feature values an event must match exactly before the
+    test function is called, or None to test every event
+  @type Keys: dictionary
+  @ivar Order: Position of the condition relative to others in its collection
+  @type Order: integer
+  @ivar Key: Hashable value identifying all the data compared for equality
+  @type Key: tuple
   '''
-  def __init__(self, pid, eid, test_cb, remove, args, kwargs):
+  def __init__(self, pid, eid, test_cb, remove, args, kwargs, keys=None):
     '''
     Stores the condition data.
     
@@ -57,21 +159,44 @@ class Condition(object):
     self.notify_cb = None
     self.args = args
     self.kwargs = kwargs
+    self.Order = 0
+    self.Keys = None
+    if keys:
+      # only features that can be indexed act as keys
+      self.Keys = dict([(name, _normalizeKey(value))
+                        for name, value in keys.items()
+                        if name in INDEXED_FEATURES]) or None
+    self.Key = (pid, eid, remove, test_cb, _makeHashable(args),
+                _makeHashable(kwargs), _makeHashable(self.Keys))
     
   def __eq__(self, other):
     '''
     Compares this L{Condition} to another for equality of process ID, event ID,
-    remove boolean, test callback, and all arguments to the test callback.
+    remove boolean, test callback, all arguments to the test callback, and
+    exact match keys.
     
     @param other: Condition to compare
     @type other: L{Condition}
     '''
-    return (self.ProcessID == other.ProcessID and
-            self.EventID == other.EventID and 
-            self.Remove == other.Remove and
-            self.test_cb == other.test_cb and 
-            self.args == other.args and
-            self.kwargs == other.kwargs)
+    return self.Key == other.Key
+  
+  def match(self, event, ao, cache):
+    '''
+    Checks if the event satisfies all the exact match keys of this condition.
+    
+    @param event: Accessible event to test
+    @type event: pyAA.WinEvent
+    @param ao: Accessible object to test
+    @type ao: pyAA.AccessibleObject
+    @param cache: Features already read for this event
+    @type cache: dictionary
+    @return: Do all keys match?
+    @rtype: boolean
+    '''
+    for name, value in self.Keys.iteritems():
+      if _getFeature(event, ao, name, cache) != value:
+        return False
+    return True
     
   def test(self, *args):
     '''
@@ -106,14 +231,78 @@ class Condition(object):
     '''
     self.notify_cb = (listener, args)
 
+class ConditionSet(dict):
+  '''
+  Conditions keyed by L{Condition.Key} that can also be listed in the order of
+  the collection that holds them.
+  
+  @ivar ordered: Conditions sorted by order or None if not yet sorted
+  @type ordered: list
+  '''
+  def __init__(self):
+    '''
+    Initializes an empty set.
+    '''
+    dict.__init__(self)
+    self.ordered = None
+  
+  def add(self, condition):
+    '''
+    Adds a condition. The condition must be ordered before or after all others
+    in the set.
+    
+    @param condition: Condition to add
+    @type condition: L{Condition}
+    '''
+    self[condition.Key] = condition
+    if self.ordered is None:
+      return
+    if self.ordered and condition.Order < self.ordered[0].Order:
+      self.ordered.insert(0, condition)
+    else:
+      self.ordered.append(condition)
+    
+  def discard(self, condition):
+    '''
+    Removes a condition.
+    
+    @param condition: Condition to remove
+    @type condition: L{Condition}
+    '''
+    del self[condition.Key]
+    # sort again when next needed
+    self.ordered = None
+    
+  def inOrder(self):
+    '''
+    @return: Conditions sorted by order
+    @rtype: list
+    '''
+    if self.ordered is None:
+      self.ordered = self.values()
+      self.ordered.sort(key=lambda cond: cond.Order)
+    return self.ordered
+
 class ConditionCollection(object):
   '''
-  Contains a list of conditions to be evaluated in order.
+  Contains conditions to be evaluated in order. Conditions with exact
+  match keys are also indexed by the value of their first key in
+  L{INDEXED_FEATURES} so that an event is only tested against the conditions
+  whose keys it could satisfy plus those that have no keys.
   
-  @ivar conditions: List of conditions to check in order
-  @type conditions: list
+  @ivar conditions: All conditions in the collection
+  @type conditions: L{ConditionSet}
   @ivar pid: Process ID associated with this collection or None if global
   @type pid: integer
+  @ivar index: Sets of keyed conditions, keyed by feature name and then by
+    normalized feature value
+  @type index: dictionary
+  @ivar fallback: Conditions without keys
+  @type fallback: L{ConditionSet}
+  @ivar first: Order of the condition at the front of the collection
+  @type first: integer
+  @ivar last: Order of the condition at the back of the collection
+  @type last: integer
   '''
   def __init__(self, pid):
     '''
@@ -123,7 +312,35 @@ class ConditionCollection(object):
     @type pid: integer
     '''
     self.pid = pid
-    self.conditions = []
+    self.conditions = ConditionSet()
+    self.index = {}
+    self.fallback = ConditionSet()
+    self.first = 0
+    self.last = 0
+  
+  def _indexKey(self, condition):
+    '''
+    Gets the feature name and value under which a condition is indexed.
+    
+    @param condition: Condition to locate
+    @type condition: L{Condition}
+    @return: Feature name and normalized value or None if not indexed
+    @rtype: 2-tuple
+    '''
+    if condition.Keys is None:
+      return None
+    for name in INDEXED_FEATURES:
+      try:
+        return name, condition.Keys[name]
+      except KeyError:
+        continue
+  
+  def getConditions(self):
+    '''
+    @return: All conditions in the order they are considered
+    @rtype: list
+    '''
+    return self.conditions.inOrder()
   
   def addCondition(self, condition, front=True):
     '''
@@ -136,15 +353,22 @@ class ConditionCollection(object):
     @type front: boolean
     @see: Condition.__eq__
     '''
-    try:
-      self.conditions.index(condition)
+    if condition.Key in self.conditions:
       return
-    except ValueError:
-      pass
+    key = self._indexKey(condition)
+    if key is None:
+      entry = self.fallback
+    else:
+      name, value = key
+      entry = self.index.setdefault(name, {}).setdefault(value, ConditionSet())
     if front:
-      self.conditions.insert(0, condition)
+      self.first -= 1
+      condition.Order = self.first
     else:
-      self.conditions.append(condition)
+      self.last += 1
+      condition.Order = self.last
+    self.conditions.add(condition)
+    entry.add(condition)
   
   def removeCondition(self, index=None, condition=None):
     '''
@@ -158,11 +382,62 @@ class ConditionCollection(object):
     @raise ValueError: When the given condition is not registered
     '''
     if index is not None:
-      self.conditions.pop(index)
-    elif condition is not None:
-      self.conditions.remove(condition)
+      condition = self.getConditions()[index]
+    elif condition is None:
+      return
+    try:
+      condition = self.conditions[condition.Key]
+    except KeyError:
+      raise ValueError('condition not registered')
+    self.conditions.discard(condition)
+    key = self._indexKey(condition)
+    if key is None:
+      self.fallback.discard(condition)
+      return
+    name, value = key
+    entry = self.index[name][value]
+    entry.discard(condition)
+    if not entry:
+      # drop empty index entries so events stop reading their features
+      del self.index[name][value]
+      if not self.index[name]:
+        del self.index[name]
+  
+  def getCandidates(self, event, ao, cache):
+    '''
+    Gets the conditions that should be tested for an event in the order they
+    appear in the collection.
+    
+    @param event: Accessible event to test
+    @type event: pyAA.WinEvent
+    @param ao: Accessible object to test
+    @type ao: pyAA.AccessibleObject
+    @param cache: Features already read for this event
+    @type cache: dictionary
+    @return: Conditions to test
+    @rtype: list
+    '''
+    candidates = None
+    for name, entries in self.index.iteritems():
+      try:
+        entry = entries[_getFeature(event, ao, name, cache)]
+      except (KeyError, TypeError):
+        continue
+      matched = [cond for cond in entry.inOrder()
+                 if cond.match(event, ao, cache)]
+      if not matched:
+        continue
+      elif candidates is None:
+        candidates = matched
+      else:
+        candidates.extend(matched)
+    if candidates is None:
+      return self.fallback.inOrder()
+    candidates.extend(self.fallback.inOrder())
+    candidates.sort(key=lambda cond: cond.Order)
+    return candidates
   
-  def testConditions(self, event, ao):
+  def testConditions(self, event, ao, cache=None):
     '''
     Tests if the given object passes any of the conditions. Removes a one-shot
     condition that is satisfied.
@@ -171,10 +446,14 @@ class ConditionCollection(object):
     @type event: pyAA.WinEvent
     @param ao: Accessible object to test
     @type ao: pyAA.AccessibleObject
+    @param cache: Features already read for this event
+    @type cache: dictionary
     @return: Condition that passed or None
     @rtype: L{Condition}
     '''
-    for index, cond in enumerate(self.conditions):
+    if cache is None:
+      cache = {}
+    for cond in self.getCandidates(event, ao, cache):
       # check all process specific conditions
       try:
         rv = cond.test(event, ao)
@@ -189,7 +468,7 @@ class ConditionCollection(object):
           traceback.print_exc()
         if cond.Remove:
           # remove a one-shot condition
-          self.removeCondition(index)
+          self.removeCondition(condition=cond)
         return cond
     return None
   
@@ -224,6 +503,116 @@ class ConditionWatcher(pyAA.AAbase):
       self.Release()
       return True
     return False
+
+def _queueEvent(event):
+  '''
+  Holds a raw event until the pump next dispatches queued events. Replaces an
+  event already waiting for the same source so a burst of repaint events results
+  in one test of the conditions. Dispatches immediately if 
+  L{Config.event_window} is zero.
+  
+  @param event: Accessible event
+  @type event: pyAA.WinEvent
+  '''
+  _counts[0] += 1
+  if _tracer is not None:
+    _tracer.Record(event)
+  _notifyObservers(event)
+  if not Config.event_window:
+    _dispatchEvent(event)
+    return
+  key = (event.EventID, event.Window, event.ObjectID, event.ChildID)
+  try:
+    # keep the position of the first event, but the data of the latest
+    _pending[_slots[key]] = event
+  except KeyError:
+    _slots[key] = len(_pending)
+    _pending.append(event)
+    if len(_pending) == 1:
+      # dispatch the batch once the window closes
+      System.Pump().RegisterFuture(Config.event_window, _flushEvents)
+
+def _notifyObservers(event):
+  '''
+  Gives a raw event to its observers at once rather than when queued events are
+  dispatched, so caches are forgotten before any more input is handled. Logs
+  errors so one observer cannot keep the event from the others.
+
+  @param event: Accessible event
+  @type event: pyAA.WinEvent
+  '''
+  try:
+    observers = _observers[event.EventID]
+  except KeyError:
+    return
+  # copy so observers can remove themselves
+  for observer in observers[:]:
+    try:
+      observer(event)
+    except Exception:
+      traceback.print_exc()
+
+def _flushEvents():
+  '''
+  Dispatches all queued events in the order they first arrived.
+  '''
+  events = _pending[:]
+  del _pending[:]
+  _slots.clear()
+  for event in events:
+    _dispatchEvent(event)
+
+def _dispatchEvent(event):
+  '''
+  Tests one event against the registered conditions. Ignores events whose 
+  source is gone and logs all other errors so the rest of a batch is still 
+  dispatched.
+  
+  @param event: Accessible event
+  @type event: pyAA.WinEvent
+  '''
+  _counts[1] += 1
+  try:
+    _onEvent(event)
+  except pyAA.Error:
+    pass
+  except Exception:
+    traceback.print_exc()
+
+def getEventCounts(reset=False):
+  '''
+  Reports how many raw events the watchers have received and how many were
+  tested against conditions after coalescing.
+  
+  @param reset: Reset the counts to zero after reporting them?
+  @type reset: boolean
+  @return: Received and dispatched counts
+  @rtype: 2-tuple of integer
+  '''
+  rv = tuple(_counts)
+  if reset:
+    _counts[:] = [0, 0]
+  return rv
+    
+def startTrace(filename):
+  '''
+  Starts capturing all events received by the condition watchers so they can be
+  replayed offline by L{Trace.Player}.
+  
+  @param filename: Name of the trace file to write
+  @type filename: string
+  '''
+  global _tracer
+  import Trace
+  stopTrace()
+  _tracer = Trace.Recorder(filename)
+
+def stopTrace():
+  '''Stops capturing events and writes the trace to disk.'''
+  global _tracer
+  if _tracer is not None:
+    _tracer.Close()
+    _tracer = None
     
 def _onEvent(event):
   '''
@@ -242,6 +631,8 @@ def _onEvent(event):
   
   # get the event source and its originating process
   ao = event.AccessibleObject
+  # features read while matching keys, shared by all collections
+  cache = {}
   try:
     pid, tid = ao.ProcessID
   except AttributeError:
@@ -255,7 +646,7 @@ def _onEvent(event):
     except KeyError:
       pass
     else:
-      cond = collection.testConditions(event, ao)
+      cond = collection.testConditions(event, ao, cache)
       if cond is not None:
         if cond.Remove:
           # decrement the watcher reference count
@@ -268,7 +659,7 @@ def _onEvent(event):
   except KeyError:
     pass
   else:
-    cond = collection.testConditions(event, ao)
+    cond = collection.testConditions(event, ao, cache)
     if cond is not None:
       if cond.Remove:
         # decrement the watcher reference count
@@ -286,7 +677,7 @@ def _refWatcher(event_id):
     _watchers[event_id].ref()
   except KeyError:
     w = ConditionWatcher()
-    w.AddWinEventHook(callback=_onEvent, event=event_id)
+    w.AddWinEventHook(callback=_queueEvent, event=event_id)
     w.ref()
     _watchers[event_id] = w
 
@@ -301,14 +692,16 @@ def _unrefWatcher(event_id):
   if _watchers[event_id].unref():
     del _watchers[event_id]
 
-def addCondition(eid, test_cb, pid=None, front=True, remove=False, *args, 
-                 **kwargs):
+def addCondition(eid, test_cb, pid=None, front=True, remove=False, keys=None,
+                 *args, **kwargs):
   '''
   Adds a condition under which a notification should be generated for an event.
   Registers the condition under the given process ID if specified, or under
   the list of global conditions if not. Adds the condition to the front of the
   condition list if top is True, else to the end. Removes the condition when the
   first event satisfying it is encountered if remove is True, else leaves it.
+  Only calls the test function for events whose features in L{INDEXED_FEATURES}
+  equal the given keys, compared as integers or as lowercase strings.
   
   @param eid: Event which will trigger testing of the condition
   @type eid: integer
@@ -320,16 +713,53 @@ def addCondition(eid, test_cb, pid=None, front=True, remove=False, *args,
   @type front: boolean
   @param remove: Remove this condition after it has been satisfied once?
   @type remove: boolean
+  @param keys: Feature names and values the event must match exactly
+  @type keys: dictionary
   @return: Condition that was registered
   @rtype: L{Condition}
   '''
   _refWatcher(eid)
   collections = _conditions.setdefault(eid, {})
   collection = collections.setdefault(pid, ConditionCollection(pid))
-  cond = Condition(pid, eid, test_cb, remove, args, kwargs)
+  cond = Condition(pid, eid, test_cb, remove, args, kwargs, keys)
   collection.addCondition(cond, front)
   return cond
 
+def addObserver(eid, callback):
+  '''
+  Adds a callback given every event of a type as soon as it is received, before
+  events are queued and coalesced for testing against conditions. Unlike a
+  condition, an observer sees events satisfying other conditions and events
+  whose source is already gone, and sees them while input is still being
+  handled, so it is suited to invalidating caches. The callback must not read
+  from the event source since it may be dead, and must be quick since it runs
+  inside the hook.
+
+  @param eid: Event type to observe
+  @type eid: integer
+  @param callback: Function taking the raw event
+  @type callback: callable
+  '''
+  _refWatcher(eid)
+  _observers.setdefault(eid, []).append(callback)
+
+def removeObserver(eid, callback):
+  '''
+  Removes a callback added by L{addObserver}.
+
+  @param eid: Event type observed
+  @type eid: integer
+  @param callback: Function added as an observer
+  @type callback: callable
+  @raise KeyError: When nothing observes the event type
+  @raise ValueError: When the callback does not observe the event type
+  '''
+  observers = _observers[eid]
+  observers.remove(callback)
+  if not observers:
+    del _observers[eid]
+  _unrefWatcher(eid)
+
 def removeCondition(condition):
   '''
   Removes a condition to prevent further notification.
@@ -375,4 +805,5 @@ if __name__ == '__main__':
   
   while 1:
     pythoncom.PumpWaitingMessages()
+    _flushEvents()
     time.sleep(0.001)
@@ -12,35 +12,47 @@ distribution, and is available at
 U{http://www.opensource.org/licenses/bsd-license.php}
 '''
 
-import EventManager
+import EventManager, Matcher
+from Matcher import EXACT_FEATURES
 import pyAA, os, subprocess
 
-def _testFeature(attr, target):
+def _getKeys(features):
   '''
-  Tests a the property value in attr with the one given in target to see if
-  they are equal, first by a numeric integer comparison and then by a lowercase
-  string comparison.
-
-  @param attr: Any integer or string object to test
-  @type attr: object
-  @param target: Any integer or string value
-  @type target: object
+  Gets the features the event manager can match exactly before calling
+  L{_onMatch}.
+
+  @param features: Name/value pairs representing the proprties to test and their
+    target values
+  @type features: dictionary
+  @return: Name/value pairs of the exact features
+  @rtype: dictionary
+  '''
+  return dict([(name, target) for name, target in features.items()
+               if name in EXACT_FEATURES and
+               isinstance(target, (int, long, basestring))])
+
+def _onMatch(event, ao, matchers):
   '''
-  # do a numeric comparison first
-  try:
-    return int(target) == int(attr)
-  except ValueError:
-    pass
-  # do a straightforward comparison in lowercase
-  try:
-    return attr.lower().find(target.lower()) > -1
-  except AttributeError:
-    return False
+  Tests the given event and accessible object against features compiled by
+  L{Matcher.CompileFeatures}.
+
+  @param event: Accessible event to test
+  @type event: L{pyAA.WinEvent}
+  @param ao: Accessible object to test
+  @type ao: L{pyAA.AccessibleObject}
+  @param matchers: Matchers that must all pass
+  @type matchers: tuple of L{Matcher.FeatureMatcher}
+  '''
+  for matcher in matchers:
+    if not matcher(event, ao):
+      return False
+  return True
 
 def _onTest(event, ao, **features):
   '''
   Tests the properties of the given event and accessible object to see if they
-  match those given in features.
+  match those given in features. Compiles the features on every call, so
+  conditions registered for many events should use L{_onMatch} instead.
 
   @param event: Accessible event to test
   @type event: L{pyAA.WinEvent}
@@ -50,27 +62,7 @@ def _onTest(event, ao, **features):
     target values
   @type features: dictionary
   '''
-  for name, target in features.items():
-    if target is None:
-      # ignore blank targets
-      continue
-    try:
-      # try to get the feature on the accessible first
-      attr = getattr(ao, name)
-      if not _testFeature(attr, target):
-        return False
-      else:
-        continue
-    except (AttributeError, pyAA.Error):
-      pass
-    try:
-      # try to get the feature on the event next
-      attr = getattr(event, name)
-      if not _testFeature(attr, target):
-        return False
-    except (AttributeError, pyAA.Error):
-      return False
-  return True
+  return _onMatch(event, ao, Matcher.CompileFeatures(features))
 
 class Macro(object):
   '''
@@ -128,6 +120,8 @@ class Macro(object):
     self.seq = None
     self.model = model
     self.message = message
+    if message is not None:
+      message.Keep()
     self.result = model
     self.finish = pyAA.Defer.Deferred()
     self.conditions = {}
@@ -234,9 +228,12 @@ class Macro(object):
     @type features: dictionary of string, regex, or callable
     '''
     pid = self._getPID()
+    keys = _getKeys(features)
+    matchers = Matcher.CompileFeatures(features)
     # register the features for all events
     for event in events:
-      cond = EventManager.addCondition(event, _onTest, pid, **features)
+      cond = EventManager.addCondition(event, _onMatch, pid, keys=keys,
+                                       matchers=matchers)
       #cond.setListener(self.Continue, name)
       self._awaitingConditions.append((cond, name))
       self.conditions[cond] = survive
@@ -273,7 +270,9 @@ class Macro(object):
     @type survive: boolean
     '''
     cond = EventManager.addCondition(pyAA.Constants.EVENT_OBJECT_DESTROY,
-                                     _onTest, None, Window=hwnd)
+                                     _onMatch, None, keys={'Window' : hwnd},
+                                     matchers=(Matcher.CompileFeature('Window',
+                                                                      hwnd),))
     cond.setListener(self.Continue, name)
     self.conditions[cond] = survive
 
@@ -0,0 +1,214 @@
+'''
+Defines matchers that test one feature of an event or its accessible source
+against a target value. Features given to a macro watch are compiled into
+matchers once when the watch is registered so that testing an event costs no
+more than reading the attributes and comparing them.
+
+@var EXACT_FEATURES: Features compared in whole rather than by substring
+@type EXACT_FEATURES: tuple of string
+@var EVENT_FEATURES: Features only available on the event
+@type EVENT_FEATURES: tuple of string
+
+@author: Peter Parente <parente@cs.unc.edu>
+@copyright: Copyright (c) 2008 Peter Parente
+@license: BSD License
+
+All rights reserved. This program and the accompanying materials are made
+available under the terms of The BSD License which accompanies this
+distribution, and is available at
+U{http://www.opensource.org/licenses/bsd-license.php}
+'''
+import pyAA
+
+EXACT_FEATURES = ('Window', 'ClassName', 'RoleText')
+EVENT_FEATURES = ('EventID', 'ObjectID', 'ChildID', 'ThreadID', 'Time')
+
+class FeatureMatcher(object):
+  '''
+  Base class for matchers. Reads the feature from the accessible object first
+  and from the event if the accessible does not have it, unless the feature is
+  known to belong to the event.
+
+  @ivar name: Name of the feature
+  @type name: string
+  @ivar target: Prepared target value
+  @type target: object
+  @ivar on_event: Read the feature from the event only?
+  @type on_event: boolean
+  '''
+  def __init__(self, name, target):
+    '''
+    Initializes an instance.
+
+    @param name: Name of the feature
+    @type name: string
+    @param target: Target value as given by the macro
+    @type target: object
+    '''
+    self.name = name
+    self.target = self.Prepare(target)
+    self.on_event = name in EVENT_FEATURES
+
+  def __eq__(self, other):
+    return (self.__class__ is other.__class__ and self.name == other.name and
+            self.target == other.target)
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __hash__(self):
+    return hash((self.__class__, self.name, self.target))
+
+  def __call__(self, event, ao):
+    '''
+    Tests the feature of the event or its source.
+
+    @param event: Accessible event to test
+    @type event: pyAA.WinEvent
+    @param ao: Accessible object to test
+    @type ao: pyAA.AccessibleObject
+    @return: Does the feature match the target?
+    @rtype: boolean
+    '''
+    if not self.on_event:
+      try:
+        return self.Test(getattr(ao, self.name))
+      except (AttributeError, pyAA.Error):
+        pass
+    try:
+      attr = getattr(event, self.name)
+    except (AttributeError, pyAA.Error):
+      return False
+    return self.Test(attr)
+
+  def Prepare(self, target):
+    '''
+    Virtual method. Converts the target to the form used by L{Test}.
+
+    @param target: Target value as given by the macro
+    @type target: object
+    @return: Prepared target
+    @rtype: object
+    '''
+    return target
+
+  def Test(self, attr):
+    '''
+    Virtual method. Compares a feature value to the target.
+
+    @param attr: Feature value
+    @type attr: object
+    @return: Does the value match?
+    @rtype: boolean
+    '''
+    raise NotImplementedError
+
+class NumericMatcher(FeatureMatcher):
+  '''
+  Compares features as integers. Compares a feature that is not a number to a
+  target given as a string like L{SubstringMatcher} or L{ExactMatcher} would.
+
+  @ivar text: Lowercase target string or None if given as a number
+  @type text: string
+  @ivar exact: Compare strings in whole?
+  @type exact: boolean
+  '''
+  def __init__(self, name, target):
+    FeatureMatcher.__init__(self, name, target)
+    try:
+      self.text = target.lower()
+    except AttributeError:
+      self.text = None
+    self.exact = name in EXACT_FEATURES
+
+  def Prepare(self, target):
+    return int(target)
+
+  def Test(self, attr):
+    try:
+      return int(attr) == self.target
+    except ValueError:
+      pass
+    if self.text is None:
+      return False
+    try:
+      if self.exact:
+        return attr.lower() == self.text
+      return attr.lower().find(self.text) > -1
+    except AttributeError:
+      return False
+
+class SubstringMatcher(FeatureMatcher):
+  '''Looks for the target in the feature without regard to case.'''
+  def Prepare(self, target):
+    return target.lower()
+
+  def Test(self, attr):
+    try:
+      return attr.lower().find(self.target) > -1
+    except AttributeError:
+      return False
+
+class ExactMatcher(SubstringMatcher):
+  '''Compares whole features without regard to case.'''
+  def Test(self, attr):
+    try:
+      return attr.lower() == self.target
+    except AttributeError:
+      return False
+
+class RegexMatcher(FeatureMatcher):
+  '''Searches the feature with a compiled regular expression.'''
+  def Test(self, attr):
+    try:
+      return self.target.search(attr) is not None
+    except TypeError:
+      return False
+
+class CallableMatcher(FeatureMatcher):
+  '''Passes the feature to a function that decides if it matches.'''
+  def Test(self, attr):
+    return bool(self.target(attr))
+
+def CompileFeature(name, target):
+  '''
+  Builds the matcher suited to a target value. Targets that parse as integers
+  are compared numerically as they always have been, and regular expressions
+  and callables are used as given.
+
+  @param name: Name of the feature
+  @type name: string
+  @param target: Integer, string, compiled regex, or callable
+  @type target: object
+  @return: Matcher for the feature
+  @rtype: L{FeatureMatcher}
+  '''
+  if hasattr(target, 'search'):
+    return RegexMatcher(name, target)
+  try:
+    return NumericMatcher(name, target)
+  except (ValueError, TypeError):
+    pass
+  if isinstance(target, basestring):
+    if name in EXACT_FEATURES:
+      return ExactMatcher(name, target)
+    return SubstringMatcher(name, target)
+  elif callable(target):
+    return CallableMatcher(name, target)
+  raise ValueError('cannot match %s against %r' % (name, target))
+
+def CompileFeatures(features):
+  '''
+  Builds matchers for all features with targets. Puts matchers that only need
+  the event and exact matchers first since they are the cheapest to reject.
+
+  @param features: Name/value pairs representing the properties to test and
+    their target values
+  @type features: dictionary
+  @return: Matchers in the order they should be tested
+  @rtype: tuple of L{FeatureMatcher}
+  '''
+  matchers = [CompileFeature(name, target)
+              for name, target in features.items() if target is not None]
+  matchers.sort(key=lambda m: (not m.on_event, m.name not in EXACT_FEATURES))
+  return tuple(matchers)
@@ -0,0 +1,101 @@
+'''
+Defines stand-ins for the pyAA and pythoncom modules so the trace player and
+benchmark in L{Trace} run on machines without them, like a Linux build box.
+The stand-ins hold only what the event manager, macros, and matchers need to
+import and to test conditions against fake accessibles. Nothing can be hooked
+or read from a live application through them.
+
+@author: Peter Parente <parente@cs.unc.edu>
+@copyright: Copyright (c) 2008 Peter Parente
+@license: BSD License
+
+All rights reserved. This program and the accompanying materials are made
+available under the terms of The BSD License which accompanies this
+distribution, and is available at
+U{http://www.opensource.org/licenses/bsd-license.php}
+'''
+import sys, types
+
+class Constants(object):
+  '''
+  Values of the Windows constants used by the event manager, macros, and trace
+  tools, as defined in winuser.h.
+  '''
+  EVENT_SYSTEM_FOREGROUND = 0x0003
+  EVENT_SYSTEM_DIALOGSTART = 0x0010
+  EVENT_OBJECT_CREATE = 0x8000
+  EVENT_OBJECT_DESTROY = 0x8001
+  EVENT_OBJECT_SHOW = 0x8002
+  EVENT_OBJECT_HIDE = 0x8003
+  EVENT_OBJECT_REORDER = 0x8004
+  EVENT_OBJECT_FOCUS = 0x8005
+  EVENT_OBJECT_SELECTION = 0x8006
+  EVENT_OBJECT_STATECHANGE = 0x800A
+  EVENT_OBJECT_NAMECHANGE = 0x800C
+  EVENT_OBJECT_DESCRIPTIONCHANGE = 0x800D
+  EVENT_OBJECT_VALUECHANGE = 0x800E
+  OBJID_WINDOW = 0
+  OBJID_CLIENT = -4
+  SELFLAG_TAKEFOCUS = 0x1
+
+class Error(Exception):
+  '''Stand-in for pyAA.Error.'''
+  pass
+
+class AAbase(object):
+  '''
+  Stand-in for the pyAA base class of event watchers. Never installs a hook.
+  '''
+  def AddWinEventHook(self, *args, **kwargs):
+    pass
+
+  def Release(self):
+    pass
+
+class AccessibleObject(object):
+  '''Stand-in for pyAA.AccessibleObject. Never constructed offline.'''
+  pass
+
+def PumpWaitingMessages():
+  '''
+  Stand-in for pythoncom.PumpWaitingMessages. There are no messages offline.
+
+  @return: Was a quit message received?
+  @rtype: integer
+  '''
+  return 0
+
+def _MakeModule(name, members):
+  '''
+  Builds a module holding the given members.
+
+  @param name: Name of the module
+  @type name: string
+  @param members: Objects in the module keyed by name
+  @type members: dictionary
+  @return: New module
+  @rtype: module
+  '''
+  mod = types.ModuleType(name, 'Offline stand-in for %s' % name)
+  mod.__dict__.update(members)
+  return mod
+
+def Install():
+  '''
+  Puts the stand-ins in sys.modules for each of pyAA and pythoncom that cannot
+  be imported. Real modules are always preferred.
+  '''
+  try:
+    import pyAA
+  except ImportError:
+    sys.modules['pyAA'] = _MakeModule('pyAA',
+                                      {'Constants' : Constants,
+                                       'Error' : Error,
+                                       'AAbase' : AAbase,
+                                       'AccessibleObject' : AccessibleObject})
+  try:
+    import pythoncom
+  except ImportError:
+    sys.modules['pythoncom'] = _MakeModule('pythoncom',
+                                           {'PumpWaitingMessages' :
+                                            PumpWaitingMessages})
@@ -0,0 +1,332 @@
+'''
+Defines a recorder that captures accessibility events along with the
+properties conditions read from their sources, and a player that feeds a
+captured trace through the L{EventManager} offline using fake accessible
+objects. Includes a benchmark of condition matching over a trace.
+
+@author: Peter Parente <parente@cs.unc.edu>
+@copyright: Copyright (c) 2008 Peter Parente
+@license: BSD License
+
+All rights reserved. This program and the accompanying materials are made
+available under the terms of The BSD License which accompanies this
+distribution, and is available at
+U{http://www.opensource.org/licenses/bsd-license.php}
+'''
+import time, cPickle, random, sys, os
+if __name__ == '__main__':
+  # run as a script from UIA, so make the top level modules importable
+  here = os.path.dirname(os.path.abspath(__file__))
+  sys.path.insert(1, os.path.dirname(here))
+try:
+  import pyAA
+except ImportError:
+  # stand in for pyAA and pythoncom when run off Windows
+  import Offline
+  Offline.Install()
+  import pyAA
+import EventManager
+
+# version of the trace format
+VERSION = 1
+# properties of an event source captured with each event
+PROPERTIES = ('Name', 'ClassName', 'RoleText', 'Role', 'State', 'Window',
+              'Value', 'Description', 'ChildCount')
+
+class Recorder(object):
+  '''
+  Captures events as they arrive from the condition watchers. Reads a snapshot
+  of the source properties at capture time since the source may be gone by the
+  time the trace is replayed.
+
+  @ivar filename: Name of the trace file
+  @type filename: string
+  @ivar start: Time at which recording started
+  @type start: float
+  @ivar records: Time offset, event ID, window, object ID, child ID, process ID,
+    and property snapshot of each event
+  @type records: list of tuple
+  '''
+  def __init__(self, filename):
+    '''
+    Initializes an instance.
+
+    See instance variables for parameter descriptions.
+    '''
+    self.filename = filename
+    self.start = time.time()
+    self.records = []
+
+  def Record(self, event):
+    '''
+    Captures an event and the properties of its source.
+
+    @param event: Accessible event
+    @type event: pyAA.WinEvent
+    '''
+    props = {}
+    pid = None
+    try:
+      ao = event.AccessibleObject
+      pid, tid = ao.ProcessID
+    except pyAA.Error:
+      pass
+    else:
+      for name in PROPERTIES:
+        try:
+          props[name] = getattr(ao, name)
+        except (AttributeError, pyAA.Error):
+          pass
+    self.records.append((time.time()-self.start, event.EventID, event.Window,
+                         event.ObjectID, event.ChildID, pid, props))
+
+  def Close(self):
+    '''Writes all records to the trace file.'''
+    f = file(self.filename, 'wb')
+    try:
+      cPickle.dump((VERSION, self.records), f, 2)
+    finally:
+      f.close()
+    self.records = []
+
+def LoadTrace(filename):
+  '''
+  Reads a trace written by L{Recorder}.
+
+  @param filename: Name of the trace file
+  @type filename: string
+  @return: Records in the trace
+  @rtype: list of tuple
+  @raise ValueError: When the file is not a trace of a known version
+  '''
+  f = file(filename, 'rb')
+  try:
+    version, records = cPickle.load(f)
+  finally:
+    f.close()
+  if version != VERSION:
+    raise ValueError('%s is not a version %d trace' % (filename, VERSION))
+  return records
+
+def MakeTrace(count, pids=(100, 200), seed=0):
+  '''
+  Builds a synthetic trace resembling repaint bursts in a few applications for
+  benchmarking when no recorded trace is at hand.
+
+  @param count: Number of events
+  @type count: integer
+  @param pids: Process IDs to spread the events over
+  @type pids: list of integer
+  @param seed: Seed for the random choices so runs are comparable
+  @type seed: integer
+  @return: Records in the trace
+  @rtype: list of tuple
+  '''
+  r = random.Random(seed)
+  C = pyAA.Constants
+  events = [C.EVENT_OBJECT_SHOW, C.EVENT_OBJECT_SHOW, C.EVENT_OBJECT_HIDE,
+            C.EVENT_OBJECT_NAMECHANGE, C.EVENT_OBJECT_STATECHANGE,
+            C.EVENT_OBJECT_FOCUS]
+  sources = [('Outlook Express', '#32770', 'dialog'),
+             ('Inbox', 'SysListView32', 'list'),
+             ('Subject', 'Edit', 'editable text'),
+             ('OK', 'Button', 'push button'),
+             ('Untitled - Notepad', 'Notepad', 'window'),
+             ('Location', 'MozillaWindowClass', 'combo box')]
+  records = []
+  for i in xrange(count):
+    name, cls, role = r.choice(sources)
+    hwnd = r.randint(1, 50)
+    props = {'Name' : name, 'ClassName' : cls, 'RoleText' : role,
+             'State' : 0, 'Window' : hwnd, 'ChildCount' : r.randint(0, 20)}
+    records.append((i*0.001, r.choice(events), hwnd, 0, r.randint(0, 5),
+                    r.choice(pids), props))
+  return records
+
+class FakeAccessible(object):
+  '''
+  Stand-in for a pyAA.AccessibleObject built from a property snapshot. Raises
+  AttributeError for properties missing from the snapshot.
+  '''
+  def __init__(self, pid, props):
+    self.__dict__.update(props)
+    if pid is not None:
+      self.ProcessID = (pid, 0)
+
+class FakeEvent(object):
+  '''
+  Stand-in for a pyAA.WinEvent built from a trace record.
+  '''
+  def __init__(self, eid, hwnd, oid, cid, ao):
+    self.EventID = eid
+    self.Window = hwnd
+    self.ObjectID = oid
+    self.ChildID = cid
+    self.AccessibleObject = ao
+
+class FakeWatcher(object):
+  '''
+  Reference counter standing in for a L{EventManager.ConditionWatcher} so no
+  hooks are installed during replay.
+  '''
+  def __init__(self):
+    self.count = 0
+
+  def ref(self):
+    self.count += 1
+
+  def unref(self):
+    self.count -= 1
+    return self.count <= 0
+
+class Player(object):
+  '''
+  Replays a trace through L{EventManager._onEvent} against its own set of
+  conditions. Swaps its conditions in for those of the event manager only while
+  running.
+
+  @ivar events: Fake events built from the trace
+  @type events: list of L{FakeEvent}
+  @ivar conditions: Collections of conditions keyed by event and process ID
+  @type conditions: dictionary
+  @ivar watchers: Fake watchers keyed by event ID
+  @type watchers: dictionary
+  '''
+  def __init__(self, records):
+    '''
+    Builds fake events for all records ahead of time so their construction is
+    not measured.
+
+    @param records: Records in the trace
+    @type records: list of tuple
+    '''
+    self.events = [FakeEvent(eid, hwnd, oid, cid, FakeAccessible(pid, props))
+                   for t, eid, hwnd, oid, cid, pid, props in records]
+    self.conditions = {}
+    self.watchers = {}
+
+  def AddCondition(self, eid, test_cb, pid=None, front=True, remove=False,
+                   keys=None, *args, **kwargs):
+    '''
+    Registers a condition for replay. Takes the same parameters as
+    L{EventManager.addCondition}.
+
+    @return: Condition that was registered
+    @rtype: L{EventManager.Condition}
+    '''
+    self.watchers.setdefault(eid, FakeWatcher()).ref()
+    collections = self.conditions.setdefault(eid, {})
+    collection = collections.setdefault(pid,
+                                        EventManager.ConditionCollection(pid))
+    cond = EventManager.Condition(pid, eid, test_cb, remove, args, kwargs, keys)
+    collection.addCondition(cond, front)
+    return cond
+
+  def Run(self):
+    '''
+    Feeds all events through the event manager.
+
+    @return: Seconds taken
+    @rtype: float
+    '''
+    old = EventManager._conditions, EventManager._watchers
+    EventManager._conditions = self.conditions
+    EventManager._watchers = self.watchers
+    try:
+      onEvent = EventManager._onEvent
+      start = time.time()
+      for event in self.events:
+        onEvent(event)
+      return time.time()-start
+    finally:
+      EventManager._conditions, EventManager._watchers = old
+
+class Counter(object):
+  '''
+  Test callback wrapper that counts calls and the time spent in them.
+
+  @ivar test_cb: Original test callback
+  @type test_cb: callable
+  @ivar calls: Number of calls
+  @type calls: integer
+  @ivar elapsed: Seconds spent in calls
+  @type elapsed: float
+  '''
+  def __init__(self, test_cb):
+    self.test_cb = test_cb
+    self.calls = 0
+    self.elapsed = 0.0
+
+  def __call__(self, *args, **kwargs):
+    self.calls += 1
+    start = time.time()
+    try:
+      return self.test_cb(*args, **kwargs)
+    finally:
+      self.elapsed += time.time()-start
+
+def Benchmark(records, sizes=(0, 10, 100, 500)):
+  '''
+  Measures events per second and the cost per registered condition when
+  replaying a trace. Registers a mix of macro watches with exact keys, macro
+  watches matching names by substring, and auto task style callbacks spread
+  over the process IDs in the trace.
+
+  @param records: Records in the trace
+  @type records: list of tuple
+  @param sizes: Numbers of conditions to benchmark
+  @type sizes: list of integer
+  @return: Human readable report
+  @rtype: string
+  '''
+  import Macro, Matcher
+  C = pyAA.Constants
+  eids = [C.EVENT_OBJECT_SHOW, C.EVENT_SYSTEM_FOREGROUND,
+          C.EVENT_OBJECT_NAMECHANGE]
+  pids = list(set([rec[5] for rec in records])) + [None]
+  names = ['Save', 'Open', 'Find', 'Confirm', 'Delete', 'Extract', 'Error']
+  r = random.Random(0)
+  lines = ['%d events' % len(records)]
+  base = None
+  for size in sizes:
+    player = Player(records)
+    counters = []
+    for i in xrange(size):
+      eid = r.choice(eids)
+      pid = r.choice(pids)
+      # never satisfied so every event is tested against every candidate
+      name = '%s %d' % (r.choice(names), i)
+      kind = i % 3
+      if kind == 0:
+        features = {'ClassName' : '#32770', 'Name' : name}
+      elif kind == 1:
+        features = {'Name' : name}
+      if kind < 2:
+        # registered as Macro.WatchForEvents does
+        test = Counter(Macro._onMatch)
+        player.AddCondition(eid, test, pid, keys=Macro._getKeys(features),
+                            matchers=Matcher.CompileFeatures(features))
+      else:
+        test = Counter(lambda event, ao, name=name: ao.Name == name)
+        player.AddCondition(eid, test, pid, front=False)
+      counters.append(test)
+    elapsed = player.Run()
+    calls = sum([c.calls for c in counters])
+    tested = sum([c.elapsed for c in counters])
+    if base is None:
+      base = elapsed
+    line = '%4d conditions: %8.0f events/sec, %6d tests' % \
+           (size, len(records)/max(elapsed, 1e-9), calls)
+    if size:
+      line += ', %.2f us/condition/event, %.2f us/test' % \
+              ((elapsed-base)/size/len(records)*1e6,
+               tested/max(calls, 1)*1e6)
+    lines.append(line)
+  return '\n'.join(lines)
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1:
+    records = LoadTrace(sys.argv[1])
+  else:
+    records = MakeTrace(20000)
+  print Benchmark(records)
@@ -14,6 +14,14 @@ U{http://www.opensource.org/licenses/bsd-license.php}
 
 import time, pyAA
 
+# shortest and longest time without events before a process is stable
+MIN_QUIET = 0.02
+MAX_QUIET = 0.1
+# multiple of the longest recent gap between events in a burst to wait
+QUIET_MARGIN = 2.0
+# rate at which the longest recent gap is forgotten per event
+GAP_DECAY = 0.95
+
 class StabilityWatcher(object):
   '''
   Watches for all events coming from a process. Tracks the time since the last 
@@ -21,12 +29,45 @@ class StabilityWatcher(object):
   separate thread with its own message loop to allow event notifications even 
   while the main thread is busy processing input messages.
 
+  Learns how long the process must be quiet before it is stable from the gaps
+  between events in its bursts. Processes that fire their events in quick 
+  succession need not be waited on as long as those that pause mid-burst.
+
   @ivar LastTime: Time of the last disturbance to the program
   @type LastTime: integer
+  @ivar LastStable: Time the program was last found stable
+  @type LastStable: integer
   @ivar watcher: Watcher that monitors all events
   @type watcher: pyAA.Watcher
   @ivar pid: Process ID to watch
   @type pid: integer
+  @ivar Quiet: Time without events after which the process is stable
+  @type Quiet: float
+  @ivar gap: Longest recent gap between events in a burst, decaying over time
+  @type gap: float
+  @ivar burst_start: Time the current burst of events started
+  @type burst_start: float
+  @ivar bursts: Number of bursts observed
+  @type bursts: integer
+  @ivar burst_time: Total length of all observed bursts
+  @type burst_time: float
+  @ivar waits: Number of times a caller waited for stability
+  @type waits: integer
+  @ivar wait_time: Total time callers spent waiting for stability
+  @type wait_time: float
+  @ivar max_wait: Longest time a caller waited for stability
+  @type max_wait: float
+  @ivar Generation: Number of disturbances to the program so far
+  @type Generation: integer
+  @ivar cache: Results of reads from the program keyed by object, method, and
+    arguments, all made during L{cache_generation}
+  @type cache: dictionary
+  @ivar cache_generation: Generation in which the cached results were read
+  @type cache_generation: integer
+  @ivar hits: Number of reads answered from the cache
+  @type hits: integer
+  @ivar misses: Number of reads not in the cache
+  @type misses: integer
   ''' 
   def __init__(self, pid):
     '''
@@ -38,6 +79,19 @@ class StabilityWatcher(object):
     super(StabilityWatcher, self).__init__()
     self.LastTime = time.time()
     self.LastStable = self.LastTime
+    self.Quiet = MAX_QUIET
+    self.gap = MAX_QUIET/QUIET_MARGIN
+    self.burst_start = self.LastTime
+    self.bursts = 0
+    self.burst_time = 0.0
+    self.waits = 0
+    self.wait_time = 0.0
+    self.max_wait = 0.0
+    self.Generation = 0
+    self.cache = {}
+    self.cache_generation = 0
+    self.hits = 0
+    self.misses = 0
     self.pid = pid
     self.watcher = pyAA.Watcher()
     self.watcher.AddWinEventHook(callback=self.Disturb, process_id=self.pid)    
@@ -47,5 +101,99 @@ class StabilityWatcher(object):
     self.watcher.Release()
 
   def Disturb(self, event=None):
-    '''Sets the last event time to the current time.'''
-    self.LastTime = time.time()
+    '''
+    Sets the last event time to the current time. Learns from the gap since
+    the previous event if it is short enough to be part of the same burst.
+    '''
+    now = time.time()
+    gap = now - self.LastTime
+    if gap < self.Quiet:
+      # still in a burst, remember the longest gap seen lately
+      self.gap = max(gap, self.gap*GAP_DECAY)
+      self.Quiet = min(MAX_QUIET, max(MIN_QUIET, self.gap*QUIET_MARGIN))
+    else:
+      # the last burst ended quietly, start a new one
+      self.bursts += 1
+      self.burst_time += self.LastTime - self.burst_start
+      self.burst_start = now
+    self.LastTime = now
+    self.Generation += 1
+
+  def GetCached(self, key):
+    '''
+    Gets the result of a read made since the last disturbance.
+
+    @param key: Object, method, and arguments of the read
+    @type key: tuple
+    @return: Result of the read
+    @rtype: object
+    @raise KeyError: When the read has not been made in this generation
+    @raise TypeError: When the key cannot be hashed
+    '''
+    if self.cache_generation != self.Generation:
+      # the program changed, forget everything
+      self.cache = {}
+      self.cache_generation = self.Generation
+    try:
+      r = self.cache[key][0]
+    except KeyError:
+      self.misses += 1
+      raise
+    self.hits += 1
+    return r
+
+  def SetCached(self, key, result, generation, source):
+    '''
+    Stores the result of a read if the program has not been disturbed since the
+    read started.
+
+    @param key: Object, method, and arguments of the read
+    @type key: tuple
+    @param result: Result of the read
+    @type result: object
+    @param generation: Generation in which the read started
+    @type generation: integer
+    @param source: Object that was read, kept alive while the entry exists
+    @type source: object
+    @raise TypeError: When the key cannot be hashed
+    '''
+    if generation != self.Generation:
+      # disturbed during the read, the result may already be stale
+      return
+    if self.cache_generation != generation:
+      self.cache = {}
+      self.cache_generation = generation
+    self.cache[key] = (result, source)
+
+  def StableAt(self):
+    '''
+    @return: Time at which the process will be stable if no more events arrive
+    @rtype: float
+    '''
+    return self.LastTime + self.Quiet
+
+  def AddWait(self, wait):
+    '''
+    Records time a caller spent waiting for stability.
+
+    @param wait: Seconds spent waiting
+    @type wait: float
+    '''
+    self.waits += 1
+    self.wait_time += wait
+    self.max_wait = max(self.max_wait, wait)
+
+  def GetStats(self):
+    '''
+    Reports what has been learned about the process and how long callers have
+    waited on it.
+
+    @return: Current quiet threshold, number of bursts, mean burst length,
+      number of waits, total wait time, longest wait, and cache hits and misses
+    @rtype: dictionary
+    '''
+    return {'quiet' : self.Quiet, 'bursts' : self.bursts,
+            'mean_burst' : self.burst_time/max(self.bursts, 1),
+            'waits' : self.waits, 'wait_time' : self.wait_time,
+            'max_wait' : self.max_wait, 'hits' : self.hits,
+            'misses' : self.misses}
@@ -11,21 +11,48 @@ distribution, and is available at
 U{http://www.opensource.org/licenses/bsd-license.php}
 '''
 
-import pyAA
-import Mixin
+try:
+  import pyAA
+except ImportError:
+  # off Windows, stand in for pyAA so the offline trace tools still run
+  import Offline
+  Offline.Install()
+else:
+  import Mixin, Config, Input
 
-# add the StabilityMixin to the AccessibleObject class
-modifiers = ['DoDefaultAction', 'Select', 'SetFocus', 'SendKeys']
-init = ['__init__']
-unsafe = ['ChildFromPath', 'FindOneChild', 'FindAllChildren', 'GetChildren']
-mix = Mixin.StabilityMixin(pyAA.AccessibleObject)
-mix.StirInto(include=['SendKeys'])
-mix.WrapMethods(mix.CheckWrapper, include=unsafe)
-mix.WrapMethods(mix.DisturbWrapper, include=modifiers)
-mix.WrapMethods(mix.InitializeWrapper, include=init)
-mix.StirInto(exclude=['SendKeys'])
+  # add the StabilityMixin to the AccessibleObject class
+  modifiers = ['DoDefaultAction', 'Select', 'SetFocus', 'SendKeys']
+  init = ['__init__']
+  unsafe = ['ChildFromPath', 'FindOneChild', 'FindAllChildren', 'GetChildren']
+  getters = ['GetName', 'GetValue', 'GetRole', 'GetRoleText', 'GetState', 
+             'GetStateText', 'GetDescription', 'GetHelp', 'GetKeyboardShortcut',
+             'GetDefaultAction', 'GetChildCount', 'GetLocation', 'GetClassName']
+  mix = Mixin.StabilityMixin(pyAA.AccessibleObject)
+  mix.StirInto(include=['SendKeys'])
+  mix.WrapMethods(mix.CheckWrapper, include=unsafe)
+  mix.HookMethods(post=['Disturb', Mixin.Memo.Forget], include=modifiers)
+  mix.WrapMethods(mix.InitializeWrapper, include=init)
+  mix.StirInto(exclude=['SendKeys'])
 
-from Macro import *
-from Watcher import *
-import Adapters
-from pyAA import Constants
+  if Config.account_calls:
+    # count and time all calls on AccessibleObject, logged per input message
+    stirred = ['CheckStability', 'Disturb', 'GetStabilityWatcher']
+    acct = Mixin.AccountingMixin(pyAA.AccessibleObject)
+    acct.WrapMethods(acct.AccountWrapper, 
+                     exclude=init+stirred+[name for name in 
+                                           vars(pyAA.AccessibleObject) 
+                                           if name.startswith('__')])
+    keys = Mixin.AccountingMixin(Input.Manager)
+    keys.WrapMethods(keys.KeystrokeWrapper, include=['DispatchMessage'])
+
+  if Config.memo_properties:
+    # read each property of an object at most once per input message
+    memoizer = Mixin.MemoMixin(pyAA.AccessibleObject)
+    memoizer.WrapMethods(memoizer.MemoWrapper, include=getters)
+    scope = Mixin.MemoMixin(Input.Manager)
+    scope.WrapMethods(scope.ScopeWrapper, include=['DispatchMessage'])
+
+  from Macro import *
+  from Watcher import *
+  import Adapters
+  from pyAA import Constants
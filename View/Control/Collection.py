@@ -11,7 +11,8 @@ distribution, and is available at
 U{http://www.opensource.org/licenses/bsd-license.php}
 '''
 
-import Base, Output, Support, Interface
+import Base, Output, Support, Interface, Input
+import Config, System
 
 class Collection(Base.Control): 
   '''
@@ -20,6 +21,9 @@ class Collection(Base.Control):
   
   @ivar label: Label for collection items
   @type label: string
+  @ivar prefetcher: Generator reading the items around the selection or None
+    when no prefetch is running
+  @type prefetcher: generator
   '''
   def __init__(self, parent, model, name, label, default_name):
     '''
@@ -29,6 +33,43 @@ class Collection(Base.Control):
     '''
     super(Collection, self).__init__(parent, model, name, default_name)
     self.label = label
+    self.prefetcher = None
+
+  def Prefetch(self):
+    '''
+    Starts reading the items around the selection when the model supports
+    IPrefetchable. Items are read one per pump future so input is handled
+    between them, and their names are handed to the output manager to render
+    ahead of the user moving to them. Replaces any prefetch still running.
+    '''
+    try:
+      m = Interface.IPrefetchable(self.model)
+    except NotImplementedError:
+      return
+    self.prefetcher = m.PrefetchNeighbors(Config.prefetch_items)
+    System.Pump().RegisterFuture(Config.prefetch_delay, self._PrefetchStep,
+                                 self.prefetcher)
+
+  def _PrefetchStep(self, gen):
+    '''
+    Reads one item ahead and renders its name. Re-registers itself until the
+    generator is exhausted or replaced by a newer prefetch.
+
+    @param gen: Prefetch generator started by L{Prefetch}
+    @type gen: generator
+    '''
+    if gen is not self.prefetcher:
+      return
+    try:
+      name = gen.next()
+    except StopIteration:
+      self.prefetcher = None
+      return
+    if name:
+      p = Output.Packet(self, None)
+      p.AddMessage(speech=name, person=Output.CONTENT)
+      self.Prerender(self, p)
+    System.Pump().RegisterFuture(Config.prefetch_delay, self._PrefetchStep, gen)
        
   def OnActivate(self, message, auto_focus):
     '''
@@ -51,6 +92,16 @@ class Collection(Base.Control):
       return True
     else:
       return False
+
+  def OnDeactivate(self, message):
+    '''
+    Stops any prefetch still running before the model is deactivated.
+
+    @param message: Message that caused this event handler to fire
+    @type message: L{Input.Messages.InboundMessage}
+    '''
+    self.prefetcher = None
+    super(Collection, self).OnDeactivate(message)
       
   def OnPrevHigh(self, message):
     '''
@@ -73,39 +124,71 @@ class Collection(Base.Control):
         self.NotifyAboutChange()
         self.Output(self, p)
       
+  def _MoveItems(self, count):
+    '''
+    Selects the item count positions after the current one, or before it if
+    count is negative. Skips in one call to the model when it supports
+    ISkippable, else steps one item at a time.
+
+    @param count: Number of items to move
+    @type count: integer
+    @return: Did the selection wrap?
+    @rtype: boolean
+    '''
+    if count > 1 or count < -1:
+      try:
+        return Interface.ISkippable(self.model).SkipItems(count)
+      except NotImplementedError:
+        pass
+    m = Interface.IInfiniteCollection(self.model)
+    if count > 0:
+      step = m.NextItem
+    else:
+      step = m.PrevItem
+    wrap = False
+    for i in xrange(abs(count)):
+      wrap = step() or wrap
+    return wrap
+
+  @Input.handles_repeats
   def OnPrevMid(self, message):
     '''
-    Selects the previous item in the collection.
+    Selects the previous item in the collection, or the item as many places
+    back as the message was repeated.
     
     Plays OutWrapItem or OutCurrentItem.
     
     @param message: Message that caused this event handler to fire
     @type message: L{Input.Messages.InboundMessage}
     '''
-    wrap = Interface.IInfiniteCollection(self.model).PrevItem()
+    wrap = self._MoveItems(-message.Repeat)
     if wrap:
       p = self.OutWrapItem(message)
     else:
       p = self.OutCurrentItem(message)
     self.Output(self, p)
     self.NotifyAboutChange()
+    self.Prefetch()
 
+  @Input.handles_repeats
   def OnNextMid(self, message):
     '''
-    Selects the next item in the collection.
+    Selects the next item in the collection, or the item as many places ahead
+    as the message was repeated.
     
     Plays OutWrapItem or OutCurrentItem.
     
     @param message: Message that caused this event handler to fire
     @type message: L{Input.Messages.InboundMessage}
     '''
-    wrap = Interface.IInfiniteCollection(self.model).NextItem()
+    wrap = self._MoveItems(message.Repeat)
     if wrap:
       p = self.OutWrapItem(message)
     else:
       p = self.OutCurrentItem(message)
     self.Output(self, p)
     self.NotifyAboutChange()
+    self.Prefetch()
     
   def OnText(self, message):
     '''
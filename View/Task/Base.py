@@ -36,6 +36,9 @@ class Task(View.Base):
   @type CancelMacro: L{UIA.Macro.Macro}
   @cvar CompleteMacro: Macro to run at task completion
   @type CompleteMacro: L{UIA.Macro.Macro}
+  @cvar TriggerKeys: Features a shown window must match exactly before the
+    Trigger of an auto task is called
+  @type TriggerKeys: dictionary
   '''
   Modal = False
   Permanence = False
@@ -43,6 +46,7 @@ class Task(View.Base):
   StartMacro = None
   CancelMacro = None
   CompleteMacro = None
+  TriggerKeys = None
   
   def __init__(self, parent, model):
     '''
@@ -501,6 +501,7 @@ class Program(Base.Task):
     for task in self.adapter.AutoTasks:
       c = UIA.EventManager.addCondition(UIA.Constants.EVENT_OBJECT_SHOW,
                                         task.Trigger, pid=pid, front=False,
+                                        keys=task.TriggerKeys,
                                         container=weakref.proxy(self))
       c.setListener(self.StartAutoTask, task)
       self.conditions.setdefault(pid, []).append(c)
@@ -647,7 +648,7 @@ class Program(Base.Task):
         t = self.StartObject(message, t, self.model, self, focus=False)
         # autostart this task if it is the only one
         if len(self.adapter.Tasks) == 1:
-          self.focus = t
+          self.FocusNow(t)
     # remove the permanents
     i = 0
     while i < len(self.adapter.Tasks):
@@ -444,6 +444,8 @@ class AutoNoSearchResults(Task.RunWaitReport):
   def OnSayDone(self, message):
     self.CancelMacro.Continue()
    
+  TriggerKeys = {'ClassName': '#32770', 'Name': 'Message'}
+
   def Trigger(cls, event, model, container):
     return not (model.State & UIA.Constants.STATE_SYSTEM_SIZEABLE) and \
            model.Name == 'Message' and model.ClassName == '#32770'
@@ -323,6 +323,8 @@ class AutoConfirmNoSubject(Task.FormFill):
     cb = Adapters.CheckBox(self, self.check_path)
     self.AddField(Control.List(self, cb))
 
+  TriggerKeys = {'ClassName': '#32770', 'Name': 'Outlook Express'}
+
   def Trigger(cls, event, model, container):
     return not (model.State & UIA.Constants.STATE_SYSTEM_SIZEABLE) and \
            model.Name == 'Outlook Express' and model.ClassName == '#32770' and \
@@ -342,6 +344,8 @@ class AutoConfirmDeleteFromTrash(Task.FormFill):
     bl = Adapters.ButtonList(self, [self.cancel_path, self.ok_path])
     self.AddField(Control.List(self, bl, self.delete_msg))
 
+  TriggerKeys = {'ClassName': '#32770', 'Name': 'Outlook Express'}
+
   def Trigger(cls, event, model, container):
     return not (model.State & UIA.Constants.STATE_SYSTEM_SIZEABLE) and \
            model.Name == 'Outlook Express' and model.ClassName == '#32770' and \
@@ -361,6 +365,8 @@ class AutoSendError(Task.FormFill):
                              primary_keys=['Action', 'Status'])
     self.AddField(Control.List(self, cl, 'error list'))
 
+  TriggerKeys = {'ClassName': '#32770', 'Name': 'Outlook Express'}
+
   def Trigger(cls, event, model, container):
     return not (model.State & UIA.Constants.STATE_SYSTEM_SIZEABLE) and \
            model.Name == 'Outlook Express' and model.ClassName == '#32770' and \
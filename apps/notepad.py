@@ -154,6 +154,8 @@ class AutoConfirmDialog(Task.FormFill):
     label = Adapters.TextLabel(self, self.text_path)
     self.AddField(Control.List(self, bl, label))
     
+  TriggerKeys = {'ClassName': '#32770'}
+
   def Trigger(cls, event, model, container):
     return not (model.State & UIA.Constants.STATE_SYSTEM_SIZEABLE) and \
            model.Name.startswith('Save') and model.ClassName == '#32770'
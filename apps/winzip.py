@@ -391,6 +391,8 @@ class AutoOpenDialog(Task.RunWaitReport):
   def OnSayDone(self, message):
     self.CompleteMacro.Continue()
    
+  TriggerKeys = {'ClassName': '#32770', 'Name': 'WinZip'}
+
   def Trigger(cls, event, model, container):
     return not (model.State & UIA.Constants.STATE_SYSTEM_SIZEABLE) and \
            model.Name == 'WinZip' and model.ClassName == '#32770'